@@ -0,0 +1,178 @@
+"""Evaluate streams of profiles or programs against one compiled rule set.
+
+Input is NDJSON, one object per line, either a profile::
+
+    {"id": 7, "goal": "Strength", "age": 34, "muscle_group": ["Chest"]}
+
+or a program to generate routines for::
+
+    {"id": 8, "program": "workout_day Monday muscle_group Chest ...", "age": 34}
+
+Results are written as NDJSON in input order while later lines are still
+being processed. With more than one worker, lines are sent in chunks to a
+process pool whose workers each compile the rule set once. Workers get a
+copy of the records taken when the batch starts, for ``Type.field``
+conditions, and prune the same rules as the engine they were copied from.
+
+    python batch.py --rules rules.json --workers 4 profiles.ndjson > results.ndjson
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from textx import TextXSyntaxError
+
+from dsl import parse
+from rule_engine import RuleEngine, normalize_profile
+from routine_generator import PACKING_MODES, routines_for_program
+
+DEFAULT_CHUNK_SIZE = 256
+
+_engine = None
+
+
+def evaluate_line(engine, line_number, line):
+    """Evaluate one NDJSON line and return its result dict.
+
+    A line that cannot be evaluated gets ``status: "invalid"`` and a
+    message, so one bad line never ends the stream.
+    """
+    result = {"line": line_number}
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        result.update(status="invalid", message=f"Invalid JSON: {e}")
+        return result
+    if not isinstance(record, dict):
+        result.update(status="invalid", message="Each line must be a JSON object")
+        return result
+
+    if 'id' in record:
+        result['id'] = record['id']
+    try:
+        _evaluate_record(engine, record, result)
+    except Exception as e:
+        result.update(status="invalid", message=str(e))
+    return result
+
+
+def _evaluate_record(engine, record, result):
+    if 'program' in record:
+        mode = record.get('mode', 'auto')
+        if not isinstance(record['program'], str):
+            result.update(status="invalid", message="program must be a string")
+            return
+        if mode not in PACKING_MODES:
+            result.update(status="invalid",
+                          message=f"Invalid mode: {mode}. Valid modes: {', '.join(PACKING_MODES)}")
+            return
+        try:
+            model = parse(record['program'])
+        except TextXSyntaxError as e:
+            result.update(status="invalid", message=f"Syntax error: {e.message}",
+                          location={"line": e.line, "column": e.col})
+            return
+        result.update(status="success", routines=routines_for_program(
+            model, engine,
+            age=record.get('age'),
+            fitness_level=record.get('fitness_level'),
+            mode=mode
+        ))
+        return
+
+    matched = engine.matching_rules(normalize_profile(record.get('profile', record)))
+    result.update(
+        status="success",
+        matched_rules=[rule.name for rule in matched],
+        actions=[action for rule in matched for action in rule.actions]
+    )
+
+
+def _init_worker(rule_dicts, records, prune, redundant):
+    global _engine
+    _engine = RuleEngine(records=records, prune=prune)
+    _engine.load(rule_dicts, redundant=redundant)
+
+
+def _evaluate_chunk(chunk):
+    return [json.dumps(evaluate_line(_engine, n, line)) for n, line in chunk]
+
+
+def _chunks(lines, size):
+    chunk = []
+    for n, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        chunk.append((n, line))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_results(lines, engine, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one JSON-encoded result per non-empty input line, in input order.
+
+    At most ``2 * workers`` chunks are in flight, so arbitrarily long inputs
+    are processed in constant memory.
+    """
+    if workers <= 1:
+        for chunk in _chunks(lines, chunk_size):
+            for n, line in chunk:
+                yield json.dumps(evaluate_line(engine, n, line))
+        return
+
+    snapshot = engine.snapshot
+    records = engine.records.snapshot() if engine.records is not None else None
+    initargs = ([rule.data for rule in snapshot.rules.values()], records, engine.prune, snapshot.redundant)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = deque()
+        for chunk in _chunks(lines, chunk_size):
+            pending.append(pool.submit(_evaluate_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def load_rules_file(path):
+    """Read rules saved from /get-rules (either the response or its list)"""
+    with open(path) as f:
+        data = json.load(f)
+    return data['rules'] if isinstance(data, dict) else data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('input', nargs='?', default='-', help="NDJSON input file, '-' for stdin")
+    parser.add_argument('--rules', help="JSON file with the rules (defaults to the database)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.rules:
+        engine = RuleEngine()
+        engine.load(load_rules_file(args.rules))
+    else:
+        from main import app, load_rules, record_projection, rule_engine
+        with app.app_context():
+            engine = RuleEngine(records=record_projection.snapshot(), prune=rule_engine.prune)
+            engine.load(load_rules())
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    try:
+        for result in iter_results(source, engine, args.workers, args.chunk_size):
+            sys.stdout.write(result + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+"""Benchmarks for the parse, validation, persistence and evaluation paths.
+
+Generates a synthetic rule corpus and data model of the chosen scale from a
+fixed seed, loads it into a database and measures the hot paths through
+the Flask test client. Results are written as JSON with sorted keys so runs
+of two versions can be diffed or compared::
+
+    python bench.py --scale 10k --out bench-10k.json
+    python bench.py --scale 100 --database mysql --reset
+    python bench.py --compare before.json after.json
+
+By default the run uses a fresh SQLite file in a temporary directory;
+``--database memory`` keeps it in memory instead (see storage.py).
+``--database mysql`` uses the server configured in main.py; its rule and
+record tables are emptied first, so point it at a database of its own.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SCALES = {"100": 100, "10k": 10_000, "1m": 1_000_000}
+SEED = 20240601
+
+GOALS = ("Muscle Gain", "Fat Loss", "Strength", "Endurance")
+MUSCLES = ("Chest", "Back", "Legs", "Shoulders", "Arms", "Core", "Full Body", "Dorsales")
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+EXERCISES = ("Squats", "Deadlifts", "Bench Press", "Lunges", "Push-up", "Overhead Press",
+             "Bicep Curls", "Leg Press", "Dumbbell Row", "Burpees")
+RECORD_TYPES = 10
+ATTRIBUTES = (("name", "string"), ("capacity", "number"), ("open", "boolean"), ("level", "string"))
+INSERT_BATCH_SIZE = 1000
+# Clearing the data in dependency order
+TABLES = ("record_values", "records", "attributes", "record_types", "actions", "conditions", "rules")
+
+
+class QueryCounter:
+    """Counts the statements run on connections opened through ``wrap``"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def wrap(self, connect):
+        def counted_connect():
+            return CountingConnection(connect(), self)
+        return counted_connect
+
+    def mark(self):
+        return self.queries, self.seconds
+
+    def since(self, mark):
+        return self.queries - mark[0], self.seconds - mark[1]
+
+
+class CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args):
+        return CountingCursor(self._conn.cursor(*args), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._counter.queries += 1
+            self._counter.seconds += time.perf_counter() - started
+
+    def execute(self, *args):
+        return self._timed(self._cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._timed(self._cursor.executemany, *args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def parse_count(text):
+    """Parse 100, 10k or 1m"""
+    text = text.lower()
+    if text in SCALES:
+        return SCALES[text]
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(text[:-1] if multiplier > 1 else text) * multiplier
+
+
+def generate_rule(rng, number):
+    """Return the DSL text of a random valid rule and its stored dict form"""
+    conditions = []
+    for variable in rng.sample(("goal", "muscle_group", "age", "duration", "fitness_level"), rng.randint(1, 3)):
+        if variable == "goal":
+            conditions.append((variable, "==", rng.choice(GOALS)))
+        elif variable == "muscle_group":
+            conditions.append((variable, rng.choice(("==", "!=")), rng.choice(MUSCLES)))
+        elif variable == "fitness_level":
+            conditions.append((variable, "==", rng.choice(LEVELS)))
+        elif variable == "age":
+            conditions.append((variable, rng.choice((">=", "<", ">")), rng.randint(15, 100)))
+        else:
+            conditions.append((variable, rng.choice(("<=", ">=")), rng.randint(5, 180)))
+
+    kind = rng.randrange(3)
+    if kind == 0:
+        exercise = rng.choice(EXERCISES)
+        action_text = f'include_exercise "{exercise}"'
+        action = {"action_type": "include_exercise", "exercise_name": exercise}
+    elif kind == 1:
+        sets, reps = rng.randint(1, 6), rng.randint(4, 20)
+        action_text = f"sets {sets} reps {reps}"
+        action = {"action_type": "sets_reps", "sets_count": sets, "reps_count": reps}
+    else:
+        low = rng.randint(1, 3)
+        high = low + rng.randint(0, 3)
+        action_text = f"set_rest_time min {low}m max {high}m"
+        action = {"action_type": "rest_time", "min_rest_time": low * 60, "max_rest_time": high * 60}
+
+    text = f"rule Rule {number} if " + " and ".join(
+        f'{v} {op} "{value}"' if isinstance(value, str) else f"{v} {op} {value}"
+        for v, op, value in conditions
+    ) + f" then {action_text}"
+    return text, {
+        "name": f"Rule {number}",
+        "conditions": [{"variable": v, "operator": op, "value": str(value)} for v, op, value in conditions],
+        "actions": [action]
+    }
+
+
+def generate_profile(rng):
+    return {
+        "goal": rng.choice(GOALS),
+        "muscle_group": rng.sample(MUSCLES, rng.randint(1, 3)),
+        "fitness_level": rng.choice(LEVELS),
+        "age": rng.randint(15, 100),
+        "duration": rng.randint(5, 180)
+    }
+
+
+def latency_summary(samples):
+    """Count, mean and nearest-rank percentiles of samples in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(0.50) * 1000, 3),
+        "p90_ms": round(percentile(0.90) * 1000, 3),
+        "p99_ms": round(percentile(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+def timed_requests(counter, calls):
+    """Run ``calls`` (each returning a response); latency and query summary"""
+    samples = []
+    mark = counter.mark()
+    errors = 0
+    for call in calls:
+        started = time.perf_counter()
+        response = call()
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+    queries, seconds = counter.since(mark)
+    return {
+        **latency_summary(samples),
+        "errors": errors,
+        "queries_per_request": round(queries / len(samples), 3) if samples else None,
+        "sql_ms_per_request": round(seconds / len(samples) * 1000, 3) if samples else None
+    }
+
+
+def bench_parse(dsl, texts):
+    """Throughput of metamodel.model_from_str, per definition and as one program"""
+    started = time.perf_counter()
+    dsl.get_metamodel()
+    build_seconds = time.perf_counter() - started
+
+    samples = []
+    for text in texts:
+        started = time.perf_counter()
+        dsl.parse(text)
+        samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    dsl.parse("\n".join(texts))
+    program_seconds = time.perf_counter() - started
+    return {
+        "metamodel_build_seconds": round(build_seconds, 6),
+        "definition": {**latency_summary(samples), "per_second": round(len(samples) / sum(samples), 1)},
+        "program": {
+            "rules": len(texts),
+            "seconds": round(program_seconds, 6),
+            "rules_per_second": round(len(texts) / program_seconds, 1)
+        }
+    }
+
+
+def seed_rules(main, counter, rule_dicts):
+    mark = counter.mark()
+    started = time.perf_counter()
+    with main.db_pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            for start in range(0, len(rule_dicts), INSERT_BATCH_SIZE):
+                main.insert_rules(cur, rule_dicts[start:start + INSERT_BATCH_SIZE])
+        finally:
+            cur.close()
+    seconds = time.perf_counter() - started
+    queries, _ = counter.since(mark)
+    return {"rules": len(rule_dicts), "seconds": round(seconds, 6),
+            "rules_per_second": round(len(rule_dicts) / seconds, 1) if seconds else None,
+            "queries": queries}
+
+
+def seed_records(main, counter, rng, count):
+    """Record types with a few attributes each and ``count`` records spread over them"""
+    mark = counter.mark()
+    started = time.perf_counter()
+    with main.db_pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            attributes = []
+            for t in range(RECORD_TYPES):
+                cur.execute("INSERT INTO record_types (name) VALUES (%s)", (f"Type{t}",))
+                type_id = cur.lastrowid
+                ids = {}
+                for name, attr_type in ATTRIBUTES:
+                    cur.execute("""
+                        INSERT INTO attributes (record_type_id, name, type, initial_value)
+                        VALUES (%s, %s, %s, %s)
+                    """, (type_id, name, attr_type, ''))
+                    ids[name] = cur.lastrowid
+                attributes.append((type_id, ids))
+
+            for start in range(0, count, INSERT_BATCH_SIZE):
+                size = min(INSERT_BATCH_SIZE, count - start)
+                types = [rng.choice(attributes) for _ in range(size)]
+                cur.executemany("INSERT INTO records (record_type_id) VALUES (%s)",
+                                [(type_id,) for type_id, _ in types])
+                first_id = cur.lastrowid
+                values = []
+                for offset, (_, ids) in enumerate(types):
+                    record_id = first_id + offset
+                    values += [
+                        (record_id, ids["name"], f"Item {record_id}"),
+                        (record_id, ids["capacity"], str(rng.randint(1, 500))),
+                        (record_id, ids["open"], rng.choice(("true", "false"))),
+                        (record_id, ids["level"], rng.choice(LEVELS)),
+                    ]
+                cur.executemany("INSERT INTO record_values (record_id, attribute_id, value) VALUES (%s, %s, %s)",
+                                values)
+        finally:
+            cur.close()
+    seconds = time.perf_counter() - started
+    queries, _ = counter.since(mark)
+    return {"records": count, "seconds": round(seconds, 6),
+            "records_per_second": round(count / seconds, 1) if seconds else None,
+            "queries": queries}
+
+
+def walk_pages(client, path, pages):
+    """Calls fetching up to ``pages`` consecutive pages of a keyset-paginated endpoint"""
+    state = {"cursor": None}
+
+    def call():
+        url = path if state["cursor"] is None else f"{path}&cursor={state['cursor']}"
+        response = client.get(url)
+        # Start over at the end so every call fetches a full page
+        state["cursor"] = (response.get_json() or {}).get("next_cursor")
+        return response
+    return [call] * pages
+
+
+def open_database(args, workdir):
+    """Point main.py at the database under test"""
+    if args.database == "sqlite":
+        os.environ["WORKOUT_DSL_DATABASE"] = f"sqlite:{os.path.join(workdir, 'bench.db')}"
+    else:
+        os.environ["WORKOUT_DSL_DATABASE"] = args.database
+
+
+def reset_tables(main, reset):
+    with main.db_pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COUNT(*) AS n FROM rules")
+            if cur.fetchone()["n"] and not reset:
+                raise SystemExit("The database already holds rules; pass --reset to empty it first")
+            for table in TABLES:
+                cur.execute(f"DELETE FROM {table}")
+        finally:
+            cur.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    rules_count = args.rules if args.rules is not None else parse_count(args.scale)
+    records_count = args.records if args.records is not None else parse_count(args.scale)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        open_database(args, workdir)
+        os.environ.setdefault("WORKOUT_DSL_CHECK_INDEXES", "0")
+        import dsl
+        import main
+
+        counter = QueryCounter()
+        # Connections opened from now on are counted
+        main.db_pool.clear()
+        main.db_pool.connect = counter.wrap(main.db_pool.connect)
+        main.snapshot_builder.interval = 0
+        # Per-request debug logging would dominate the latencies
+        logging.getLogger().setLevel(logging.WARNING)
+        main.app.logger.setLevel(logging.WARNING)
+        reset_tables(main, args.reset)
+        client = main.app.test_client()
+        client.post('/init-db')
+
+        corpus = [generate_rule(rng, n) for n in range(1, rules_count + 1)]
+        sample = [text for text, _ in corpus[:args.parse_sample]]
+        results = {"parse": bench_parse(dsl, sample)}
+
+        results["persist"] = {
+            "rules": seed_rules(main, counter, [rule for _, rule in corpus]),
+            "records": seed_records(main, counter, rng, records_count)
+        }
+        del corpus
+
+        fresh = [generate_rule(rng, rules_count + n)[0] for n in range(1, args.requests + 1)]
+        results["validate_rule"] = {
+            "cold": timed_requests(counter, [
+                lambda text=text: client.post('/validate-rule', json={"rule": text}) for text in fresh]),
+            # Same texts again: answered from the parse cache
+            "cached": timed_requests(counter, [
+                lambda text=text: client.post('/validate-rule', json={"rule": text}) for text in fresh])
+        }
+
+        results["get_rules"] = {
+            "page_100": timed_requests(counter, walk_pages(client, "/get-rules?limit=100", args.requests))
+        }
+        if rules_count <= args.full_table_limit:
+            results["get_rules"]["full_table"] = timed_requests(counter, [lambda: client.get('/get-rules')] * 3)
+
+        results["get_datamodel"] = {
+            "page_100": timed_requests(counter, walk_pages(client, "/get-datamodel?limit=100", args.requests))
+        }
+
+        started = time.perf_counter()
+        main.get_rule_engine()
+        results["evaluate"] = {
+            "engine_load_seconds": round(time.perf_counter() - started, 6),
+            "requests": timed_requests(counter, [
+                lambda profile=generate_profile(rng): client.post('/evaluate', json=profile)
+                for _ in range(args.requests)])
+        }
+
+    return {
+        "benchmark": {
+            "scale": args.scale,
+            "rules": rules_count,
+            "records": records_count,
+            "seed": args.seed,
+            "requests": args.requests,
+            "parse_sample": len(sample)
+        },
+        "environment": {
+            "database": main.storage_backend.describe(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "grammar_hash": dsl.GRAMMAR_HASH,
+            "revision": git_revision()
+        },
+        "results": results
+    }
+
+
+def flatten(data, prefix=""):
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compare(before_path, after_path):
+    """Print every numeric result of two runs side by side"""
+    with open(before_path) as f:
+        before = dict(flatten(json.load(f)["results"]))
+    with open(after_path) as f:
+        after = dict(flatten(json.load(f)["results"]))
+    width = max(map(len, before.keys() | after.keys()), default=0)
+    for path in sorted(before.keys() | after.keys()):
+        old, new = before.get(path), after.get(path)
+        ratio = f"{new / old:8.3f}x" if old and new is not None else ""
+        print(f"{path:<{width}}  {old if old is not None else '-':>14}  {new if new is not None else '-':>14}  {ratio}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', default="100", help="Rules and records to generate: 100, 10k, 1m or a count")
+    parser.add_argument('--rules', type=parse_count, help="Override the number of rules")
+    parser.add_argument('--records', type=parse_count, help="Override the number of records")
+    parser.add_argument('--database', choices=("sqlite", "memory", "mysql"), default="sqlite")
+    parser.add_argument('--reset', action='store_true', help="Empty the rule and record tables of a used database")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per measured endpoint")
+    parser.add_argument('--parse-sample', type=int, default=1000, help="Definitions parsed one by one")
+    parser.add_argument('--full-table-limit', type=int, default=100_000,
+                        help="Largest rule count for which the unpaginated /get-rules is measured")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--out', help="Write the JSON results here instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run(args)
+    output = json.dumps(result, indent=2, sort_keys=True) + '\n'
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""In-process caches for data that is read on every request but rarely written."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from textx import TextXSyntaxError
+
+from rule_engine import ProfileClassifier
+
+
+class DomainCache:
+    """Cache of the ``valid_*`` vocabulary tables.
+
+    Each table is held both as an ordered tuple (for messages and listings)
+    and as a frozenset for O(1) membership checks. Writers call
+    ``invalidate`` once their transaction has committed; ``ttl`` bounds how
+    long other worker processes can serve a stale copy.
+    """
+
+    def __init__(self, loader, ttl=None):
+        self._loader = loader
+        self._ttl = ttl
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, table):
+        entry = self._tables.get(table)
+        if entry is not None and (self._ttl is None or time.monotonic() - entry[2] < self._ttl):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        version = self.version
+        values = tuple(self._loader(table))
+        entry = (values, frozenset(values), time.monotonic())
+        with self._lock:
+            # Don't keep a copy loaded before a concurrent invalidation
+            if version == self.version:
+                self._tables[table] = entry
+        return entry
+
+    def values(self, table):
+        return self._entry(table)[0]
+
+    def contains(self, table, value):
+        return value in self._entry(table)[1]
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+            self.version += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "tables": sorted(self._tables),
+            "version": self.version
+        }
+
+
+class SchemaCatalog:
+    """Record types and attributes behind the ``Type.field`` rule variables.
+
+    Loaded from the database once, then patched in place by the data model
+    writers. ``version`` increases on every change so callers can tell
+    whether the set of variables moved.
+    """
+
+    def __init__(self, loader, ttl=None):
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self.types = {}         # type_id -> type name
+        self.attributes = {}    # attr_id -> (type_id, attr name, attr type)
+        self._variables = {}    # "Type.field" -> attr_id
+        self.version = 0
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and (
+                self._ttl is None or time.monotonic() - self._loaded_at < self._ttl):
+            return
+        types, attributes = {}, {}
+        for row in self._loader():
+            types[row['type_id']] = row['type_name']
+            if row['attr_id'] is not None:
+                attributes[row['attr_id']] = (row['type_id'], row['attr_name'], row['attr_type'])
+        with self._lock:
+            self.types = types
+            self.attributes = attributes
+            self._rebuild()
+            self._loaded_at = time.monotonic()
+
+    def _rebuild(self):
+        self._variables = {
+            f"{self.types[type_id]}.{name}": attr_id
+            for attr_id, (type_id, name, _) in self.attributes.items()
+            if type_id in self.types
+        }
+        self.version += 1
+
+    def variables(self):
+        self._ensure_loaded()
+        return list(self._variables)
+
+    def snapshot(self):
+        """Return ``(types, attributes)`` as currently loaded"""
+        self._ensure_loaded()
+        with self._lock:
+            return self.types, self.attributes
+
+    def has_variable(self, variable):
+        self._ensure_loaded()
+        return variable in self._variables
+
+    def add_record_type(self, type_id, name):
+        with self._lock:
+            self.types = {**self.types, type_id: name}
+            self._rebuild()
+
+    def add_attribute(self, attr_id, type_id, name, attr_type):
+        with self._lock:
+            self.attributes = {**self.attributes, attr_id: (type_id, name, attr_type)}
+            self._rebuild()
+
+    def update_attribute(self, attr_id, name, attr_type):
+        with self._lock:
+            current = self.attributes.get(attr_id)
+            if current is None:
+                return
+            self.attributes = {**self.attributes, attr_id: (current[0], name, attr_type)}
+            self._rebuild()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+            self.version += 1
+
+
+class ParseCache:
+    """Bounded LRU of DSL parse results keyed by a hash of the text.
+
+    Successful parses keep the textX model; syntax errors keep their message
+    and location so the same broken text is not parsed twice either. The
+    text is hashed as given: locations in the model and in errors depend on
+    leading lines and indentation. Models are shared between requests and
+    must be treated as read-only.
+    """
+
+    def __init__(self, parse, maxsize=1024):
+        self._parse = parse
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.parse_seconds = 0.0
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def parse(self, text):
+        """Return the model for text, raising TextXSyntaxError like the parser"""
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            self.misses += 1
+            started = time.perf_counter()
+            try:
+                entry = (self._parse(text), None)
+            except TextXSyntaxError as e:
+                entry = (None, (e.message, e.line, e.col))
+            finally:
+                self.parse_seconds += time.perf_counter() - started
+            with self._lock:
+                self._entries[key] = entry
+                if len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+
+        model, error = entry
+        if error is not None:
+            raise TextXSyntaxError(*error)
+        return model
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "size": len(self._entries),
+            "maxsize": self._maxsize,
+            "parse_seconds": round(self.parse_seconds, 6)
+        }
+
+
+class ProfileClassCache:
+    """LRU/TTL cache of results computed from the rule set for a profile.
+
+    Entries are keyed by the profile's equivalence class (see
+    ``ProfileClassifier``) plus a caller-supplied ``extra`` key, so all
+    profiles in a class share one entry. When rules change, only entries
+    whose class a changed rule could fire for, or whose class was split by
+    a new threshold, are dropped. Results involving ``Type.field`` rules
+    are also keyed by the record data version.
+    """
+
+    def __init__(self, engine, maxsize=4096, ttl=None):
+        self._engine = engine
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()   # key -> (value, profile, created)
+        self._lock = threading.Lock()
+        self._classifier = ProfileClassifier(engine.rules.values())
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        engine.listeners.append(self._rules_changed)
+
+    def _records_version(self):
+        records = self._engine.records
+        if self._classifier.uses_records and records is not None:
+            return records.version
+        return None
+
+    def get(self, profile, extra, compute):
+        """Return the cached result for profile's class, computing it on a miss"""
+        key = (self._classifier.key(profile), self._records_version(), extra)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self._ttl is None or time.monotonic() - entry[2] < self._ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        self.misses += 1
+        classifier = self._classifier
+        value = compute()
+        with self._lock:
+            # Don't store a result computed against rules that changed meanwhile
+            if classifier is self._classifier:
+                self._entries[key] = (value, profile, time.monotonic())
+                self._entries.move_to_end(key)
+                if len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _rules_changed(self, replaced, added):
+        if replaced is None:
+            classifier = ProfileClassifier(self._engine.rules.values())
+            with self._lock:
+                self._classifier = classifier
+                self.invalidated += len(self._entries)
+                self._entries.clear()
+            return
+        with self._lock:
+            # Only the new rules can add thresholds or values
+            classifier = self._classifier = self._classifier.extended(added)
+            changed = list(replaced) + list(added)
+            for key, (_, profile, _) in list(self._entries.items()):
+                if key[0] != classifier.key(profile) or any(rule.predicate(profile) for rule in changed):
+                    del self._entries[key]
+                    self.invalidated += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "size": len(self._entries),
+            "maxsize": self._maxsize,
+            "invalidated": self.invalidated
+        }
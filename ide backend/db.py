@@ -0,0 +1,258 @@
+"""Pooled MySQL connections and a request-scoped unit of work.
+
+Each request borrows at most one connection from the pool, the first time it
+asks for a cursor, and every cursor in the request shares it. The
+transaction commits once the view has returned a successful (< 400)
+response and is rolled back otherwise, so a request that fails half way
+leaves no partial rows behind.
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Fixed-size pool of DB-API connections.
+
+    Connections are created lazily up to ``size``; callers beyond that wait
+    up to ``timeout`` seconds. A connection idle for longer than
+    ``health_check_interval`` is pinged before it is handed out and replaced
+    if the ping fails.
+    """
+
+    def __init__(self, connect, size=10, timeout=5.0, health_check_interval=30.0):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # Entries are (connection, last_used); a None connection is a free
+        # slot whose connection was discarded and must be re-created
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.health_check_failures = 0
+
+    def _new_connection(self):
+        try:
+            return self.connect()
+        except Exception:
+            # Give the slot back so the pool does not shrink
+            self._idle.put((None, 0))
+            raise
+
+    def acquire(self):
+        started = time.perf_counter()
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                reserve = self._created < self.size
+                if reserve:
+                    self._created += 1
+            if reserve:
+                conn, last_used = None, 0
+            else:
+                self.waits += 1
+                try:
+                    conn, last_used = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = time.perf_counter() - started
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        if conn is not None and time.monotonic() - last_used > self.health_check_interval:
+            try:
+                conn.ping()
+            except Exception:
+                self.health_check_failures += 1
+                self._close(conn)
+                conn = None
+        if conn is None:
+            conn = self._new_connection()
+
+        with self._lock:
+            self.checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self._in_use -= 1
+        if discard:
+            self._close(conn)
+            self._idle.put((None, 0))
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    def clear(self):
+        """Close the idle connections, e.g. in a process forked after they were opened"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if conn is not None:
+                self._close(conn)
+            with self._lock:
+                self._created -= 1
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection outside a request; commits on success.
+
+        Anything else, including a streaming generator closed before the
+        end (GeneratorExit), rolls back and returns the connection.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+                raise
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "created": self._created,
+            "in_use": self._in_use,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "timeouts": self.timeouts,
+            "health_check_failures": self.health_check_failures
+        }
+
+
+def get_connection():
+    """Return the connection of the current unit of work, borrowing one if needed"""
+    if 'db_conn' not in g:
+        g.db_conn = current_app.extensions['db_pool'].acquire()
+    return g.db_conn
+
+
+class RecordingCursor:
+    """Cursor that appends ``(statement, seconds)`` to a list for every statement"""
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def _timed(self, method, query, *args):
+        started = time.perf_counter()
+        try:
+            return method(query, *args)
+        finally:
+            self._statements.append((query, time.perf_counter() - started))
+
+    def execute(self, query, *args):
+        return self._timed(self._cursor.execute, query, *args)
+
+    def executemany(self, query, *args):
+        return self._timed(self._cursor.executemany, query, *args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+@contextmanager
+def get_cursor():
+    """Context manager for handling database cursors.
+
+    While the unit of work has a ``g.db_statements`` list (see metrics.py),
+    the statements run on the cursor are recorded in it.
+    """
+    cur = None
+    try:
+        cur = get_connection().cursor()
+        statements = g.get('db_statements')
+        if statements is not None:
+            cur = RecordingCursor(cur, statements)
+        yield cur
+    except Exception as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        raise
+    finally:
+        if cur:
+            cur.close()
+
+
+def after_commit(callback):
+    """Run callback once the current unit of work has committed"""
+    g.setdefault('db_on_commit', []).append(callback)
+
+
+def init_app(app, pool):
+    """Register the pool and the unit-of-work hooks on app"""
+    app.extensions['db_pool'] = pool
+
+    @app.after_request
+    def finish_unit_of_work(response):
+        conn = g.pop('db_conn', None)
+        if conn is None:
+            return response
+
+        callbacks = g.pop('db_on_commit', [])
+        try:
+            if response.status_code < 400:
+                conn.commit()
+            else:
+                conn.rollback()
+        except Exception as e:
+            app.logger.error(f"Database error at end of request: {str(e)}")
+            pool.release(conn, discard=True)
+            raise
+        pool.release(conn)
+
+        if response.status_code < 400:
+            for callback in callbacks:
+                callback()
+        return response
+
+    @app.teardown_appcontext
+    def release_connection(exc):
+        # Reached with a connection only when after_request did not run
+        # (unhandled error, streamed response, or a bare app context)
+        conn = g.pop('db_conn', None)
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            pool.release(conn, discard=True)
+            return
+        pool.release(conn)
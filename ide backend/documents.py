@@ -0,0 +1,185 @@
+"""Server-side editing sessions for multi-definition DSL documents.
+
+A document is split at every top-level ``rule`` / ``workout_day`` keyword
+into one chunk per definition. Diagnostics are remembered per chunk text, so
+after an edit only chunks whose text changed are parsed and validated again.
+"""
+import hashlib
+import re
+import threading
+import time
+import uuid
+
+# Keywords that start a definition, outside string literals and not a field
+# of a record variable (``Exercise.rule``)
+_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|(?<![.\w])(rule|workout_day)\b')
+
+
+class EditError(ValueError):
+    pass
+
+
+class VersionConflict(EditError):
+    pass
+
+
+def split_definitions(text):
+    """Return ``[(offset, chunk_text)]`` covering text, one per definition.
+
+    Anything before the first definition keyword becomes its own chunk when
+    it is not blank, so stray text still gets a diagnostic.
+    """
+    starts = [m.start(1) for m in _TOKENS.finditer(text) if m.group(1)]
+    if not starts or text[:starts[0]].strip():
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    return [(bounds[i], text[bounds[i]:bounds[i + 1]]) for i in range(len(starts))]
+
+
+def apply_edits(text, edits):
+    """Apply edits in order, each relative to the result of the previous one.
+
+    An edit is ``{"start": int, "end": int, "text": str}`` replacing
+    ``text[start:end]``; without start/end it replaces the whole document.
+    """
+    for edit in edits:
+        new_text = edit.get('text', '')
+        if not isinstance(new_text, str):
+            raise EditError("Edit text must be a string")
+        if 'start' not in edit and 'end' not in edit:
+            text = new_text
+            continue
+        start = edit.get('start', 0)
+        end = edit.get('end', start)
+        if not (isinstance(start, int) and isinstance(end, int) and 0 <= start <= end <= len(text)):
+            raise EditError(f"Invalid edit range {start}-{end} for document of length {len(text)}")
+        text = text[:start] + new_text + text[end:]
+    return text
+
+
+class DocumentSession:
+    def __init__(self, session_id, text):
+        self.id = session_id
+        self.text = text
+        self.version = 0
+        self.chunks = []         # [(offset, chunk_text, key)]
+        self.diagnostics = {}    # chunk key -> diagnostics relative to the chunk
+        self.generation = None
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    """Holds document sessions and re-validates only the definitions that change.
+
+    ``check(chunk_text)`` returns the diagnostics for one definition as a
+    list of ``{"line", "column", "message"}`` dicts relative to the chunk.
+    Sessions idle for ``idle_seconds`` are evicted, as are the least
+    recently used ones beyond ``max_sessions``. When ``generation()``
+    returns a new value (e.g. the vocabulary changed) every definition is
+    checked again on the next edit.
+    """
+
+    def __init__(self, check, generation=lambda: None, idle_seconds=900, max_sessions=1000):
+        self._check = check
+        self._generation = generation
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        now = time.monotonic()
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session.last_access > self.idle_seconds:
+                    del self._sessions[session_id]
+            if len(self._sessions) > self.max_sessions:
+                by_age = sorted(self._sessions.values(), key=lambda s: s.last_access)
+                for session in by_age[:len(self._sessions) - self.max_sessions]:
+                    del self._sessions[session.id]
+
+    def create(self, text):
+        self._evict()
+        session = DocumentSession(uuid.uuid4().hex, text)
+        with self._lock:
+            self._sessions[session.id] = session
+        with session.lock:
+            return session, self._revalidate(session)
+
+    def get(self, session_id):
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def edit(self, session, edits, version=None):
+        """Apply edits and return the diagnostics of the definitions that changed"""
+        with session.lock:
+            if version is not None and version != session.version:
+                raise VersionConflict(f"Version mismatch: session is at {session.version}")
+            session.text = apply_edits(session.text, edits)
+            session.version += 1
+            session.last_access = time.monotonic()
+            return self._revalidate(session)
+
+    def _revalidate(self, session):
+        chunks = []
+        changed = []
+        diagnostics = {}
+        generation = self._generation()
+        previous = session.diagnostics if generation == session.generation else {}
+
+        for index, (offset, chunk) in enumerate(split_definitions(session.text)):
+            key = hashlib.sha1(chunk.encode('utf-8')).hexdigest()
+            chunks.append((offset, chunk, key))
+            if key in diagnostics:
+                continue
+            if key in previous:
+                diagnostics[key] = previous[key]
+                continue
+            diagnostics[key] = self._check(chunk) if chunk.strip() else []
+            changed.append(index)
+
+        session.chunks = chunks
+        session.diagnostics = diagnostics
+        session.generation = generation
+        return {
+            "changed": [self._describe(session, index) for index in changed],
+            "definitions": len(chunks),
+            "reused": len(chunks) - len(changed),
+            "errors": sum(len(diagnostics[key]) for _, _, key in chunks)
+        }
+
+    def all_diagnostics(self, session):
+        with session.lock:
+            return [self._describe(session, index) for index in range(len(session.chunks))]
+
+    @staticmethod
+    def _describe(session, index):
+        offset, chunk, key = session.chunks[index]
+        before = session.text[:offset]
+        start_line = before.count('\n') + 1
+        start_column = offset - (before.rfind('\n') + 1) + 1
+
+        located = []
+        for diagnostic in session.diagnostics[key]:
+            line = diagnostic.get('line') or 1
+            column = diagnostic.get('column') or 1
+            located.append({
+                **diagnostic,
+                "line": start_line + line - 1,
+                "column": column + start_column - 1 if line == 1 else column
+            })
+
+        return {
+            "index": index,
+            "line": start_line,
+            "definition": chunk.strip().split('\n', 1)[0][:80],
+            "diagnostics": located
+        }
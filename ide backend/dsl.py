@@ -0,0 +1,182 @@
+"""Workout DSL grammar and the textX metamodel built from it.
+
+The metamodel is built on first use rather than at import. textX generates
+Python classes while building it, so it cannot be pickled to disk; instead
+workers that should start warm build it once before forking (see
+``WORKOUT_DSL_WARM_METAMODEL`` in main.py).
+"""
+import hashlib
+import threading
+import time
+
+from textx import metamodel_from_str
+from textx.export import metamodel_export
+
+# DSL Grammar Definition
+DSL_GRAMMAR = """
+Program:
+    (workout_definitions+=WorkoutDefinition | rule_definitions+=RuleDefinition)*
+;
+
+WorkoutDefinition:
+    day=WorkoutDay muscle_group=MuscleGroup goal=Goal duration=Duration GenerateRoutine
+;
+
+WorkoutDay:
+    'workout_day' day_of_week=DayOfWeek
+;
+
+DayOfWeek:
+    "Monday" | "Tuesday" | "Wednesday" | "Thursday" 
+    | "Friday" | "Saturday" | "Sunday"
+;
+
+MuscleGroup:
+    'muscle_group' muscles+=Muscle (',' muscles+=Muscle)*
+;
+
+Muscle:
+    "Chest" | "Back" | "Legs" | "Shoulders" 
+    | "Arms" | "Core" | "Full Body" | "Dorsales"
+;
+
+Goal:
+    'goal' goal_type=GoalType
+;
+
+GoalType:
+    "Muscle Gain" | "Fat Loss" | "Strength" | "Endurance"
+;
+
+Duration:
+    'duration' time=Time
+;
+
+Time:
+    minutes=INT 'm'
+;
+
+GenerateRoutine:
+    'generate_routine'
+;
+
+ExerciseDefinition:
+    Exercise Sets Repetitions RestPeriod
+;
+
+Exercise:
+    'exercise' name=ID
+;
+
+Sets:
+    'sets' count=INT
+;
+
+Repetitions:
+    'repetitions' count=INT
+;
+
+RestPeriod:
+    'rest' time=Time
+;
+
+RuleDefinition:
+    'rule' name=RuleName 'if' condition=Condition 'then' action=Action
+;
+
+RuleName:
+    'Rule' number=INT
+;
+
+Condition:
+    conditions+=ConditionExpr ('and' conditions+=ConditionExpr)*
+;
+
+ConditionExpr:
+    variable=Variable operator=Operator value=Value
+;
+
+Variable:
+    SimpleVariable | RecordVariable
+;
+
+SimpleVariable:
+    "muscle_group" | "goal" | "duration" | "age" | "fitness_level"
+;
+
+RecordVariable:
+    record_type=ID '.' field=ID
+;
+
+Operator:
+    "==" | "!=" | "<=" | ">=" | "<" | ">"
+;
+
+Value:
+    STRING | INT | GoalType | Level
+;
+
+Level:
+    "Beginner" | "Intermediate" | "Advanced"
+;
+
+Action:
+    ExerciseAction | SetsRepsAction | RestTimeAction
+;
+
+ExerciseAction:
+    'include_exercise' exercise=STRING
+;
+
+SetsRepsAction:
+    'sets' sets_count=INT 'reps' reps_count=INT
+;
+
+RestTimeAction:
+    'set_rest_time' 'min' min_time=Time 'max' max_time=Time
+;
+"""
+
+GRAMMAR_HASH = hashlib.sha256(DSL_GRAMMAR.encode('utf-8')).hexdigest()
+
+_metamodel = None
+_lock = threading.Lock()
+build_seconds = None
+
+
+def get_metamodel():
+    """Return the metamodel for DSL_GRAMMAR, building it on first use"""
+    global _metamodel, build_seconds
+    if _metamodel is None:
+        with _lock:
+            if _metamodel is None:
+                started = time.perf_counter()
+                _metamodel = metamodel_from_str(DSL_GRAMMAR)
+                build_seconds = time.perf_counter() - started
+    return _metamodel
+
+
+def parse(text):
+    return get_metamodel().model_from_str(text)
+
+
+def export_dot(path):
+    """Write the metamodel diagram unless the file already matches this grammar.
+
+    The first line of the file records the grammar hash it was exported from.
+    Returns True if the file was written.
+    """
+    marker = f"// grammar {GRAMMAR_HASH}\n"
+    try:
+        with open(path) as f:
+            if f.readline() == marker:
+                return False
+    except OSError:
+        pass
+
+    metamodel_export(get_metamodel(), path)
+    with open(path) as f:
+        content = f.read()
+    with open(path, 'w') as f:
+        f.write(marker + content)
+    return True
@@ -1,11 +1,28 @@
-from MySQLdb import IntegrityError
-from flask import Flask, request, jsonify
+import time
+
+# Import-to-ready time is measured from here to the end of this module
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, has_app_context, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_mysqldb import MySQL
-from textx.export import metamodel_export
-from textx import metamodel_from_str, TextXSyntaxError
+from textx import TextXSyntaxError
+import base64
+import json
 import logging
-from contextlib import contextmanager
+import os
+import db
+import dsl
+import storage
+from rule_engine import ProfileError, RuleEngine, SIMPLE_VARIABLES, normalize_profile, rule_data_from_definition
+from batch import iter_results
+from db import ConnectionPool, after_commit, get_cursor
+from caches import DomainCache, ParseCache, ProfileClassCache, SchemaCatalog
+from projection import RecordProjection
+from snapshots import SnapshotBuilder
+from metrics import Metrics, cache_collector, pool_collector
+from documents import EditError, SessionStore, VersionConflict, split_definitions
+from routine_generator import routines_for_program, PACKING_MODES, DEFAULT_TIME_LIMIT_MS
+from rule_analysis import Pruner, analyze
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -27,197 +44,277 @@ app.config['MYSQL_USER'] = 'root'
 app.config['MYSQL_PASSWORD'] = '1234'
 app.config['MYSQL_DB'] = 'workout_dsl'
 app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
+# "mysql" uses the settings above; "sqlite:<path>" an embedded SQLite file
+# and "memory" a database private to the process (see storage.py)
+app.config['DATABASE'] = os.environ.get('WORKOUT_DSL_DATABASE', 'mysql')
+# Connections kept open per worker process; requests beyond this wait up to
+# DB_POOL_TIMEOUT seconds, and idle connections are pinged before reuse
+app.config['DB_POOL_SIZE'] = int(os.environ.get('WORKOUT_DSL_DB_POOL_SIZE', 10))
+app.config['DB_POOL_TIMEOUT'] = 5.0
+app.config['DB_POOL_HEALTH_CHECK_SECONDS'] = 30.0
+
+# Upper bound for the process pool used by /evaluate-batch
+app.config['BATCH_MAX_WORKERS'] = os.cpu_count() or 1
+
+MAX_RULES_PAGE_SIZE = 1000
+# Rows per multi-row INSERT issued by /import-rules
+IMPORT_BATCH_SIZE = 1000
+
+# Seconds a worker may serve valid_* vocabularies written by another worker
+app.config['DOMAIN_CACHE_TTL'] = 300
+app.config['PARSE_CACHE_SIZE'] = 1024
+# Evaluation and routine results shared by every profile in the same
+# equivalence class under the current rules
+app.config['RESULT_CACHE_SIZE'] = 4096
+app.config['RESULT_CACHE_TTL'] = 300
+# Seconds between checks for rules written by other workers; 0 disables the
+# background rebuild of the rule snapshot
+app.config['RULE_SNAPSHOT_INTERVAL'] = 30
+# Rules left out of evaluation (see rule_analysis.py): "dead" rules can never
+# fire, so results are unchanged. "redundant" also drops duplicate and subsumed
+# rules: the same kinds of action still fire, but once instead of once per
+# rule, so exercises score lower in generated routines, and those rules are
+# no longer reported by name. Redundant rules are found by the background
+# snapshot thread, so they stay in evaluation while RULE_SNAPSHOT_INTERVAL is 0
+app.config['RULE_PRUNING'] = os.environ.get('WORKOUT_DSL_RULE_PRUNING', 'dead')
+app.config['DOCUMENT_SESSION_IDLE_SECONDS'] = 900
+app.config['MAX_DOCUMENT_SESSIONS'] = 1000
+
+# Fraction of requests whose wall time, SQL statements and parse time are
+# recorded for /metrics (0 turns it off); sampled requests taking at least
+# SLOW_REQUEST_SECONDS are logged with their statements
+app.config['METRICS_SAMPLE_RATE'] = float(os.environ.get('WORKOUT_DSL_METRICS_SAMPLE_RATE', 1.0))
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ.get('WORKOUT_DSL_SLOW_REQUEST_SECONDS', 1.0))
+
+# Development only: write workout_dsl_ast.dot when the grammar changes
+app.config['EXPORT_METAMODEL_DOT'] = os.environ.get('WORKOUT_DSL_EXPORT_DOT') == '1'
+# Build the metamodel at import instead of on the first parse; use with
+# gunicorn --preload so it is built once in the master before forking
+app.config['WARM_METAMODEL'] = os.environ.get('WORKOUT_DSL_WARM_METAMODEL') == '1'
+# Warn at startup about indexes the hot queries rely on (see migrations.py)
+app.config['CHECK_INDEXES'] = os.environ.get('WORKOUT_DSL_CHECK_INDEXES', '1') == '1'
+
+
+storage_backend = storage.from_config(app.config)
+
+# One connection and one transaction per request, see db.py
+db_pool = ConnectionPool(
+    storage_backend.connect,
+    size=min(app.config['DB_POOL_SIZE'], storage_backend.max_connections or app.config['DB_POOL_SIZE']),
+    timeout=app.config['DB_POOL_TIMEOUT'],
+    health_check_interval=app.config['DB_POOL_HEALTH_CHECK_SECONDS']
+)
+db.init_app(app, db_pool)
+
+app_metrics = Metrics(
+    sample_rate=app.config['METRICS_SAMPLE_RATE'],
+    slow_request_seconds=app.config['SLOW_REQUEST_SECONDS'],
+    logger=app.logger
+)
+app_metrics.init_app(app)
+parse_program = app_metrics.timed(dsl.parse, app_metrics.parse_seconds)
+
+# Shared by /validate-rule and /add-rule, so adding a rule the IDE has just
+# validated does not parse it again
+parse_cache = ParseCache(parse_program, maxsize=app.config['PARSE_CACHE_SIZE'])
 
-mysql = MySQL(app)
-
-# DSL Grammar Definition
-DSL_GRAMMAR = """
-Program:
-    (workout_definitions+=WorkoutDefinition | rule_definitions+=RuleDefinition)*
-;
-
-WorkoutDefinition:
-    WorkoutDay MuscleGroup Goal Duration GenerateRoutine
-;
-
-WorkoutDay:
-    'workout_day' day_of_week=DayOfWeek
-;
-
-DayOfWeek:
-    "Monday" | "Tuesday" | "Wednesday" | "Thursday" 
-    | "Friday" | "Saturday" | "Sunday"
-;
-
-MuscleGroup:
-    'muscle_group' muscles+=Muscle (',' muscles+=Muscle)*
-;
-
-Muscle:
-    "Chest" | "Back" | "Legs" | "Shoulders" 
-    | "Arms" | "Core" | "Full Body" | "Dorsales"
-;
-
-Goal:
-    'goal' goal_type=GoalType
-;
-
-GoalType:
-    "Muscle Gain" | "Fat Loss" | "Strength" | "Endurance"
-;
-
-Duration:
-    'duration' time=Time
-;
-
-Time:
-    minutes=INT 'm'
-;
-
-GenerateRoutine:
-    'generate_routine'
-;
+# Helper Functions
+def attach_rule_details(cur, rules, all_rules=False):
+    """Attach conditions and actions to rule rows using two set-based queries.
+
+    ``all_rules`` means ``rules`` is the whole table, so the detail queries
+    can skip the ``IN`` filter.
+    """
+    by_id = {
+        rule['id']: {
+            'id': rule['id'],
+            'name': rule['name'],
+            'conditions': [],
+            'actions': []
+        }
+        for rule in rules
+    }
+    if not by_id:
+        return []
 
-ExerciseDefinition:
-    Exercise Sets Repetitions RestPeriod
-;
+    if all_rules:
+        where, params = "", ()
+    else:
+        where = f"WHERE rule_id IN ({', '.join(['%s'] * len(by_id))})"
+        params = tuple(by_id)
 
-Exercise:
-    'exercise' name=ID
-;
+    cur.execute(f"SELECT * FROM conditions {where} ORDER BY rule_id, id", params)
+    for row in cur.fetchall():
+        if row['rule_id'] in by_id:
+            by_id[row['rule_id']]['conditions'].append(dict(row))
 
-Sets:
-    'sets' count=INT
-;
+    cur.execute(f"SELECT * FROM actions {where} ORDER BY rule_id, id", params)
+    for row in cur.fetchall():
+        if row['rule_id'] in by_id:
+            by_id[row['rule_id']]['actions'].append(dict(row))
 
-Repetitions:
-    'repetitions' count=INT
-;
+    return list(by_id.values())
 
-RestPeriod:
-    'rest' time=Time
-;
 
-RuleDefinition:
-    'rule' name=RuleName 'if' condition=Condition 'then' action=Action
-;
+def serialize_rule(rule_id):
+    """Serialize a rule with its conditions and actions"""
+    try:
+        with get_cursor() as cur:
+            cur.execute("SELECT id, name FROM rules WHERE id = %s", (rule_id,))
+            rule = cur.fetchone()
+            if not rule:
+                app.logger.warning(f"No rule found with ID {rule_id}")
+                return None
+            return attach_rule_details(cur, [rule])[0]
+    except Exception as e:
+        app.logger.error(f"Error serializing rule {rule_id}: {str(e)}")
+        return None
 
-RuleName:
-    'Rule' number=INT
-;
 
-Condition:
-    conditions+=ConditionExpr ('and' conditions+=ConditionExpr)*
-;
+def load_rules():
+    """Load every stored rule in its serialized form, ordered by id"""
+    with get_cursor() as cur:
+        cur.execute("SELECT id, name FROM rules ORDER BY id")
+        return attach_rule_details(cur, cur.fetchall(), all_rules=True)
 
-ConditionExpr:
-    variable=Variable operator=Operator value=Value
-;
 
-Variable:
-    SimpleVariable | RecordVariable
-;
+def encode_rules_cursor(rule):
+    return base64.urlsafe_b64encode(json.dumps([rule['name'], rule['id']]).encode()).decode()
 
-SimpleVariable:
-    "muscle_group" | "goal" | "duration" | "age" | "fitness_level"
-;
 
-RecordVariable:
-    record_type=ID '.' field=ID
-;
+def decode_rules_cursor(cursor):
+    name, rule_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(name), int(rule_id)
 
-Operator:
-    "==" | "!=" | "<" | ">" | "<=" | ">="
-;
 
-Value:
-    STRING | INT | GoalType | Level
-;
+def fetch_rules_fingerprint():
+    """Cheap value that changes whenever rules, conditions or actions do"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM rules) as rules,
+                   (SELECT MAX(id) FROM rules) as max_rule,
+                   (SELECT COUNT(*) FROM conditions) as conditions,
+                   (SELECT MAX(id) FROM conditions) as max_condition,
+                   (SELECT COUNT(*) FROM actions) as actions,
+                   (SELECT MAX(id) FROM actions) as max_action
+        """)
+        return tuple(cur.fetchone().values())
 
-Level:
-    "Beginner" | "Intermediate" | "Advanced"
-;
 
-Action:
-    ExerciseAction | SetsRepsAction | RestTimeAction
-;
+def in_app_context(func):
+    """Wrap func so it can also run from a background thread"""
+    def call():
+        if has_app_context():
+            return func()
+        with app.app_context():
+            return func()
+    return call
 
-ExerciseAction:
-    'include_exercise' exercise=STRING
-;
 
-SetsRepsAction:
-    'sets' sets_count=INT 'reps' reps_count=INT
-;
+def get_rule_engine():
+    """Return the compiled rule engine, loading it from the database once"""
+    if not rule_engine.loaded:
+        snapshot_builder.rebuild()
+    snapshot_builder.start()
+    return rule_engine
 
-RestTimeAction:
-    'set_rest_time' 'min' min_time=Time 'max' max_time=Time
-;
-"""
 
-metamodel = metamodel_from_str(DSL_GRAMMAR)
+def fetch_valid_values(table_name):
+    with get_cursor() as cur:
+        cur.execute(f"SELECT name FROM {table_name}")
+        return [row['name'] for row in cur.fetchall()]
 
-metamodel_export(metamodel, 'workout_dsl_ast.dot')
 
-# Helper Functions
-@contextmanager
-def get_cursor():
-    """Context manager for handling database cursors"""
-    cur = None
-    try:
-        cur = mysql.connection.cursor()
-        yield cur
-        mysql.connection.commit()
-    except Exception as e:
-        mysql.connection.rollback()
-        app.logger.error(f"Database error: {str(e)}")
-        raise
-    finally:
-        if cur:
-            cur.close()
+domain_cache = DomainCache(fetch_valid_values, ttl=app.config['DOMAIN_CACHE_TTL'])
 
 
-def serialize_rule(rule_id):
-    """Serialize a rule with its conditions and actions"""
+def get_valid_values(table_name):
     try:
-        with get_cursor() as cur:
-            # Get rule basics
-            cur.execute("SELECT * FROM rules WHERE id = %s", (rule_id,))
-            rule = cur.fetchone()
-            if not rule:
-                app.logger.warning(f"No rule found with ID {rule_id}")
-                return None
-
-            # Get conditions
-            cur.execute("SELECT * FROM conditions WHERE rule_id = %s", (rule_id,))
-            conditions = cur.fetchall()
-
-            # Get actions
-            cur.execute("SELECT * FROM actions WHERE rule_id = %s", (rule_id,))
-            actions = cur.fetchall()
-
-            return {
-                'id': rule['id'],
-                'name': rule['name'],
-                'conditions': [dict(c) for c in conditions],
-                'actions': [dict(a) for a in actions]
-            }
+        return list(domain_cache.values(table_name))
     except Exception as e:
-        app.logger.error(f"Error serializing rule {rule_id}: {str(e)}")
-        return None
+        app.logger.error(f"Error fetching {table_name}: {str(e)}")
+        return []
 
 
-def get_valid_values(table_name):
+def is_valid_value(table_name, value):
     try:
-        with get_cursor() as cur:
-            cur.execute(f"SELECT name FROM {table_name}")
-            return [row['name'] for row in cur.fetchall()]
+        return domain_cache.contains(table_name, value)
     except Exception as e:
         app.logger.error(f"Error fetching {table_name}: {str(e)}")
-        return []
+        return False
+
+
+def fetch_schema_rows():
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT rt.id as type_id, rt.name as type_name,
+                   a.id as attr_id, a.name as attr_name, a.type as attr_type
+            FROM record_types rt
+            LEFT JOIN attributes a ON rt.id = a.record_type_id
+        """)
+        return cur.fetchall()
+
+
+schema_catalog = SchemaCatalog(fetch_schema_rows, ttl=app.config['DOMAIN_CACHE_TTL'])
+
+
+def fetch_record_value_rows(record_ids=None):
+    with get_cursor() as cur:
+        where, params = "", ()
+        if record_ids is not None:
+            if not record_ids:
+                return []
+            where = f"WHERE r.id IN ({', '.join(['%s'] * len(record_ids))})"
+            params = tuple(record_ids)
+        cur.execute(f"""
+            SELECT r.id as record_id, r.record_type_id as type_id,
+                   rv.attribute_id, rv.value
+            FROM records r
+            LEFT JOIN record_values rv ON r.id = rv.record_id
+            {where}
+        """, params)
+        return cur.fetchall()
+
+
+# Typed per-type copy of the records, used by /records and by rules with
+# Type.field conditions; record writers mark the records they touched
+record_projection = RecordProjection(
+    schema_catalog, fetch_record_value_rows, ttl=app.config['DOMAIN_CACHE_TTL'])
+
+rule_engine = RuleEngine(records=record_projection, prune=Pruner(app.config['RULE_PRUNING']))
+# Rebuilds the engine from the database in the background; readers keep
+# using the active snapshot until the new one is swapped in
+snapshot_builder = SnapshotBuilder(
+    rule_engine, in_app_context(load_rules), in_app_context(fetch_rules_fingerprint),
+    interval=app.config['RULE_SNAPSHOT_INTERVAL'], logger=app.logger)
+result_cache = ProfileClassCache(
+    rule_engine, maxsize=app.config['RESULT_CACHE_SIZE'], ttl=app.config['RESULT_CACHE_TTL'])
+app_metrics.collectors += [
+    cache_collector({"parse": parse_cache, "domain": domain_cache, "results": result_cache}),
+    pool_collector(db_pool)
+]
+
+
+def valid_variables():
+    return list(SIMPLE_VARIABLES) + schema_catalog.variables()
 
 
 # Endpoints
+@app.route('/health', methods=['GET'])
+def health():
+    """Endpoint reporting readiness and startup timings"""
+    return jsonify({
+        "status": "success",
+        "grammar_hash": dsl.GRAMMAR_HASH,
+        "metamodel_built": dsl.build_seconds is not None,
+        "database": storage_backend.describe(),
+        "startup": {
+            **startup_timings,
+            "metamodel_build_seconds": dsl.build_seconds
+        }
+    })
+
+
 @app.route('/init-db', methods=['POST'])
 def initialize_db():
     default_data = {
@@ -238,9 +335,10 @@ def initialize_db():
                 for value in values:
                     try:
                         cur.execute(f"INSERT INTO {table} (name) VALUES (%s)", (value,))
-                    except IntegrityError:
+                    except storage_backend.integrity_errors:
                         pass
-            return jsonify({"status": "success", "message": "Database initialized"})
+        after_commit(domain_cache.invalidate)
+        return jsonify({"status": "success", "message": "Database initialized"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -264,24 +362,14 @@ def get_valid_levels():
 # Endpoints
 @app.route('/analyze-grammar', methods=['GET'])
 def analyze_grammar():
-    try:
-        with get_cursor() as cur:
-            # Get simple variables
-            simple_vars = ["muscle_group", "goal", "duration", "age", "fitness_level"]
-
-            # Get record variables
-            cur.execute("""
-                SELECT rt.name as record_type, a.name as field
-                FROM record_types rt
-                JOIN attributes a ON rt.id = a.record_type_id
-            """)
-            record_vars = [f"{row['record_type']}.{row['field']}" for row in cur.fetchall()]
+    """Endpoint describing the grammar vocabulary.
 
-            # Combine variables
-            all_vars = simple_vars + record_vars
-
-        return jsonify({
-            "variables": all_vars,
+    Served from the in-process caches with a content ETag, so clients can
+    poll with If-None-Match and get a 304 until the grammar changes.
+    """
+    try:
+        response = jsonify({
+            "variables": valid_variables(),
             "operators": ["==", "!=", "<", ">", "<=", ">="],
             "actions": ["include_exercise", "sets", "set_rest_time"],
             "exercise_names": get_valid_values('valid_exercises'),
@@ -290,29 +378,126 @@ def analyze_grammar():
             "muscles": get_valid_values('valid_muscles'),
             "customizable_sr": True
         })
+        response.headers['X-Schema-Version'] = str(schema_catalog.version)
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route('/rules-version', methods=['GET'])
+def rules_version():
+    """Endpoint reporting the active rule snapshot and its background builder"""
+    return jsonify({
+        "status": "success",
+        "loaded": rule_engine.loaded,
+        **rule_engine.snapshot.describe(),
+        "builder": snapshot_builder.status()
+    })
+
+
+@app.route('/analyze-rules', methods=['GET'])
+def analyze_rules():
+    """Endpoint reporting dead, duplicate and subsumed rules.
+
+    Analyzes the active snapshot; ``reload=1`` rebuilds it from the
+    database first.
+    """
+    try:
+        if request.args.get('reload') == '1':
+            snapshot_builder.rebuild()
+            get_rule_engine().refresh_redundant()
+        snapshot = get_rule_engine().snapshot
+        report = analyze(snapshot.rules.values())
+        return jsonify({
+            "status": "success",
+            "version": snapshot.version,
+            "pruning": app.config['RULE_PRUNING'],
+            "pruned": sorted(snapshot.pruned),
+            **report
+        })
+    except Exception as e:
+        app.logger.error(f"Analyze rules error: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Endpoint exposing request, SQL, parse and cache metrics for Prometheus"""
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Endpoint reporting hit rates of the in-process caches"""
+    return jsonify({
+        "status": "success",
+        "parse": parse_cache.stats(),
+        "domain": domain_cache.stats(),
+        "schema": {"version": schema_catalog.version},
+        "results": result_cache.stats(),
+        "db_pool": db_pool.stats()
+    })
+
+
 @app.route('/get-rules', methods=['GET'])
 def get_rules():
-    """Endpoint to fetch all rules"""
+    """Endpoint to fetch rules ordered by name.
+
+    Without ``limit`` every rule is returned. With ``limit`` the response
+    holds one page and a ``next_cursor`` to pass back as ``cursor``.
+    """
     try:
-        with get_cursor() as cur:
-            cur.execute("SELECT id FROM rules ORDER BY name")
-            rule_ids = cur.fetchall()
-            rules = []
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
 
-            for row in rule_ids:
-                rule_data = serialize_rule(row['id'])
-                if rule_data:
-                    rules.append(rule_data)
+        if limit is not None and not (1 <= limit <= MAX_RULES_PAGE_SIZE):
+            return jsonify({
+                "status": "invalid",
+                "message": f"limit must be between 1-{MAX_RULES_PAGE_SIZE}"
+            }), 400
 
-            response = jsonify({
-                "status": "success",
-                "rules": rules
-            })
-            return response
+        where, params = "", []
+        if cursor:
+            try:
+                after_name, after_id = decode_rules_cursor(cursor)
+            except (ValueError, TypeError):
+                return jsonify({
+                    "status": "invalid",
+                    "message": "Invalid cursor"
+                }), 400
+            where = "WHERE name > %s OR (name = %s AND id > %s)"
+            params = [after_name, after_name, after_id]
+
+        with get_cursor() as cur:
+            query = f"SELECT id, name FROM rules {where} ORDER BY name, id"
+            if limit is not None:
+                # One extra row tells us whether another page exists
+                query += " LIMIT %s"
+                params.append(limit + 1)
+            cur.execute(query, tuple(params))
+            rows = cur.fetchall()
+
+            next_cursor = None
+            if limit is not None and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_rules_cursor(rows[-1])
+
+            full_table = limit is None and not cursor
+            rules = attach_rule_details(cur, rows, all_rules=full_table)
+
+            if full_table:
+                total = len(rules)
+            else:
+                cur.execute("SELECT COUNT(*) AS total FROM rules")
+                total = cur.fetchone()['total']
+
+        return jsonify({
+            "status": "success",
+            "rules": rules,
+            "total": total,
+            "next_cursor": next_cursor
+        })
 
     except Exception as e:
         app.logger.error(f"Error in get-rules: {str(e)}")
@@ -337,7 +522,7 @@ def add_rule():
             }), 400
 
         try:
-            model = metamodel.model_from_str(rule_text)
+            model = parse_cache.parse(rule_text)
             rule_def = model.rule_definitions[0]
 
         except TextXSyntaxError as e:
@@ -382,7 +567,7 @@ def add_rule():
 
             if hasattr(action, 'exercise'):
                 exercise_name = action.exercise.strip('"')
-                if exercise_name not in get_valid_exercises():
+                if not is_valid_value('valid_exercises', exercise_name):
                     return jsonify({
                         "status": "invalid",
                         "message": f"Invalid exercise: {exercise_name}",
@@ -435,11 +620,17 @@ def add_rule():
                 }), 400
 
             rule_data = serialize_rule(rule_id)
-            return jsonify({
-                "status": "success",
-                "message": f"Rule added with {action_type} action",
-                "rule": rule_data
-            })
+
+        def add_to_engine():
+            if rule_data and rule_engine.loaded:
+                rule_engine.add(rule_data)
+        after_commit(add_to_engine)
+
+        return jsonify({
+            "status": "success",
+            "message": f"Rule added with {action_type} action",
+            "rule": rule_data
+        })
 
     except Exception as e:
         app.logger.error(f"Add rule error: {str(e)}", exc_info=True)
@@ -449,6 +640,122 @@ def add_rule():
         }), 500
 
 
+def check_rule_definition(rule_def):
+    """Check a parsed rule against the grammar vocabulary.
+
+    Returns ``(serialized_rule, None)`` when the rule is valid, otherwise
+    ``(None, error)`` where error holds the message and any hints.
+    """
+    serialized_rule = {
+        "name": f"Rule {rule_def.name.number}",
+        "conditions": [],
+        "action": {}
+    }
+
+    for cond in rule_def.condition.conditions:
+        try:
+            var_str = f"{cond.variable.record_type}.{cond.variable.field}"
+        except AttributeError:
+            var_str = str(cond.variable)
+
+        operator = cond.operator
+        value = cond.value
+        str_value = str(value) if hasattr(value, '__str__') else value
+
+        condition_data = {
+            "variable": var_str,
+            "operator": operator,
+            "value": str_value
+        }
+        serialized_rule["conditions"].append(condition_data)
+
+        if var_str not in SIMPLE_VARIABLES and not schema_catalog.has_variable(var_str):
+            return None, {"message": f"Invalid variable: {var_str}. Valid variables: {', '.join(valid_variables())}"}
+
+        valid_ops = ["==", "!=", "<", ">", "<=", ">="]
+        if operator not in valid_ops:
+            return None, {"message": f"Invalid operator: {operator}. Valid operators: {', '.join(valid_ops)}"}
+
+        if var_str == "muscle_group":
+            if not is_valid_value('valid_muscles', str_value):
+                return None, {"message": f"Invalid muscle group: {str_value}. Valid muscles: {', '.join(get_valid_muscles())}"}
+
+        elif var_str == "goal":
+            if not is_valid_value('valid_goals', str_value):
+                return None, {"message": f"Invalid goal: {str_value}. Valid goals: {', '.join(get_valid_goals())}"}
+
+        elif var_str == "fitness_level":
+            if not is_valid_value('valid_levels', str_value):
+                return None, {"message": f"Invalid level: {str_value}. Valid levels: {', '.join(get_valid_levels())}"}
+
+        elif var_str == "duration":
+            duration_minutes = None
+            if isinstance(value, int):
+                duration_minutes = value
+            elif hasattr(value, 'minutes'):
+                duration_minutes = value.minutes
+            elif isinstance(str_value, str) and str_value.endswith('m'):
+                try:
+                    duration_minutes = int(str_value[:-1])
+                except ValueError:
+                    return None, {"message": "Duration must be a number (e.g., 30 or 30m)"}
+            else:
+                return None, {"message": "Duration must be in minutes (e.g., 30 or 30m)"}
+
+            if not (5 <= duration_minutes <= 180):
+                return None, {"message": "Duration must be between 5-180 minutes"}
+
+        elif var_str == "age":
+            try:
+                age = int(str_value)
+                if not (15 <= age <= 100):
+                    return None, {"message": "Age must be between 15-100"}
+            except ValueError:
+                return None, {"message": "Age must be a number"}
+
+    action = rule_def.action
+    if hasattr(action, 'exercise'):
+        exercise_name = action.exercise.strip('"') if isinstance(action.exercise, str) else str(action.exercise)
+        if not is_valid_value('valid_exercises', exercise_name):
+            return None, {"message": f"Invalid exercise: {exercise_name}. Valid exercises: {', '.join(get_valid_exercises())}"}
+        serialized_rule["action"]["type"] = "include_exercise"
+        serialized_rule["action"]["exercise"] = exercise_name
+
+    elif hasattr(action, 'sets_count') and hasattr(action, 'reps_count'):
+        if not (1 <= action.sets_count <= 10):
+            return None, {"message": "Sets must be between 1-10"}
+        if not (1 <= action.reps_count <= 20):
+            return None, {"message": "Reps must be between 1-20"}
+        serialized_rule["action"]["type"] = "sets_reps"
+        serialized_rule["action"]["sets_count"] = action.sets_count
+        serialized_rule["action"]["reps_count"] = action.reps_count
+
+    elif hasattr(action, 'min_time') and hasattr(action, 'max_time'):
+        min_seconds = action.min_time.minutes * 60
+        max_seconds = action.max_time.minutes * 60
+
+        if not (30 <= min_seconds <= 300):
+            return None, {"message": "Minimum rest time must be between 30-300 seconds"}
+
+        if not (60 <= max_seconds <= 600):
+            return None, {"message": "Maximum rest time must be between 60-600 seconds"}
+
+        if min_seconds > max_seconds:
+            return None, {"message": "Minimum rest time cannot be greater than maximum"}
+
+        serialized_rule["action"]["type"] = "rest_time"
+        serialized_rule["action"]["min_rest_time"] = min_seconds
+        serialized_rule["action"]["max_rest_time"] = max_seconds
+
+    else:
+        return None, {
+            "message": "Unknown action type",
+            "valid_actions": ["include_exercise", "sets X reps Y", "set_rest_time min Xm max Ym"]
+        }
+
+    return serialized_rule, None
+
+
 @app.route('/validate-rule', methods=['POST'])
 def validate_rule():
     """Endpoint to validate a rule without saving it"""
@@ -464,7 +771,7 @@ def validate_rule():
             }), 400
 
         try:
-            model = metamodel.model_from_str(rule_text)
+            model = parse_cache.parse(rule_text)
 
             if not hasattr(model, 'rule_definitions') or not model.rule_definitions:
                 return jsonify({
@@ -472,205 +779,448 @@ def validate_rule():
                     "message": "No rule definition found"
                 }), 400
 
+            serialized_rule, error = check_rule_definition(model.rule_definitions[0])
+            if error:
+                return jsonify({"status": "invalid", **error}), 400
+
+            return jsonify({
+                "status": "valid",
+                "message": "Rule is valid",
+                "rule": serialized_rule
+            })
+
+        except TextXSyntaxError as e:
+            error_msg = f"Syntax error: {e.message}"
+            if any(ex in e.message for ex in get_valid_exercises()):
+                error_msg += f". Valid exercises: {', '.join(get_valid_exercises())}"
+            elif "duration" in e.message:
+                error_msg += ". Duration must be in minutes (5-180) as number or with 'm' suffix"
+            elif "set_rest_time" in e.message:
+                error_msg += ". Format: 'set_rest_time min Xm max Ym' (e.g., 'set_rest_time min 1m max 2m')"
+            elif "variable" in e.message.lower():
+                error_msg += f". Valid variables: {', '.join(valid_variables())}"
+
+            return jsonify({
+                "status": "invalid",
+                "message": error_msg,
+                "location": {"line": e.line, "column": e.col}
+            }), 400
+
+    except Exception as e:
+        app.logger.error(f"Validation error: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
+
+
+def insert_rules(cur, rule_dicts):
+    """Write rules with their conditions and actions using batched inserts.
+
+    Sets the ``id`` of every rule dict. Relies on a single multi-row INSERT
+    receiving consecutive auto-increment ids starting at ``lastrowid``,
+    which InnoDB guarantees for simple inserts.
+    """
+    for start in range(0, len(rule_dicts), IMPORT_BATCH_SIZE):
+        batch = rule_dicts[start:start + IMPORT_BATCH_SIZE]
+        cur.executemany("INSERT INTO rules (name) VALUES (%s)", [(rule['name'],) for rule in batch])
+        first_id = cur.lastrowid
+        for offset, rule in enumerate(batch):
+            rule['id'] = first_id + offset
+
+        conditions = [
+            (rule['id'], cond['variable'], cond['operator'], cond['value'])
+            for rule in batch for cond in rule['conditions']
+        ]
+        if conditions:
+            cur.executemany("""
+                INSERT INTO conditions
+                (rule_id, variable, operator, value)
+                VALUES (%s, %s, %s, %s)
+            """, conditions)
+
+        actions = [
+            (rule['id'], action['action_type'], action.get('exercise_name'),
+             action.get('sets_count'), action.get('reps_count'),
+             action.get('min_rest_time'), action.get('max_rest_time'))
+            for rule in batch for action in rule['actions']
+        ]
+        if actions:
+            cur.executemany("""
+                INSERT INTO actions
+                (rule_id, action_type, exercise_name, sets_count, reps_count, min_rest_time, max_rest_time)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, actions)
+
+
+@app.route('/import-rules', methods=['POST'])
+def import_rules():
+    """Endpoint to validate and store every rule of a program in one transaction.
+
+    The program comes as an uploaded ``file``, as ``program`` in a JSON
+    body, or as the raw request body. Invalid rules are reported and
+    skipped; with ``atomic`` set, any invalid rule rejects the whole import.
+    Workout definitions are reported as skipped and never fail an import.
+    """
+    try:
+        started = time.perf_counter()
+        if 'file' in request.files:
+            text = request.files['file'].read().decode('utf-8')
+            atomic = request.form.get('atomic') in ('1', 'true')
+        elif request.is_json:
+            data = request.get_json() or {}
+            text = data.get('program', '')
+            atomic = bool(data.get('atomic', False))
+        else:
+            text = request.get_data(as_text=True)
+            atomic = request.args.get('atomic') in ('1', 'true')
+
+        if not isinstance(text, str) or not text.strip():
+            return jsonify({
+                "status": "invalid",
+                "message": "Program text is required"
+            }), 400
+
+        results = []
+        accepted = []
+        for index, (offset, chunk) in enumerate(split_definitions(text)):
+            if not chunk.strip():
+                continue
+            line = text.count('\n', 0, offset) + 1
+            result = {"index": index, "line": line, "definition": chunk.strip().split('\n', 1)[0][:80]}
+            results.append(result)
+
+            # Parsed directly: an import would only flush the shared parse cache
+            try:
+                model = parse_program(chunk)
+            except TextXSyntaxError as e:
+                result.update(status="rejected", message=f"Syntax error: {e.message}",
+                              location={"line": line + (e.line or 1) - 1, "column": e.col})
+                continue
+
+            if not model.rule_definitions:
+                result.update(status="skipped", message="Only rule definitions are imported")
+                continue
+
             rule_def = model.rule_definitions[0]
+            _, error = check_rule_definition(rule_def)
+            if error:
+                result.update(status="rejected", **error)
+                continue
+
+            result['status'] = "accepted"
+            rule_data = rule_data_from_definition(rule_def, None)
+            result['name'] = rule_data['name']
+            accepted.append((result, rule_data))
+
+        rejected = sum(1 for result in results if result['status'] == "rejected")
+        skipped = sum(1 for result in results if result['status'] == "skipped")
+        if not accepted or (atomic and rejected):
+            if rejected:
+                message = f"No rules were imported: {rejected} of {len(results) - skipped} rule definitions were rejected"
+            else:
+                message = "No rules were imported: the program has no rule definitions"
+            return jsonify({
+                "status": "invalid",
+                "message": message,
+                "accepted": 0,
+                "rejected": rejected,
+                "skipped": skipped,
+                "results": results
+            }), 400
 
-            with get_cursor() as cur:
-                valid_vars = ["muscle_group", "goal", "duration", "age", "fitness_level"]
-                cur.execute("""
-                    SELECT rt.name as record_type, a.name as field
-                    FROM record_types rt
-                    JOIN attributes a ON rt.id = a.record_type_id
-                """)
-                record_vars = [f"{row['record_type']}.{row['field']}" for row in cur.fetchall()]
-                all_valid_vars = valid_vars + record_vars
-
-            serialized_rule = {
-                "name": f"Rule {rule_def.name.number}",
-                "conditions": [],
-                "action": {}
-            }
+        rule_dicts = [rule_data for _, rule_data in accepted]
+        with get_cursor() as cur:
+            insert_rules(cur, rule_dicts)
+        for result, rule_data in accepted:
+            result['id'] = rule_data['id']
 
-            for cond in rule_def.condition.conditions:
-                try:
-                    var_str = f"{cond.variable.record_type}.{cond.variable.field}"
-                except AttributeError:
-                    var_str = str(cond.variable)
+        def add_to_engine():
+            if rule_engine.loaded:
+                rule_engine.add_many(rule_dicts)
+        after_commit(add_to_engine)
 
-                operator = cond.operator
-                value = cond.value
-                str_value = str(value) if hasattr(value, '__str__') else value
+        elapsed = time.perf_counter() - started
+        return jsonify({
+            "status": "success",
+            "message": f"Imported {len(accepted)} rules",
+            "accepted": len(accepted),
+            "rejected": rejected,
+            "skipped": skipped,
+            "results": results,
+            "seconds": round(elapsed, 3)
+        })
 
-                condition_data = {
-                    "variable": var_str,
-                    "operator": operator,
-                    "value": str_value
-                }
-                serialized_rule["conditions"].append(condition_data)
+    except Exception as e:
+        app.logger.error(f"Import rules error: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
 
-                if var_str not in all_valid_vars:
-                    return jsonify({
-                        "status": "invalid",
-                        "message": f"Invalid variable: {var_str}. Valid variables: {', '.join(all_valid_vars)}"
-                    }), 400
 
-                valid_ops = ["==", "!=", "<", ">", "<=", ">="]
-                if operator not in valid_ops:
-                    return jsonify({
-                        "status": "invalid",
-                        "message": f"Invalid operator: {operator}. Valid operators: {', '.join(valid_ops)}"
-                    }), 400
+def check_definition_text(text):
+    """Diagnostics for the text of a single rule or workout definition"""
+    try:
+        model = parse_cache.parse(text)
+    except TextXSyntaxError as e:
+        return [{"line": e.line, "column": e.col, "severity": "error",
+                 "message": f"Syntax error: {e.message}"}]
+
+    diagnostics = []
+    for rule_def in model.rule_definitions:
+        _, error = check_rule_definition(rule_def)
+        if error:
+            diagnostics.append({"line": 1, "column": 1, "severity": "error", "message": error['message']})
+    return diagnostics
+
+
+document_sessions = SessionStore(
+    check_definition_text,
+    generation=lambda: (domain_cache.version, schema_catalog.version),
+    idle_seconds=app.config['DOCUMENT_SESSION_IDLE_SECONDS'],
+    max_sessions=app.config['MAX_DOCUMENT_SESSIONS']
+)
+
+
+@app.route('/document-sessions', methods=['POST'])
+def create_document_session():
+    """Endpoint to open an editing session and validate the whole document"""
+    try:
+        data = request.get_json() or {}
+        text = data.get('text', '')
+        if not isinstance(text, str):
+            return jsonify({"status": "invalid", "message": "Document text must be a string"}), 400
 
-                if var_str == "muscle_group":
-                    if str_value not in get_valid_muscles():
-                        return jsonify({
-                            "status": "invalid",
-                            "message": f"Invalid muscle group: {str_value}. Valid muscles: {', '.join(get_valid_muscles())}"
-                        }), 400
-
-                elif var_str == "goal":
-                    if str_value not in get_valid_goals():
-                        return jsonify({
-                            "status": "invalid",
-                            "message": f"Invalid goal: {str_value}. Valid goals: {', '.join(get_valid_goals())}"
-                        }), 400
-
-                elif var_str == "fitness_level":
-                    if str_value not in get_valid_levels():
-                        return jsonify({
-                            "status": "invalid",
-                            "message": f"Invalid level: {str_value}. Valid levels: {', '.join(get_valid_levels())}"
-                        }), 400
-
-                elif var_str == "duration":
-                    duration_minutes = None
-                    if isinstance(value, int):
-                        duration_minutes = value
-                    elif hasattr(value, 'minutes'):
-                        duration_minutes = value.minutes
-                    elif isinstance(str_value, str) and str_value.endswith('m'):
-                        try:
-                            duration_minutes = int(str_value[:-1])
-                        except ValueError:
-                            return jsonify({
-                                "status": "invalid",
-                                "message": "Duration must be a number (e.g., 30 or 30m)"
-                            }), 400
-                    else:
-                        return jsonify({
-                            "status": "invalid",
-                            "message": "Duration must be in minutes (e.g., 30 or 30m)"
-                        }), 400
-
-                    if not (5 <= duration_minutes <= 180):
-                        return jsonify({
-                            "status": "invalid",
-                            "message": "Duration must be between 5-180 minutes"
-                        }), 400
-
-                elif var_str == "age":
-                    try:
-                        age = int(str_value)
-                        if not (15 <= age <= 100):
-                            return jsonify({
-                                "status": "invalid",
-                                "message": "Age must be between 15-100"
-                            }), 400
-                    except ValueError:
-                        return jsonify({
-                            "status": "invalid",
-                            "message": "Age must be a number"
-                        }), 400
+        session, result = document_sessions.create(text)
+        return jsonify({
+            "status": "success",
+            "session_id": session.id,
+            "version": session.version,
+            **result
+        }), 201
 
-            action = rule_def.action
-            if hasattr(action, 'exercise'):
-                exercise_name = action.exercise.strip('"') if isinstance(action.exercise, str) else str(action.exercise)
-                if exercise_name not in get_valid_exercises():
-                    return jsonify({
-                        "status": "invalid",
-                        "message": f"Invalid exercise: {exercise_name}. Valid exercises: {', '.join(get_valid_exercises())}"
-                    }), 400
-                serialized_rule["action"]["type"] = "include_exercise"
-                serialized_rule["action"]["exercise"] = exercise_name
+    except Exception as e:
+        app.logger.error(f"Document session error: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
 
-            elif hasattr(action, 'sets_count') and hasattr(action, 'reps_count'):
-                if not (1 <= action.sets_count <= 10):
-                    return jsonify({
-                        "status": "invalid",
-                        "message": "Sets must be between 1-10"
-                    }), 400
-                if not (1 <= action.reps_count <= 20):
-                    return jsonify({
-                        "status": "invalid",
-                        "message": "Reps must be between 1-20"
-                    }), 400
-                serialized_rule["action"]["type"] = "sets_reps"
-                serialized_rule["action"]["sets_count"] = action.sets_count
-                serialized_rule["action"]["reps_count"] = action.reps_count
 
-            elif hasattr(action, 'min_time') and hasattr(action, 'max_time'):
-                min_seconds = action.min_time.minutes * 60
-                max_seconds = action.max_time.minutes * 60
+@app.route('/document-sessions/<session_id>', methods=['GET'])
+def get_document_session(session_id):
+    """Endpoint returning the current diagnostics of every definition"""
+    session = document_sessions.get(session_id)
+    if session is None:
+        return jsonify({"status": "error", "message": "Session not found or expired"}), 404
+    return jsonify({
+        "status": "success",
+        "session_id": session.id,
+        "version": session.version,
+        "definitions": document_sessions.all_diagnostics(session)
+    })
 
-                if not (30 <= min_seconds <= 300):
-                    return jsonify({
-                        "status": "invalid",
-                        "message": "Minimum rest time must be between 30-300 seconds"
-                    }), 400
 
-                if not (60 <= max_seconds <= 600):
-                    return jsonify({
-                        "status": "invalid",
-                        "message": "Maximum rest time must be between 60-600 seconds"
-                    }), 400
+@app.route('/document-sessions/<session_id>/edits', methods=['POST'])
+def edit_document_session(session_id):
+    """Endpoint to apply text edits and re-validate only the changed definitions"""
+    session = document_sessions.get(session_id)
+    if session is None:
+        return jsonify({"status": "error", "message": "Session not found or expired"}), 404
 
-                if min_seconds > max_seconds:
-                    return jsonify({
-                        "status": "invalid",
-                        "message": "Minimum rest time cannot be greater than maximum"
-                    }), 400
+    try:
+        data = request.get_json() or {}
+        result = document_sessions.edit(session, data.get('edits', []), data.get('version'))
+        return jsonify({
+            "status": "success",
+            "session_id": session.id,
+            "version": session.version,
+            **result
+        })
 
-                serialized_rule["action"]["type"] = "rest_time"
-                serialized_rule["action"]["min_rest_time"] = min_seconds
-                serialized_rule["action"]["max_rest_time"] = max_seconds
+    except VersionConflict as e:
+        return jsonify({"status": "conflict", "message": str(e), "version": session.version}), 409
+    except EditError as e:
+        return jsonify({"status": "invalid", "message": str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Document edit error: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
 
-            else:
-                return jsonify({
-                    "status": "invalid",
-                    "message": "Unknown action type",
-                    "valid_actions": ["include_exercise", "sets X reps Y", "set_rest_time min Xm max Ym"]
-                }), 400
 
+@app.route('/document-sessions/<session_id>', methods=['DELETE'])
+def delete_document_session(session_id):
+    """Endpoint to close an editing session"""
+    if not document_sessions.delete(session_id):
+        return jsonify({"status": "error", "message": "Session not found or expired"}), 404
+    return jsonify({"status": "success", "message": "Session closed"})
+
+
+@app.route('/evaluate', methods=['POST'])
+def evaluate_profile():
+    """Endpoint to run the stored rules against a user profile"""
+    try:
+        data = request.get_json() or {}
+        try:
+            profile = normalize_profile(data.get('profile', data) if isinstance(data, dict) else data)
+        except ProfileError as e:
+            return jsonify({"status": "invalid", "message": str(e)}), 400
+        engine = get_rule_engine()
+        matched = result_cache.get(profile, "evaluate", lambda: engine.matching_rules(profile))
+
+        return jsonify({
+            "status": "success",
+            "matched_rules": [rule.name for rule in matched],
+            "actions": [action for rule in matched for action in rule.actions]
+        })
+
+    except Exception as e:
+        app.logger.error(f"Evaluate error: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
+
+
+@app.route('/evaluate-batch', methods=['POST'])
+def evaluate_batch():
+    """Endpoint to evaluate an NDJSON stream of profiles or programs.
+
+    Results are streamed back as NDJSON in input order; ``?workers=N``
+    spreads the work over a process pool.
+    """
+    try:
+        workers = int(request.args.get('workers', 1))
+    except ValueError:
+        return jsonify({
+            "status": "invalid",
+            "message": "workers must be a number"
+        }), 400
+    workers = max(1, min(workers, app.config['BATCH_MAX_WORKERS']))
+
+    try:
+        engine = get_rule_engine()
+    except Exception as e:
+        app.logger.error(f"Evaluate batch error: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": f"Internal server error: {str(e)}"
+        }), 500
+
+    lines = iter(request.stream.readline, b'')
+    results = (line + '\n' for line in iter_results(lines, engine, workers))
+    return Response(stream_with_context(results), mimetype='application/x-ndjson')
+
+
+@app.route('/generate-routine', methods=['POST'])
+def generate_routine():
+    """Endpoint to generate a routine for every workout definition in a program"""
+    try:
+        data = request.get_json() or {}
+        program_text = data.get('program', '').strip()
+        mode = data.get('mode', 'auto')
+        time_limit_ms = data.get('time_limit_ms', DEFAULT_TIME_LIMIT_MS)
+
+        if not program_text:
             return jsonify({
-                "status": "valid",
-                "message": "Rule is valid",
-                "rule": serialized_rule
-            })
+                "status": "invalid",
+                "message": "Program text is required"
+            }), 400
 
-        except TextXSyntaxError as e:
-            error_msg = f"Syntax error: {e.message}"
-            if any(ex in e.message for ex in get_valid_exercises()):
-                error_msg += f". Valid exercises: {', '.join(get_valid_exercises())}"
-            elif "duration" in e.message:
-                error_msg += ". Duration must be in minutes (5-180) as number or with 'm' suffix"
-            elif "set_rest_time" in e.message:
-                error_msg += ". Format: 'set_rest_time min Xm max Ym' (e.g., 'set_rest_time min 1m max 2m')"
-            elif "variable" in e.message.lower():
-                error_msg += f". Valid variables: {', '.join(all_valid_vars)}"
+        if mode not in PACKING_MODES:
+            return jsonify({
+                "status": "invalid",
+                "message": f"Invalid mode: {mode}. Valid modes: {', '.join(PACKING_MODES)}"
+            }), 400
 
+        if isinstance(time_limit_ms, bool) or not isinstance(time_limit_ms, (int, float)) or not time_limit_ms >= 0:
             return jsonify({
                 "status": "invalid",
-                "message": error_msg,
+                "message": "time_limit_ms must be a non-negative number"
+            }), 400
+
+        try:
+            model = parse_program(program_text)
+        except TextXSyntaxError as e:
+            return jsonify({
+                "status": "invalid",
+                "message": f"Syntax error: {e.message}",
                 "location": {"line": e.line, "column": e.col}
             }), 400
 
+        if not model.workout_definitions:
+            return jsonify({
+                "status": "invalid",
+                "message": "No workout definition found"
+            }), 400
+
+        try:
+            routines = routines_for_program(
+                model, get_rule_engine(),
+                age=data.get('age'),
+                fitness_level=data.get('fitness_level'),
+                mode=mode,
+                time_limit_ms=time_limit_ms,
+                cache=result_cache
+            )
+        except ProfileError as e:
+            return jsonify({"status": "invalid", "message": str(e)}), 400
+
+        return jsonify({
+            "status": "success",
+            "routines": routines
+        })
+
     except Exception as e:
-        app.logger.error(f"Validation error: {str(e)}", exc_info=True)
+        app.logger.error(f"Generate routine error: {str(e)}", exc_info=True)
         return jsonify({
             "status": "error",
             "message": f"Internal server error: {str(e)}"
         }), 500
 
 
+def attribute_ids(cur, names, type_id=None, record_id=None):
+    """Map attribute names to ids with one query.
+
+    Names are looked up on record type ``type_id``, or on the type of record
+    ``record_id``; names that are not attributes of that type are left out.
+    """
+    names = list(names)
+    if not names:
+        return {}
+    placeholders = ', '.join(['%s'] * len(names))
+    if record_id is not None:
+        cur.execute(f"""
+            SELECT a.id, a.name FROM records r
+            JOIN attributes a ON a.record_type_id = r.record_type_id
+            WHERE r.id = %s AND a.name IN ({placeholders})
+        """, (record_id, *names))
+    else:
+        cur.execute(f"""
+            SELECT id, name FROM attributes
+            WHERE record_type_id = %s AND name IN ({placeholders})
+        """, (type_id, *names))
+    return {row['name']: row['id'] for row in cur.fetchall()}
+
+
+def insert_record_values(cur, record_id, values, attr_ids):
+    """Write the values of known attributes with one multi-row insert"""
+    rows = [
+        (record_id, attr_ids[name], str(value))
+        for name, value in values.items() if name in attr_ids
+    ]
+    if rows:
+        cur.executemany("""
+            INSERT INTO record_values 
+            (record_id, attribute_id, value)
+            VALUES (%s, %s, %s)
+        """, rows)
+    return rows
+
+
 @app.route('/add-exercise', methods=['POST'])
 def add_exercise():
     """Endpoint to add a new exercise"""
@@ -683,7 +1233,7 @@ def add_exercise():
             }), 400
 
         exercise_name = data['name']
-        if exercise_name not in get_valid_exercises():
+        if not is_valid_value('valid_exercises', exercise_name):
             return jsonify({
                 "status": "invalid",
                 "message": f"Invalid exercise name. Must be one of: {', '.join(get_valid_exercises())}"
@@ -705,20 +1255,8 @@ def add_exercise():
             record_id = cur.lastrowid
 
             # Insert values
-            for attr, value in data.items():
-                cur.execute("""
-                    SELECT id FROM attributes 
-                    WHERE record_type_id = %s AND name = %s
-                """, (rt_id, attr))
-                attr_result = cur.fetchone()
-                if not attr_result:
-                    continue
-                attr_id = attr_result['id']
-                cur.execute("""
-                    INSERT INTO record_values 
-                    (record_id, attribute_id, value)
-                    VALUES (%s, %s, %s)
-                """, (record_id, attr_id, str(value)))
+            insert_record_values(cur, record_id, data, attribute_ids(cur, data, type_id=rt_id))
+            after_commit(lambda: record_projection.mark_dirty([record_id]))
 
             return jsonify({
                 "status": "success",
@@ -733,228 +1271,526 @@ def add_exercise():
         }), 500
 
 
+# Data model tables as exposed by /get-datamodel
+DOMAIN_TABLES = {
+    'valid_exercises': 'exercise_names',
+    'valid_goals': 'goal_types',
+    'valid_muscles': 'muscles',
+    'valid_levels': 'levels'
+}
+# Entry types accepted by the add_valid_entry action
+DOMAIN_ENTRY_TYPES = {
+    'exercise': 'valid_exercises',
+    'goal': 'valid_goals',
+    'muscle': 'valid_muscles',
+    'level': 'valid_levels'
+}
+MAX_DATAMODEL_ACTIONS = 500
+MAX_RECORDS_PAGE_SIZE = 1000
+
+
+def fetch_record_types(cur, where="", params=()):
+    """Record types with their attributes, keyed by type name"""
+    cur.execute(f"""
+        SELECT rt.id, rt.name, 
+               a.id as attr_id, a.name as attr_name, 
+               a.type as attr_type, a.initial_value
+        FROM record_types rt
+        LEFT JOIN attributes a ON rt.id = a.record_type_id
+        {where}
+        ORDER BY rt.name, a.name
+    """, params)
+    record_types = {}
+    for row in cur.fetchall():
+        if row['name'] not in record_types:
+            record_types[row['name']] = {
+                'id': row['id'],
+                'attributes': []
+            }
+        if row['attr_id']:
+            record_types[row['name']]['attributes'].append({
+                'id': row['attr_id'],
+                'name': row['attr_name'],
+                'type': row['attr_type'],
+                'initial_value': row['initial_value']
+            })
+    return record_types
+
+
+def iter_records(cur, where="", params=()):
+    """Yield records with their values keyed by attribute name, ordered by id.
+
+    Rows are pivoted as they are read, so with a server-side cursor only one
+    record is held in memory at a time.
+    """
+    cur.execute(f"""
+        SELECT r.id, r.record_type_id, rt.name as type_name,
+               rv.attribute_id, a.name as attr_name, rv.value
+        FROM records r
+        JOIN record_types rt ON r.record_type_id = rt.id
+        LEFT JOIN record_values rv ON r.id = rv.record_id
+        LEFT JOIN attributes a ON rv.attribute_id = a.id
+        {where}
+        ORDER BY r.id
+    """, params)
+    current_record = None
+    for row in cur:
+        if not current_record or current_record['id'] != row['id']:
+            if current_record:
+                yield current_record
+            current_record = {
+                'id': row['id'],
+                'type_id': row['record_type_id'],
+                'type_name': row['type_name'],
+                'values': {}
+            }
+        if row['attr_name']:
+            current_record['values'][row['attr_name']] = row['value']
+    if current_record:
+        yield current_record
+
+
+def fetch_records(cur, where="", params=()):
+    return list(iter_records(cur, where, params))
+
+
+def encode_records_cursor(record_id):
+    return base64.urlsafe_b64encode(json.dumps([record_id]).encode()).decode()
+
+
+def decode_records_cursor(cursor):
+    record_id, = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return int(record_id)
+
+
+def record_filters(args):
+    """WHERE clauses selecting records by ``record_type`` and ``attr.<name>=value``"""
+    clauses, params = [], []
+    if args.get('record_type'):
+        clauses.append("rt.name = %s")
+        params.append(args['record_type'])
+    for key, value in args.items(multi=True):
+        if key.startswith('attr.') and len(key) > 5:
+            clauses.append("""EXISTS (
+                SELECT 1 FROM record_values fv
+                JOIN attributes fa ON fv.attribute_id = fa.id
+                WHERE fv.record_id = r.id AND fa.name = %s AND fv.value = %s
+            )""")
+            params.extend([key[5:], value])
+    return clauses, params
+
+
+def page_record_ids(cur, clauses, params, limit):
+    """Ids of the next ``limit`` matching records, and whether more follow"""
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur.execute(f"""
+        SELECT r.id FROM records r
+        JOIN record_types rt ON r.record_type_id = rt.id
+        {where}
+        ORDER BY r.id
+        LIMIT %s
+    """, (*params, limit + 1))
+    ids = [row['id'] for row in cur.fetchall()]
+    return ids[:limit], len(ids) > limit
+
+
 @app.route('/get-datamodel', methods=['GET'])
 def get_datamodel():
+    """Endpoint to fetch domain values, record types and records.
+
+    ``record_type`` and ``attr.<name>=value`` filter the records, ``limit``
+    and ``cursor`` page through them by id, and ``format=ndjson`` streams
+    one JSON object per line from a server-side cursor.
+    """
     try:
-        with get_cursor() as cur:
-            # Get domain values
-            domain_tables = {
-                'valid_exercises': 'exercise_names',
-                'valid_goals': 'goal_types',
-                'valid_muscles': 'muscles',
-                'valid_levels': 'levels'
-            }
-            domain_values = {}
-            for table, key in domain_tables.items():
-                cur.execute(f"SELECT name FROM {table}")
-                domain_values[key] = [row['name'] for row in cur.fetchall()]
-
-            # Get record types
-            cur.execute("""
-                SELECT rt.id, rt.name, 
-                       a.id as attr_id, a.name as attr_name, 
-                       a.type as attr_type, a.initial_value
-                FROM record_types rt
-                LEFT JOIN attributes a ON rt.id = a.record_type_id
-                ORDER BY rt.name, a.name
-            """)
-            record_types = {}
-            for row in cur.fetchall():
-                if row['name'] not in record_types:
-                    record_types[row['name']] = {
-                        'id': row['id'],
-                        'attributes': []
-                    }
-                if row['attr_id']:
-                    record_types[row['name']]['attributes'].append({
-                        'id': row['attr_id'],
-                        'name': row['attr_name'],
-                        'type': row['attr_type'],
-                        'initial_value': row['initial_value']
-                    })
-
-            # Get records
-            records = []
-            cur.execute("""
-                SELECT r.id, r.record_type_id, rt.name as type_name,
-                       rv.attribute_id, a.name as attr_name, rv.value
-                FROM records r
-                JOIN record_types rt ON r.record_type_id = rt.id
-                LEFT JOIN record_values rv ON r.id = rv.record_id
-                LEFT JOIN attributes a ON rv.attribute_id = a.id
-                ORDER BY r.id
-            """)
-            current_record = None
-            for row in cur.fetchall():
-                if not current_record or current_record['id'] != row['id']:
-                    if current_record:
-                        records.append(current_record)
-                    current_record = {
-                        'id': row['id'],
-                        'type_id': row['record_type_id'],
-                        'type_name': row['type_name'],
-                        'values': {}
-                    }
-                if row['attr_name']:
-                    current_record['values'][row['attr_name']] = row['value']
-            if current_record:
-                records.append(current_record)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        stream = request.args.get('format') == 'ndjson'
 
+        if limit is not None and not (1 <= limit <= MAX_RECORDS_PAGE_SIZE):
             return jsonify({
-                "status": "success",
-                **domain_values,
-                "record_types": record_types,
-                "records": records
-            })
+                "status": "invalid",
+                "message": f"limit must be between 1-{MAX_RECORDS_PAGE_SIZE}"
+            }), 400
+
+        clauses, params = record_filters(request.args)
+        if cursor:
+            try:
+                after_id = decode_records_cursor(cursor)
+            except (ValueError, TypeError):
+                return jsonify({
+                    "status": "invalid",
+                    "message": "Invalid cursor"
+                }), 400
+            clauses.append("r.id > %s")
+            params.append(after_id)
+
+        domain_values = {
+            key: get_valid_values(table) for table, key in DOMAIN_TABLES.items()
+        }
+        record_type = request.args.get('record_type')
+        type_where, type_params = ("WHERE rt.name = %s", (record_type,)) if record_type else ("", ())
+
+        with get_cursor() as cur:
+            record_types = fetch_record_types(cur, type_where, type_params)
+            next_cursor = None
+            if limit is not None:
+                ids, has_more = page_record_ids(cur, clauses, params, limit)
+                if has_more:
+                    next_cursor = encode_records_cursor(ids[-1])
+                clauses = [f"r.id IN ({', '.join(['%s'] * len(ids))})"] if ids else ["1 = 0"]
+                params = ids
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+            if not stream:
+                page = {"next_cursor": next_cursor} if limit is not None else {}
+                return jsonify({
+                    "status": "success",
+                    **domain_values,
+                    "record_types": record_types,
+                    "records": fetch_records(cur, where, tuple(params)),
+                    **page
+                })
+
+        def generate():
+            yield json.dumps({"kind": "domain_values", **domain_values}) + '\n'
+            for name, type_data in record_types.items():
+                yield json.dumps({"kind": "record_type", "name": name, **type_data}) + '\n'
+            count = 0
+            # A connection of its own: the request's unit of work has ended
+            # by the time the body is streamed
+            with db_pool.connection() as conn:
+                cur = conn.cursor(storage_backend.streaming_cursor)
+                try:
+                    for record in iter_records(cur, where, tuple(params)):
+                        count += 1
+                        yield json.dumps({"kind": "record", **record}) + '\n'
+                finally:
+                    cur.close()
+            yield json.dumps({"kind": "end", "records": count, "next_cursor": next_cursor}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-@app.route('/update-datamodel', methods=['POST'])
-def update_datamodel():
+@app.route('/records/<record_type>', methods=['GET'])
+def get_typed_records(record_type):
+    """Endpoint to fetch the records of one type with typed attribute values.
+
+    Served from the in-memory projection; ``attr.<name>=value`` keeps the
+    records whose attribute equals value after conversion to its type.
+    """
     try:
-        data = request.get_json()
-        action = data.get('action')
-        payload = data.get('payload')
+        filters = [
+            (key[5:], '==', value)
+            for key, value in request.args.items(multi=True)
+            if key.startswith('attr.') and len(key) > 5
+        ]
+        records = record_projection.records(record_type, filters)
+        if records is None:
+            return jsonify({"status": "error", "message": f"Unknown record type: {record_type}"}), 404
+
+        table = record_projection.table(record_type)
+        return jsonify({
+            "status": "success",
+            "record_type": record_type,
+            "columns": [{"name": name, "type": attr_type}
+                        for name, attr_type in zip(table.columns, table.types)],
+            "records": records
+        })
 
-        if not action or not payload:
-            return jsonify({"status": "error", "message": "Action and payload required"}), 400
+    except Exception as e:
+        app.logger.error(f"Typed records error: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        with get_cursor() as cur:
-            if action == 'add_valid_entry':
-                table_map = {
-                    'exercise': 'valid_exercises',
-                    'goal': 'valid_goals',
-                    'muscle': 'valid_muscles',
-                    'level': 'valid_levels'
-                }
-                entry_type = payload.get('type')
-                entry_name = payload.get('name')
-
-                if not entry_type or not entry_name:
-                    return jsonify({"status": "error", "message": "Type and name required"}), 400
-
-                table = table_map.get(entry_type)
-                if not table:
-                    return jsonify({"status": "error", "message": "Invalid type"}), 400
 
-                try:
-                    cur.execute(f"INSERT INTO {table} (name) VALUES (%s)", (entry_name,))
-                    return jsonify({"status": "success", "message": f"{entry_type} added"})
-                except IntegrityError:
-                    return jsonify({"status": "error", "message": "Entry exists"}), 400
-
-            elif action == 'add_record_type':
-                type_name = payload.get('name')
-                if not type_name:
-                    return jsonify({"status": "error", "message": "Name required"}), 400
-
-                cur.execute("INSERT INTO record_types (name) VALUES (%s)", (type_name,))
-                type_id = cur.lastrowid
-                return jsonify({
-                    "status": "success",
-                    "message": "Record type added",
-                    "type_id": type_id
-                })
+class DataModelError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class DataModelChanges:
+    """Entities touched by a batch of data model actions.
+
+    ``describe`` reads them back once the batch has run, in the same shape
+    as /get-datamodel, so clients can patch their copy instead of reloading.
+    """
+
+    def __init__(self):
+        self.record_types = set()
+        self.records = set()
+        self.records_of_types = set()
+        self.deleted_records = set()
+        self.domain_values = {}
+
+    def describe(self, cur):
+        changes = {}
+        if self.domain_values:
+            changes['domain_values'] = self.domain_values
+        if self.record_types:
+            ids = tuple(self.record_types)
+            changes['record_types'] = fetch_record_types(
+                cur, f"WHERE rt.id IN ({', '.join(['%s'] * len(ids))})", ids)
+
+        live_records = self.records - self.deleted_records
+        if live_records or self.records_of_types:
+            clauses, params = [], []
+            if live_records:
+                clauses.append(f"r.id IN ({', '.join(['%s'] * len(live_records))})")
+                params.extend(live_records)
+            if self.records_of_types:
+                clauses.append(f"r.record_type_id IN ({', '.join(['%s'] * len(self.records_of_types))})")
+                params.extend(self.records_of_types)
+            changes['records'] = fetch_records(cur, "WHERE " + " OR ".join(clauses), tuple(params))
+        if self.deleted_records:
+            changes['deleted_records'] = sorted(self.deleted_records)
+        return changes
+
+
+def add_valid_entry(cur, payload, changes):
+    entry_type = payload.get('type')
+    entry_name = payload.get('name')
+
+    if not entry_type or not entry_name:
+        raise DataModelError("Type and name required")
+
+    table = DOMAIN_ENTRY_TYPES.get(entry_type)
+    if not table:
+        raise DataModelError("Invalid type")
 
-            elif action == 'add_attribute':
-                type_id = payload.get('type_id')
-                attr_name = payload.get('name')
-                attr_type = payload.get('type')
+    try:
+        cur.execute(f"INSERT INTO {table} (name) VALUES (%s)", (entry_name,))
+    except storage_backend.integrity_errors:
+        raise DataModelError("Entry exists")
+    after_commit(lambda: domain_cache.invalidate(table))
+    changes.domain_values.setdefault(DOMAIN_TABLES[table], []).append(entry_name)
+    return f"{entry_type} added", {}
 
-                if not all([type_id, attr_name, attr_type]):
-                    return jsonify({"status": "error", "message": "Missing fields"}), 400
 
-                cur.execute("""
-                    INSERT INTO attributes 
-                    (record_type_id, name, type, initial_value)
-                    VALUES (%s, %s, %s, %s)
-                """, (type_id, attr_name, attr_type, payload.get('initial_value', '')))
-                return jsonify({"status": "success", "message": "Attribute added"})
-
-            elif action == 'add_record':
-                type_id = payload.get('type_id')
-                if not type_id:
-                    return jsonify({"status": "error", "message": "Type ID required"}), 400
-
-                cur.execute("INSERT INTO records (record_type_id) VALUES (%s)", (type_id,))
-                record_id = cur.lastrowid
-
-                for attr_name, value in payload.get('values', {}).items():
-                    cur.execute("""
-                        SELECT id FROM attributes 
-                        WHERE record_type_id = %s AND name = %s
-                    """, (type_id, attr_name))
-                    attr = cur.fetchone()
-                    if attr:
-                        cur.execute("""
-                            INSERT INTO record_values 
-                            (record_id, attribute_id, value)
-                            VALUES (%s, %s, %s)
-                        """, (record_id, attr['id'], str(value)))
+def add_record_type(cur, payload, changes):
+    type_name = payload.get('name')
+    if not type_name:
+        raise DataModelError("Name required")
 
-                return jsonify({
-                    "status": "success",
-                    "message": "Record added",
-                    "record_id": record_id
-                })
+    try:
+        cur.execute("INSERT INTO record_types (name) VALUES (%s)", (type_name,))
+    except storage_backend.integrity_errors:
+        raise DataModelError(f"Record type {type_name} already exists")
+    type_id = cur.lastrowid
+    after_commit(lambda: schema_catalog.add_record_type(type_id, type_name))
+    changes.record_types.add(type_id)
+    return "Record type added", {"type_id": type_id}
 
-            elif action == 'update_record':
-                record_id = payload.get('record_id')
-                if not record_id:
-                    return jsonify({"status": "error", "message": "Record ID required"}), 400
-
-                for attr_name, value in payload.get('values', {}).items():
-                    cur.execute("""
-                        UPDATE record_values rv
-                        JOIN attributes a ON rv.attribute_id = a.id
-                        SET rv.value = %s
-                        WHERE rv.record_id = %s AND a.name = %s
-                    """, (str(value), record_id, attr_name))
-
-                return jsonify({"status": "success", "message": "Record updated"})
-
-            elif action == 'delete_record':
-                record_id = payload.get('record_id')
-                if not record_id:
-                    return jsonify({"status": "error", "message": "Record ID required"}), 400
-
-                cur.execute("DELETE FROM record_values WHERE record_id = %s", (record_id,))
-                cur.execute("DELETE FROM records WHERE id = %s", (record_id,))
-                return jsonify({"status": "success", "message": "Record deleted"})
-
-            elif action == 'update_attribute':
-                attr_id = payload.get('attribute_id')
-                new_name = payload.get('name')
-                new_type = payload.get('type')
-                new_initial_value = payload.get('initial_value')
-
-                if not all([attr_id, new_name, new_type]):
-                    return jsonify({"status": "error", "message": "Missing required fields"}), 400
-
-                # Check if attribute exists
-                cur.execute("SELECT * FROM attributes WHERE id = %s", (attr_id,))
-                if not cur.fetchone():
-                    return jsonify({"status": "error", "message": "Attribute not found"}), 404
-
-                # Update attribute
-                cur.execute("""
-                            UPDATE attributes
-                            SET name = %s,
-                                type = %s,
-                                initial_value = %s
-                            WHERE id = %s
-                        """, (new_name, new_type, new_initial_value, attr_id))
 
-                return jsonify({"status": "success", "message": "Attribute updated"})
+def add_attribute(cur, payload, changes):
+    type_id = payload.get('type_id')
+    attr_name = payload.get('name')
+    attr_type = payload.get('type')
 
-            else:
-                return jsonify({"status": "error", "message": "Invalid action"}), 400
+    if not all([type_id, attr_name, attr_type]):
+        raise DataModelError("Missing fields")
+
+    try:
+        cur.execute("""
+            INSERT INTO attributes 
+            (record_type_id, name, type, initial_value)
+            VALUES (%s, %s, %s, %s)
+        """, (type_id, attr_name, attr_type, payload.get('initial_value', '')))
+    except storage_backend.integrity_errors:
+        # Either the name is taken or the record type does not exist
+        cur.execute("SELECT id FROM record_types WHERE id = %s", (type_id,))
+        if not cur.fetchone():
+            raise DataModelError("Record type not found", 404)
+        raise DataModelError(f"Attribute {attr_name} already exists")
+    attr_id = cur.lastrowid
+    after_commit(lambda: schema_catalog.add_attribute(attr_id, int(type_id), attr_name, attr_type))
+    changes.record_types.add(int(type_id))
+    return "Attribute added", {"attribute_id": attr_id}
+
+
+def add_record(cur, payload, changes):
+    type_id = payload.get('type_id')
+    if not type_id:
+        raise DataModelError("Type ID required")
+
+    cur.execute("INSERT INTO records (record_type_id) VALUES (%s)", (type_id,))
+    record_id = cur.lastrowid
+
+    values = payload.get('values', {})
+    insert_record_values(cur, record_id, values, attribute_ids(cur, values, type_id=type_id))
+
+    changes.records.add(record_id)
+    after_commit(lambda: record_projection.mark_dirty([record_id]))
+    return "Record added", {"record_id": record_id}
+
+
+def parse_record_id(payload):
+    record_id = payload.get('record_id')
+    if not record_id:
+        raise DataModelError("Record ID required")
+    try:
+        return int(record_id)
+    except (TypeError, ValueError):
+        raise DataModelError(f"Invalid record ID {record_id!r}")
+
+
+def update_record(cur, payload, changes):
+    record_id = parse_record_id(payload)
+
+    values = payload.get('values', {})
+    attr_ids = attribute_ids(cur, values, record_id=record_id)
+    if attr_ids:
+        # Replace rather than UPDATE, so attributes without a value yet get one
+        cur.execute(f"""
+            DELETE FROM record_values
+            WHERE record_id = %s AND attribute_id IN ({', '.join(['%s'] * len(attr_ids))})
+        """, (record_id, *attr_ids.values()))
+        insert_record_values(cur, record_id, values, attr_ids)
+
+    changes.records.add(record_id)
+    after_commit(lambda: record_projection.mark_dirty([record_id]))
+    return "Record updated", {}
+
+
+def delete_record(cur, payload, changes):
+    record_id = parse_record_id(payload)
+
+    cur.execute("DELETE FROM record_values WHERE record_id = %s", (record_id,))
+    cur.execute("DELETE FROM records WHERE id = %s", (record_id,))
+    changes.deleted_records.add(record_id)
+    after_commit(lambda: record_projection.mark_dirty([record_id]))
+    return "Record deleted", {}
+
+
+def update_attribute(cur, payload, changes):
+    attr_id = payload.get('attribute_id')
+    new_name = payload.get('name')
+    new_type = payload.get('type')
+    new_initial_value = payload.get('initial_value')
+
+    if not all([attr_id, new_name, new_type]):
+        raise DataModelError("Missing required fields")
+
+    # Check if attribute exists
+    cur.execute("SELECT * FROM attributes WHERE id = %s", (attr_id,))
+    attribute = cur.fetchone()
+    if not attribute:
+        raise DataModelError("Attribute not found", 404)
+
+    # Update attribute
+    cur.execute("""
+                UPDATE attributes
+                SET name = %s,
+                    type = %s,
+                    initial_value = %s
+                WHERE id = %s
+            """, (new_name, new_type, new_initial_value, attr_id))
+    after_commit(lambda: schema_catalog.update_attribute(int(attr_id), new_name, new_type))
+
+    changes.record_types.add(attribute['record_type_id'])
+    if attribute['name'] != new_name:
+        # Record values are keyed by attribute name
+        changes.records_of_types.add(attribute['record_type_id'])
+    return "Attribute updated", {}
+
+
+DATAMODEL_ACTIONS = {
+    'add_valid_entry': add_valid_entry,
+    'add_record_type': add_record_type,
+    'add_attribute': add_attribute,
+    'add_record': add_record,
+    'update_record': update_record,
+    'delete_record': delete_record,
+    'update_attribute': update_attribute
+}
+
+
+def resolve_references(payload, created):
+    """Replace ``"$N"`` payload values with the id created by action N"""
+    resolved = {}
+    for key, value in payload.items():
+        if isinstance(value, str) and value.startswith('$') and value[1:].isdigit():
+            index = int(value[1:])
+            if index >= len(created) or len(created[index]) != 1:
+                raise DataModelError(f"Invalid reference {value} in {key}")
+            value = next(iter(created[index].values()))
+        resolved[key] = value
+    return resolved
+
+
+@app.route('/update-datamodel', methods=['POST'])
+def update_datamodel():
+    """Endpoint to apply one data model action, or an ordered list of them.
+
+    A batch (``{"actions": [{"action": ..., "payload": ...}, ...]}``) runs
+    in one transaction and is rolled back as a whole if any action fails.
+    A payload value ``"$N"`` stands for the id created by action N of the
+    batch. The response lists the changed entities under ``changes``.
+    """
+    try:
+        data = request.get_json() or {}
+        batch = 'actions' in data
+        steps = data['actions'] if batch else [data]
+
+        if not isinstance(steps, list) or not steps:
+            return jsonify({"status": "error", "message": "Actions must be a non-empty list"}), 400
+        if len(steps) > MAX_DATAMODEL_ACTIONS:
+            return jsonify({
+                "status": "error",
+                "message": f"At most {MAX_DATAMODEL_ACTIONS} actions per request"
+            }), 400
+
+        changes = DataModelChanges()
+        results = []
+        created = []
+        with get_cursor() as cur:
+            for index, step in enumerate(steps):
+                action = step.get('action') if isinstance(step, dict) else None
+                payload = step.get('payload') if isinstance(step, dict) else None
+                try:
+                    if not action or not payload:
+                        raise DataModelError("Action and payload required")
+                    handler = DATAMODEL_ACTIONS.get(action)
+                    if handler is None:
+                        raise DataModelError("Invalid action")
+                    message, ids = handler(cur, resolve_references(payload, created), changes)
+                except DataModelError as e:
+                    error = {"status": "error", "message": e.message}
+                    if batch:
+                        error.update(failed_action=index, message=f"Action {index} ({action}): {e.message}")
+                    return jsonify(error), e.status
+                created.append(ids)
+                results.append({"action": action, "message": message, **ids})
+
+            changed = changes.describe(cur)
+
+        if not batch:
+            return jsonify({"status": "success", **results[0], "changes": changed})
+        return jsonify({
+            "status": "success",
+            "message": f"{len(results)} actions applied",
+            "results": results,
+            "changes": changed
+        })
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+if app.config['EXPORT_METAMODEL_DOT']:
+    dsl.export_dot('workout_dsl_ast.dot')
+if app.config['WARM_METAMODEL']:
+    dsl.get_metamodel()
+storage_backend.prepare(db_pool, app.logger, check_indexes=app.config['CHECK_INDEXES'])
+
+startup_timings = {"import_to_ready_seconds": round(time.perf_counter() - IMPORT_STARTED, 6)}
+app.logger.info(f"Ready in {startup_timings['import_to_ready_seconds']:.3f}s "
+                f"(metamodel {'built' if dsl.build_seconds is not None else 'deferred'})")
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
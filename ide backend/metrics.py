@@ -0,0 +1,200 @@
+"""Request instrumentation exposed in the Prometheus text format.
+
+A sampled request records its wall time per endpoint, every SQL statement
+run through ``db.get_cursor`` and the time spent parsing DSL text. Cache
+and pool statistics are read when ``/metrics`` is scraped. Requests slower
+than the configured threshold are logged together with their statements.
+"""
+import bisect
+import random
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+# Statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 100
+
+
+class Histogram:
+    """Cumulative histogram of one metric, one series per label set"""
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}    # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(sample(f"{self.name}_bucket", cumulative, {**labels, "le": bound}))
+            lines.append(sample(f"{self.name}_bucket", values[-1], {**labels, "le": "+Inf"}))
+            lines.append(sample(f"{self.name}_sum", values[-2], labels))
+            lines.append(sample(f"{self.name}_count", values[-1], labels))
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def sample(name, value, labels=None):
+    """One line of a gauge or counter"""
+    if labels:
+        name += "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+    return f"{name} {value}"
+
+
+class Metrics:
+    """Histograms of the sampled requests plus gauges collected on scrape.
+
+    ``sample_rate`` is the fraction of requests instrumented (0 turns the
+    per-request work off); requests taking ``slow_request_seconds`` or
+    longer are logged with their statements. ``collectors`` are callables
+    returning extra exposition lines, e.g. cache statistics.
+    """
+
+    def __init__(self, sample_rate=1.0, slow_request_seconds=1.0, logger=None):
+        self.sample_rate = sample_rate
+        self.slow_request_seconds = slow_request_seconds
+        self.logger = logger
+        self.collectors = []
+        self.slow_requests = 0
+        self.requests = Histogram(
+            "workout_http_request_duration_seconds", "Wall time of sampled requests by endpoint",
+            LATENCY_BUCKETS, ("endpoint", "method", "status"))
+        self.queries_per_request = Histogram(
+            "workout_db_queries_per_request", "SQL statements issued by sampled requests",
+            COUNT_BUCKETS, ("endpoint",))
+        self.query_seconds = Histogram(
+            "workout_db_query_duration_seconds", "Duration of SQL statements run through get_cursor",
+            QUERY_BUCKETS)
+        self.parse_seconds = Histogram(
+            "workout_dsl_parse_duration_seconds", "Time spent parsing DSL text with textX",
+            QUERY_BUCKETS + (2.5, 5.0))
+
+    def sampled(self):
+        """Whether the current request is being instrumented"""
+        return has_request_context() and 'metrics_started' in g
+
+    def timed(self, func, histogram):
+        """Wrap func so its calls in sampled requests are observed in histogram"""
+        def call(*args, **kwargs):
+            if not self.sampled():
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return call
+
+    def render(self):
+        lines = []
+        for histogram in (self.requests, self.queries_per_request, self.query_seconds, self.parse_seconds):
+            lines.extend(histogram.render())
+        lines += [
+            "# HELP workout_slow_requests_total Sampled requests slower than the slow-request threshold",
+            "# TYPE workout_slow_requests_total counter",
+            sample("workout_slow_requests_total", self.slow_requests),
+            "# HELP workout_metrics_sample_rate Fraction of requests instrumented",
+            "# TYPE workout_metrics_sample_rate gauge",
+            sample("workout_metrics_sample_rate", self.sample_rate),
+        ]
+        for collect in self.collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+    def _start(self):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return
+        g.metrics_started = time.perf_counter()
+        # db.get_cursor records (statement, seconds) here while the list exists
+        g.db_statements = []
+
+    def _finish(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        statements = g.pop('db_statements', [])
+        endpoint = request.endpoint or "unmatched"
+
+        self.requests.observe(elapsed, endpoint, request.method, str(response.status_code))
+        self.queries_per_request.observe(len(statements), endpoint)
+        for _, seconds in statements:
+            self.query_seconds.observe(seconds)
+
+        if elapsed >= self.slow_request_seconds:
+            self.slow_requests += 1
+            if self.logger:
+                logged = "\n".join(f"  {seconds * 1000:8.2f} ms  {' '.join(sql.split())[:300]}"
+                                   for sql, seconds in statements[:MAX_LOGGED_STATEMENTS])
+                more = len(statements) - MAX_LOGGED_STATEMENTS
+                self.logger.warning(
+                    f"Slow request {request.method} {request.path} -> {response.status_code} "
+                    f"in {elapsed * 1000:.1f} ms, {len(statements)} statements"
+                    + (f":\n{logged}" if logged else "")
+                    + (f"\n  ... {more} more" if more > 0 else ""))
+        return response
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+
+def cache_collector(caches):
+    """Collector for the ``stats()`` of named caches: hits, misses and size"""
+    def collect():
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        lines = []
+        for metric, key, kind, help_text in (
+                ("workout_cache_hits_total", "hits", "counter", "Cache lookups answered from the cache"),
+                ("workout_cache_misses_total", "misses", "counter", "Cache lookups that had to compute"),
+                ("workout_cache_entries", "size", "gauge", "Entries held by the cache")):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [sample(metric, values[key], {"cache": name})
+                      for name, values in stats.items() if key in values]
+        return lines
+    return collect
+
+
+def pool_collector(pool):
+    def collect():
+        stats = pool.stats()
+        return [
+            "# HELP workout_db_pool_connections Pooled database connections by state",
+            "# TYPE workout_db_pool_connections gauge",
+            sample("workout_db_pool_connections", stats["in_use"], {"state": "in_use"}),
+            sample("workout_db_pool_connections", stats["idle"], {"state": "idle"}),
+            "# HELP workout_db_pool_wait_seconds_total Time requests waited for a connection",
+            "# TYPE workout_db_pool_wait_seconds_total counter",
+            sample("workout_db_pool_wait_seconds_total", stats["wait_seconds"]),
+            "# HELP workout_db_pool_timeouts_total Requests that gave up waiting for a connection",
+            "# TYPE workout_db_pool_timeouts_total counter",
+            sample("workout_db_pool_timeouts_total", stats["timeouts"]),
+        ]
+    return collect
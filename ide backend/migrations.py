@@ -0,0 +1,230 @@
+"""Versioned schema migrations for the workout DSL database.
+
+Applied versions are recorded in ``schema_migrations``; running the module
+applies the pending ones in order::
+
+    python migrations.py            # migrate to the latest version
+    python migrations.py --check    # only report missing indexes
+
+MySQL commits DDL implicitly, so a migration that fails half way is not
+rolled back; every step is written to be safe to run again.
+"""
+import argparse
+
+TABLE_OPTIONS = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+
+def create_table(name, body):
+    return f"CREATE TABLE IF NOT EXISTS {name} (\n{body}\n) {TABLE_OPTIONS}"
+
+
+def domain_table(name):
+    return create_table(name, """
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        UNIQUE KEY uq_name (name)
+    """)
+
+
+def index_columns(cur, table):
+    """Return ``{index name: (columns...)}`` for a table of the current database"""
+    cur.execute("""
+        SELECT index_name AS index_name, column_name AS column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for row in cur.fetchall():
+        indexes[row['index_name']] = indexes.get(row['index_name'], ()) + (row['column_name'],)
+    return indexes
+
+
+class IndexStep:
+    """Step adding an index unless one with the same leading columns exists"""
+
+    def __init__(self, table, name, columns, unique=False):
+        self.table = table
+        self.name = name
+        self.columns = columns
+        self.unique = unique
+
+    def __call__(self, cur):
+        if any(cols[:len(self.columns)] == self.columns for cols in index_columns(cur, self.table).values()):
+            return
+        kind = "UNIQUE INDEX" if self.unique else "INDEX"
+        cur.execute(f"CREATE {kind} {self.name} ON {self.table} ({', '.join(self.columns)})")
+
+
+def add_index(table, name, columns, unique=False):
+    return IndexStep(table, name, columns, unique)
+
+
+# (version, description, steps); a step is SQL or a callable taking a cursor
+MIGRATIONS = [
+    (1, "initial schema", [
+        create_table("rules", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL
+        """),
+        create_table("conditions", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            rule_id INT NOT NULL,
+            variable VARCHAR(255) NOT NULL,
+            operator VARCHAR(2) NOT NULL,
+            value VARCHAR(255) NOT NULL,
+            FOREIGN KEY (rule_id) REFERENCES rules(id) ON DELETE CASCADE
+        """),
+        create_table("actions", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            rule_id INT NOT NULL,
+            action_type VARCHAR(32) NOT NULL,
+            exercise_name VARCHAR(255) NULL,
+            sets_count INT NULL,
+            reps_count INT NULL,
+            min_rest_time INT NULL,
+            max_rest_time INT NULL,
+            FOREIGN KEY (rule_id) REFERENCES rules(id) ON DELETE CASCADE
+        """),
+        domain_table("valid_exercises"),
+        domain_table("valid_goals"),
+        domain_table("valid_muscles"),
+        domain_table("valid_levels"),
+        create_table("record_types", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL
+        """),
+        create_table("attributes", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            record_type_id INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            type VARCHAR(32) NOT NULL,
+            initial_value VARCHAR(255) NULL,
+            FOREIGN KEY (record_type_id) REFERENCES record_types(id) ON DELETE CASCADE
+        """),
+        create_table("records", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            record_type_id INT NOT NULL,
+            FOREIGN KEY (record_type_id) REFERENCES record_types(id) ON DELETE CASCADE
+        """),
+        create_table("record_values", """
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            record_id INT NOT NULL,
+            attribute_id INT NOT NULL,
+            value TEXT NULL,
+            FOREIGN KEY (record_id) REFERENCES records(id) ON DELETE CASCADE,
+            FOREIGN KEY (attribute_id) REFERENCES attributes(id) ON DELETE CASCADE
+        """),
+    ]),
+    (2, "indexes for the hot query paths", [
+        # attach_rule_details: WHERE rule_id IN (...) ORDER BY rule_id, id
+        add_index("conditions", "ix_conditions_rule", ("rule_id", "id")),
+        add_index("actions", "ix_actions_rule", ("rule_id", "id")),
+        # /get-rules keyset pagination on (name, id)
+        add_index("rules", "ix_rules_name", ("name", "id")),
+        add_index("record_types", "uq_record_types_name", ("name",), unique=True),
+        # attribute_ids(): record_type_id = %s AND name IN (...)
+        add_index("attributes", "uq_attributes_type_name", ("record_type_id", "name"), unique=True),
+        # /get-datamodel?record_type=...&limit=... pages by id within a type
+        add_index("records", "ix_records_type", ("record_type_id", "id")),
+        # one value per record and attribute; also serves WHERE record_id = %s
+        add_index("record_values", "uq_record_values", ("record_id", "attribute_id"), unique=True),
+        add_index("record_values", "ix_record_values_attribute", ("attribute_id",)),
+    ]),
+]
+
+# table -> leading columns of the indexes the queries rely on
+EXPECTED_INDEXES = {
+    "conditions": [("rule_id",)],
+    "actions": [("rule_id",)],
+    "rules": [("name", "id")],
+    "record_types": [("name",)],
+    "attributes": [("record_type_id", "name")],
+    "records": [("record_type_id",)],
+    "record_values": [("record_id", "attribute_id"), ("attribute_id",)],
+}
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) """ + TABLE_OPTIONS)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cur.fetchall()}
+
+
+def migrate(conn, target=None, log=print):
+    """Apply pending migrations up to ``target`` (default: latest); returns versions applied"""
+    target = LATEST_VERSION if target is None else target
+    cur = conn.cursor()
+    try:
+        done = applied_versions(cur)
+        applied = []
+        for version, description, steps in MIGRATIONS:
+            if version > target or version in done:
+                continue
+            log(f"Applying migration {version}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+            cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description))
+            conn.commit()
+            applied.append(version)
+        return applied
+    finally:
+        cur.close()
+
+
+def missing_indexes(cur):
+    """Return ``[(table, columns)]`` for expected indexes that are absent"""
+    missing = []
+    for table, expected in EXPECTED_INDEXES.items():
+        indexes = index_columns(cur, table).values()
+        for columns in expected:
+            if not any(cols[:len(columns)] == columns for cols in indexes):
+                missing.append((table, columns))
+    return missing
+
+
+def check_indexes(conn, logger):
+    """Warn about every expected index that is missing; returns the list"""
+    cur = conn.cursor()
+    try:
+        missing = missing_indexes(cur)
+    finally:
+        cur.close()
+    for table, columns in missing:
+        logger.warning(f"Missing index on {table}({', '.join(columns)}); "
+                       f"run migrations.py to add it")
+    return missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--target', type=int, help="Version to migrate to (default: latest)")
+    parser.add_argument('--check', action='store_true', help="Only report missing indexes")
+    args = parser.parse_args(argv)
+
+    from main import app, db_pool, storage_backend
+    if storage_backend.name != "mysql":
+        print(f"The {storage_backend.name} backend creates its schema at startup")
+        return
+    with db_pool.connection() as conn:
+        if args.check:
+            missing = check_indexes(conn, app.logger)
+            print(f"{len(missing)} expected indexes missing")
+        else:
+            applied = migrate(conn, args.target)
+            print(f"Applied {len(applied)} migrations" if applied else "Schema is up to date")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""Typed, per-record-type projection of the EAV record tables.
+
+``records`` / ``record_values`` / ``attributes`` store every value as a
+string in its own row. The projection pivots them into one table per record
+type with a column per attribute, each value converted according to
+``attributes.type``, so reads and ``Type.field`` rule conditions need
+neither joins nor string comparisons.
+"""
+import bisect
+import threading
+import time
+
+from rule_engine import OPERATORS
+
+TRUE_WORDS = frozenset({"true", "1", "yes"})
+FALSE_WORDS = frozenset({"false", "0", "no"})
+
+
+def coerce(value, attr_type):
+    """Convert a stored string to the Python type of the attribute, or None"""
+    if value is None:
+        return None
+    if attr_type == 'number':
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return int(number) if number.is_integer() else number
+    if attr_type == 'boolean':
+        if isinstance(value, bool):
+            return value
+        word = str(value).strip().lower()
+        if word in TRUE_WORDS:
+            return True
+        if word in FALSE_WORDS:
+            return False
+        return None
+    return str(value)
+
+
+class FieldIndex:
+    """Hash and sorted index over one column of a TypeTable.
+
+    ``==`` and ``!=`` are answered from the hash, range comparisons with a
+    bisect over the sorted values; records without a value never match.
+    """
+    __slots__ = ('hashed', 'keys', 'ids', 'present')
+
+    def __init__(self, rows, position):
+        pairs = sorted(
+            (row[position], record_id) for record_id, row in rows.items()
+            if row[position] is not None
+        )
+        self.keys = [key for key, _ in pairs]
+        self.ids = [record_id for _, record_id in pairs]
+        self.present = frozenset(self.ids)
+        self.hashed = {}
+        for key, record_id in pairs:
+            self.hashed.setdefault(key, set()).add(record_id)
+
+    def lookup(self, op, expected):
+        """Return the ids of the records whose value satisfies ``value <op> expected``"""
+        if op == '==':
+            return self.hashed.get(expected, ())
+        if op == '!=':
+            return self.present - self.hashed.get(expected, set())
+        try:
+            if op == '<':
+                return self.ids[:bisect.bisect_left(self.keys, expected)]
+            if op == '<=':
+                return self.ids[:bisect.bisect_right(self.keys, expected)]
+            if op == '>':
+                return self.ids[bisect.bisect_right(self.keys, expected):]
+            if op == '>=':
+                return self.ids[bisect.bisect_left(self.keys, expected):]
+        except TypeError:
+            pass
+        return ()
+
+
+class TypeTable:
+    """Rows of one record type; ``rows`` maps record id to a tuple of values.
+
+    Tables are not modified once published; a refresh publishes a patched
+    copy, so the per-field indexes built on demand never go stale.
+    """
+    __slots__ = ('type_id', 'name', 'columns', 'types', 'positions', 'rows', 'indexes')
+
+    def __init__(self, type_id, name, attributes):
+        self.type_id = type_id
+        self.name = name
+        self.columns = tuple(attr_name for _, attr_name, _ in attributes)
+        self.types = tuple(attr_type for _, _, attr_type in attributes)
+        self.positions = {attr_id: i for i, (attr_id, _, _) in enumerate(attributes)}
+        self.rows = {}
+        self.indexes = {}
+
+    def copy(self, rows=None):
+        """A table with the same columns and a copy of rows (or the given rows)"""
+        table = TypeTable.__new__(TypeTable)
+        for slot in ('type_id', 'name', 'columns', 'types', 'positions'):
+            setattr(table, slot, getattr(self, slot))
+        table.rows = dict(self.rows) if rows is None else rows
+        table.indexes = {}
+        return table
+
+    def record(self, record_id):
+        return dict(zip(self.columns, self.rows[record_id]))
+
+    def index(self, field):
+        index = self.indexes.get(field)
+        if index is None:
+            index = self.indexes[field] = FieldIndex(self.rows, self.columns.index(field))
+        return index
+
+    def lookup(self, field, op, value):
+        """Ids of the records satisfying ``field <op> value``, or None if it cannot hold"""
+        if field not in self.columns or op not in OPERATORS:
+            return None
+        expected = coerce(value, self.types[self.columns.index(field)])
+        if expected is None:
+            return None
+        return self.index(field).lookup(op, expected)
+
+    def matching(self, conditions):
+        """Return the ids of the records satisfying every ``(field, op, value)``"""
+        if not conditions:
+            return set(self.rows)
+        found = None
+        for condition in conditions:
+            ids = self.lookup(*condition)
+            if not ids:
+                return set()
+            found = set(ids) if found is None else found.intersection(ids)
+            if not found:
+                return found
+        return found
+
+
+class RecordProjection:
+    """Typed record tables kept in step with the EAV tables.
+
+    ``schema`` is the SchemaCatalog; ``loader(record_ids=None)`` returns
+    ``{record_id, type_id, attribute_id, value}`` rows for the given records
+    (all when None), with a NULL attribute for records without values.
+    Writers call ``mark_dirty`` after their commit and the affected records
+    are re-read in one query on the next access. A schema change or ``ttl``
+    expiry rebuilds the whole projection. ``version`` increases on every
+    change so callers can cache results derived from it.
+    """
+
+    def __init__(self, schema, loader, ttl=None):
+        self._schema = schema
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._schema_version = None
+        self._dirty = set()
+        self.tables = {}          # type name -> TypeTable
+        self._record_types = {}   # record id -> type name
+        self._version = 0
+
+    def _new_tables(self):
+        types, attributes = self._schema.snapshot()
+        by_type = {type_id: [] for type_id in types}
+        for attr_id, (type_id, name, attr_type) in sorted(attributes.items(), key=lambda a: a[1][1]):
+            if type_id in by_type:
+                by_type[type_id].append((attr_id, name, attr_type))
+        return {
+            types[type_id]: TypeTable(type_id, types[type_id], attrs)
+            for type_id, attrs in by_type.items()
+        }
+
+    @staticmethod
+    def _fill(tables, record_types, rows):
+        by_id = {table.type_id: table for table in tables.values()}
+        pending = {}
+        for row in rows:
+            table = by_id.get(row['type_id'])
+            if table is None:
+                continue
+            values = pending.get(row['record_id'])
+            if values is None:
+                values = pending[row['record_id']] = (table, [None] * len(table.columns))
+            position = table.positions.get(row['attribute_id'])
+            if position is not None:
+                values[1][position] = coerce(row['value'], table.types[position])
+        for record_id, (table, values) in pending.items():
+            table.rows[record_id] = tuple(values)
+            record_types[record_id] = table.name
+
+    def _ensure_fresh(self):
+        expired = self._loaded_at is None or (
+            self._ttl is not None and time.monotonic() - self._loaded_at >= self._ttl)
+        schema_version = self._schema.version
+        if expired or schema_version != self._schema_version:
+            self._rebuild()
+        elif self._dirty:
+            self._refresh()
+
+    def _rebuild(self):
+        # Writes marked while loading are re-read by the next refresh
+        with self._lock:
+            self._dirty.clear()
+        tables, record_types = self._new_tables(), {}
+        schema_version = self._schema.version
+        self._fill(tables, record_types, self._loader())
+        with self._lock:
+            self.tables = tables
+            self._record_types = record_types
+            self._schema_version = schema_version
+            self._loaded_at = time.monotonic()
+            self._version += 1
+
+    def _refresh(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        rows = self._loader(sorted(dirty))
+
+        with self._lock:
+            # Replace the affected tables with patched copies so concurrent
+            # readers keep a consistent view of the ones they are scanning
+            tables = dict(self.tables)
+            record_types = dict(self._record_types)
+            touched = {record_types.pop(record_id) for record_id in dirty if record_id in record_types}
+            fresh = {name: table.copy({}) for name, table in tables.items()}
+            self._fill(fresh, record_types, rows)
+            touched.update(name for name, table in fresh.items() if table.rows)
+
+            for name in touched:
+                if name not in tables:
+                    continue
+                table = tables[name].copy()
+                for record_id in dirty:
+                    table.rows.pop(record_id, None)
+                table.rows.update(fresh[name].rows)
+                tables[name] = table
+
+            self.tables = tables
+            self._record_types = record_types
+            self._version += 1
+
+    @property
+    def version(self):
+        self._ensure_fresh()
+        return self._version
+
+    def table(self, type_name):
+        self._ensure_fresh()
+        return self.tables.get(type_name)
+
+    def records(self, type_name, filters=()):
+        """Typed records of a type, optionally filtered by ``(field, op, value)``"""
+        table = self.table(type_name)
+        if table is None:
+            return None
+        return [{"id": record_id, "values": table.record(record_id)}
+                for record_id in sorted(table.matching(filters))]
+
+    def exists(self, type_name, conditions):
+        """True when some record of the type satisfies every condition"""
+        table = self.table(type_name)
+        if table is None:
+            return False
+        if len(conditions) == 1:
+            return bool(table.lookup(*conditions[0]))
+        return bool(table.matching(conditions))
+
+    def snapshot(self):
+        """The current records as a RecordSnapshot, e.g. to send to another process"""
+        self._ensure_fresh()
+        with self._lock:
+            tables, version = self.tables, self._version
+        # Published rows are never modified; the copies only drop the indexes
+        return RecordSnapshot({name: table.copy(table.rows) for name, table in tables.items()}, version)
+
+    def mark_dirty(self, record_ids):
+        with self._lock:
+            self._dirty.update(record_ids)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+class RecordSnapshot:
+    """Frozen, picklable copy of a RecordProjection's tables.
+
+    Answers ``records`` and ``exists`` as the projection did when the copy
+    was taken; ``version`` never changes.
+    """
+
+    def __init__(self, tables, version=0):
+        self.tables = tables
+        self.version = version
+
+    def table(self, type_name):
+        return self.tables.get(type_name)
+
+    records = RecordProjection.records
+    exists = RecordProjection.exists
+
+    def snapshot(self):
+        return self
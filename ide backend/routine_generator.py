@@ -0,0 +1,199 @@
+"""Turn the actions fired for a workout definition into a timed routine.
+
+Every ``include_exercise`` action becomes a candidate exercise whose value is
+the number of rules that asked for it and whose cost is the time its sets,
+reps and rest periods take. Choosing exercises for the session length is a
+0/1 knapsack: small instances are solved exactly with dynamic programming,
+large ones (or exact runs that exceed the latency cap) fall back to a greedy
+value-per-second packing.
+"""
+import time
+
+from rule_engine import RuleEngine, normalize_profile, rule_data_from_definition
+
+DEFAULT_SETS = 3
+DEFAULT_REPS = 10
+DEFAULT_REST = (60, 90)
+SECONDS_PER_REP = 4
+
+# Knapsack capacity is measured in slots of this many seconds
+SLOT_SECONDS = 15
+MAX_EXACT_CELLS = 200_000
+DEFAULT_TIME_LIMIT_MS = 50
+
+PACKING_MODES = ("auto", "exact", "heuristic")
+
+
+def prescription(actions):
+    """Return (sets, reps, rest_seconds) from the first sets/rest actions fired"""
+    sets, reps = DEFAULT_SETS, DEFAULT_REPS
+    min_rest, max_rest = DEFAULT_REST
+    for action in actions:
+        if action['type'] == 'sets_reps':
+            sets, reps = action['sets_count'], action['reps_count']
+            break
+    for action in actions:
+        if action['type'] == 'rest_time':
+            min_rest, max_rest = action['min_rest_time'], action['max_rest_time']
+            break
+    return sets, reps, (min_rest + max_rest) // 2
+
+
+def candidate_exercises(actions):
+    """Build knapsack items from the fired actions, one per distinct exercise"""
+    sets, reps, rest = prescription(actions)
+    seconds = sets * (reps * SECONDS_PER_REP + rest)
+
+    items = {}
+    for action in actions:
+        if action['type'] != 'include_exercise':
+            continue
+        name = action['exercise']
+        if name in items:
+            items[name]['value'] += 1
+            items[name]['rules'].append(action['rule'])
+        else:
+            items[name] = {
+                'exercise': name,
+                'sets': sets,
+                'reps': reps,
+                'rest_seconds': rest,
+                'seconds': seconds,
+                'value': 1,
+                'rules': [action['rule']],
+            }
+    return list(items.values())
+
+
+def pack_greedy(items, capacity):
+    """Pack by value per second, then compare against the best single item"""
+    chosen, used = [], 0
+    ranked = sorted(items, key=lambda i: (-i['value'] / max(i['seconds'], 1), i['exercise']))
+    for item in ranked:
+        if used + item['seconds'] <= capacity:
+            chosen.append(item)
+            used += item['seconds']
+
+    fitting = [i for i in items if i['seconds'] <= capacity]
+    if fitting:
+        best = max(fitting, key=lambda i: i['value'])
+        if best['value'] > sum(i['value'] for i in chosen):
+            chosen = [best]
+    return chosen
+
+
+def pack_exact(items, capacity, deadline=None):
+    """Solve the 0/1 knapsack in SLOT_SECONDS slots.
+
+    Returns None if ``deadline`` (a ``time.perf_counter()`` value) passes
+    before the table is complete.
+    """
+    slots = capacity // SLOT_SECONDS
+    costs = [-(-i['seconds'] // SLOT_SECONDS) for i in items]
+    best = [0] * (slots + 1)
+    taken = []
+
+    for item, cost in zip(items, costs):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        row = bytearray(slots + 1)
+        value = item['value']
+        for c in range(slots, cost - 1, -1):
+            candidate = best[c - cost] + value
+            if candidate > best[c]:
+                best[c] = candidate
+                row[c] = 1
+        taken.append(row)
+
+    chosen = []
+    c = slots
+    for index in range(len(items) - 1, -1, -1):
+        if taken[index][c]:
+            chosen.append(items[index])
+            c -= costs[index]
+    chosen.reverse()
+    return chosen
+
+
+def pack(items, minutes, mode="auto", time_limit_ms=DEFAULT_TIME_LIMIT_MS):
+    """Select exercises that fit in ``minutes``; returns (chosen, mode used)"""
+    capacity = max(minutes, 0) * 60
+    if mode == "auto":
+        cells = len(items) * (capacity // SLOT_SECONDS + 1)
+        mode = "exact" if cells <= MAX_EXACT_CELLS else "heuristic"
+
+    if mode == "exact":
+        deadline = None
+        if time_limit_ms:
+            deadline = time.perf_counter() + time_limit_ms / 1000
+        chosen = pack_exact(items, capacity, deadline)
+        if chosen is not None:
+            return chosen, "exact"
+
+    return pack_greedy(items, capacity), "heuristic"
+
+
+def build_routine(actions, minutes, mode="auto", time_limit_ms=DEFAULT_TIME_LIMIT_MS):
+    """Pack the fired actions into a routine that fits the session length"""
+    items = candidate_exercises(actions)
+    chosen, used_mode = pack(items, minutes, mode, time_limit_ms)
+    total = sum(i['seconds'] for i in chosen)
+    return {
+        "exercises": [
+            {key: item[key] for key in ('exercise', 'sets', 'reps', 'rest_seconds', 'seconds', 'rules')}
+            for item in chosen
+        ],
+        "total_seconds": total,
+        "unused_seconds": minutes * 60 - total,
+        "candidates": len(items),
+        "packing": used_mode,
+    }
+
+
+def routines_for_program(model, engine, age=None, fitness_level=None,
+                         mode="auto", time_limit_ms=DEFAULT_TIME_LIMIT_MS, cache=None):
+    """Build a routine for every workout definition in a parsed ``Program``.
+
+    Rules written inside the program apply on top of those in ``engine``.
+    ``cache`` (a ProfileClassCache over ``engine``) is only used for
+    programs without rules of their own.
+    """
+    program_rules = RuleEngine(records=engine.records, prune=engine.prune)
+    program_rules.load(
+        rule_data_from_definition(rule_def, i)
+        for i, rule_def in enumerate(model.rule_definitions, start=1)
+    )
+
+    routines = []
+    for workout in model.workout_definitions:
+        minutes = workout.duration.time.minutes
+        profile = normalize_profile({
+            'muscle_group': workout.muscle_group.muscles,
+            'goal': workout.goal.goal_type,
+            'duration': minutes,
+            'age': age,
+            'fitness_level': fitness_level
+        })
+
+        def routine(profile=profile, minutes=minutes):
+            matched = engine.matching_rules(profile) + program_rules.matching_rules(profile)
+            actions = [action for rule in matched for action in rule.actions]
+            return {
+                "matched_rules": [rule.name for rule in matched],
+                **build_routine(actions, minutes, mode, time_limit_ms)
+            }
+
+        if cache is not None and not program_rules.rules:
+            # The packing depends on the exact length, not just its class
+            result = cache.get(profile, ("routine", minutes, mode, time_limit_ms), routine)
+        else:
+            result = routine()
+
+        routines.append({
+            "day": workout.day.day_of_week,
+            "muscles": list(workout.muscle_group.muscles),
+            "goal": workout.goal.goal_type,
+            "duration_minutes": minutes,
+            **result
+        })
+    return routines
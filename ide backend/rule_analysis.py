@@ -0,0 +1,288 @@
+"""Static analysis of the stored rules.
+
+Each rule's conditions are folded into one constraint per variable: an
+integer interval with excluded points for ``age`` / ``duration``, allowed
+and excluded value sets for ``goal`` / ``fitness_level``, and required and
+forbidden muscles for ``muscle_group``. From those the analyzer reports
+
+* dead rules, whose conditions can never hold together;
+* duplicates, rules with the same constraints and actions as a lower id;
+* subsumed rules, whose constraints imply those of another rule with the
+  same actions, so they never add an action that rule does not;
+* rule names used by more than one rule.
+
+Conditions it cannot reason about (ordering of categorical values, record
+variables) are kept verbatim and only ever match themselves.
+"""
+import time
+from collections import defaultdict
+
+from rule_engine import CATEGORICAL_VARIABLES, NUMERIC_VARIABLES, OPERATORS, is_record_variable, to_int
+
+PRUNE_MODES = ("none", "dead", "redundant")
+
+
+class Dead(Exception):
+    pass
+
+
+class NumberRange:
+    __slots__ = ('lo', 'hi', 'excluded')
+
+    def __init__(self):
+        self.lo = None
+        self.hi = None
+        self.excluded = set()
+
+    def apply(self, op, value):
+        if op == '==':
+            self.lo = value if self.lo is None else max(self.lo, value)
+            self.hi = value if self.hi is None else min(self.hi, value)
+        elif op == '!=':
+            self.excluded.add(value)
+        elif op in ('<', '<='):
+            bound = value - 1 if op == '<' else value
+            self.hi = bound if self.hi is None else min(self.hi, bound)
+        else:
+            bound = value + 1 if op == '>' else value
+            self.lo = bound if self.lo is None else max(self.lo, bound)
+
+    def check(self):
+        if self.lo is not None and self.hi is not None:
+            if self.lo > self.hi:
+                raise Dead(f"needs {self.lo} <= value <= {self.hi}")
+            if self.hi - self.lo + 1 <= len(self.excluded) and all(
+                    v in self.excluded for v in range(self.lo, self.hi + 1)):
+                raise Dead(f"every value in {self.lo}..{self.hi} is excluded")
+        # Exclusions outside the interval never matter
+        self.excluded = {v for v in self.excluded
+                         if (self.lo is None or v >= self.lo) and (self.hi is None or v <= self.hi)}
+
+    def signature(self):
+        return 'range', self.lo, self.hi, frozenset(self.excluded)
+
+    def implies(self, other):
+        """Whether every value allowed here is allowed by other"""
+        if other.lo is not None and (self.lo is None or self.lo < other.lo):
+            return False
+        if other.hi is not None and (self.hi is None or self.hi > other.hi):
+            return False
+        return all(v in self.excluded for v in other.excluded)
+
+
+class ValueSet:
+    __slots__ = ('allowed', 'excluded')
+
+    def __init__(self):
+        self.allowed = None    # None: any value
+        self.excluded = set()
+
+    def apply(self, op, value):
+        if op == '==':
+            self.allowed = {value} if self.allowed is None else self.allowed & {value}
+        else:
+            self.excluded.add(value)
+
+    def check(self):
+        if self.allowed is not None:
+            self.allowed -= self.excluded
+            self.excluded = set()
+            if not self.allowed:
+                raise Dead("no value satisfies both == and != conditions")
+
+    def signature(self):
+        return 'set', frozenset(self.allowed) if self.allowed is not None else None, frozenset(self.excluded)
+
+    def implies(self, other):
+        if self.allowed is None:
+            return other.allowed is None and other.excluded <= self.excluded
+        return ((other.allowed is None or self.allowed <= other.allowed)
+                and not (self.allowed & other.excluded))
+
+
+class MuscleSet:
+    __slots__ = ('required', 'forbidden')
+
+    def __init__(self):
+        self.required = set()
+        self.forbidden = set()
+
+    def apply(self, op, value):
+        (self.required if op == '==' else self.forbidden).add(value)
+
+    def check(self):
+        clash = self.required & self.forbidden
+        if clash:
+            raise Dead(f"muscle_group both requires and excludes {', '.join(sorted(clash))}")
+
+    def signature(self):
+        return 'muscles', frozenset(self.required), frozenset(self.forbidden)
+
+    def implies(self, other):
+        return other.required <= self.required and other.forbidden <= self.forbidden
+
+
+class RuleConstraints:
+    """Per-variable constraints of one compiled rule"""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.variables = {}
+        self.opaque = set()    # conditions kept verbatim
+        self.dead = None
+        self.actions = tuple(
+            tuple(sorted((k, v) for k, v in action.items() if k not in ('rule_id', 'rule')))
+            for action in rule.actions
+        )
+        try:
+            self._fold(rule.conditions)
+        except Dead as e:
+            self.dead = str(e)
+
+    def _fold(self, conditions):
+        if not conditions:
+            raise Dead("has no conditions")
+        for variable, op, value in conditions:
+            if op not in OPERATORS:
+                raise Dead(f"unknown operator {op}")
+            if variable in NUMERIC_VARIABLES:
+                number = to_int(value)
+                if number is None:
+                    raise Dead(f"{variable} compared with non-number {value!r}")
+                self.variables.setdefault(variable, NumberRange()).apply(op, number)
+            elif variable == 'muscle_group' and op in ('==', '!='):
+                self.variables.setdefault(variable, MuscleSet()).apply(op, value)
+            elif variable in CATEGORICAL_VARIABLES and op in ('==', '!='):
+                self.variables.setdefault(variable, ValueSet()).apply(op, value)
+            elif variable in CATEGORICAL_VARIABLES or is_record_variable(variable):
+                self.opaque.add((variable, op, value))
+            else:
+                raise Dead(f"unknown variable {variable}")
+        for constraint in self.variables.values():
+            constraint.check()
+
+    def signature(self):
+        return (
+            tuple(sorted((v, c.signature()) for v, c in self.variables.items())),
+            frozenset(self.opaque)
+        )
+
+    def implies(self, other):
+        """Whether every profile satisfying this rule also satisfies other"""
+        if not other.opaque <= self.opaque:
+            return False
+        for variable, constraint in other.variables.items():
+            mine = self.variables.get(variable)
+            if mine is None or not mine.implies(constraint):
+                return False
+        return True
+
+
+def analyze(rules):
+    """Analyze compiled rules (an iterable of CompiledRule); returns a report dict"""
+    started = time.perf_counter()
+    constraints = [RuleConstraints(rule) for rule in sorted(rules, key=lambda r: r.id)]
+    for c in constraints:
+        c.rule.dead = c.dead or ''
+
+    dead = [c for c in constraints if c.dead]
+    live = [c for c in constraints if not c.dead]
+
+    duplicates = []
+    by_signature = {}
+    for c in live:
+        key = (c.signature(), c.actions)
+        first = by_signature.setdefault(key, c)
+        if first is not c:
+            duplicates.append((c, first))
+    duplicate_ids = {c.rule.id for c, _ in duplicates}
+
+    # Only rules with the same actions can make each other redundant
+    subsumed = []
+    by_actions = defaultdict(list)
+    for c in live:
+        if c.rule.id not in duplicate_ids:
+            by_actions[c.actions].append(c)
+    for group in by_actions.values():
+        for c in group:
+            for other in group:
+                if other is not c and c.implies(other) and not (
+                        other.implies(c) and other.rule.id > c.rule.id):
+                    subsumed.append((c, other))
+                    break
+
+    names = defaultdict(list)
+    for c in constraints:
+        names[c.rule.name].append(c.rule.id)
+
+    def describe(c):
+        return {"id": c.rule.id, "name": c.rule.name}
+
+    return {
+        "rules": len(constraints),
+        "dead": [{**describe(c), "reason": c.dead} for c in dead],
+        "duplicates": [{**describe(c), "duplicate_of": first.rule.id} for c, first in duplicates],
+        "subsumed": [{**describe(c), "subsumed_by": other.rule.id} for c, other in subsumed],
+        "duplicate_names": [{"name": name, "ids": ids} for name, ids in sorted(names.items()) if len(ids) > 1],
+        "seconds": round(time.perf_counter() - started, 6)
+    }
+
+
+def dead_reason(rule):
+    """Why rule can never fire, or None; worked out once per compiled rule"""
+    if rule.dead is None:
+        rule.dead = RuleConstraints(rule).dead or ''
+    return rule.dead or None
+
+
+class Pruner:
+    """Picks the rules a RuleEngine leaves out of evaluation under mode.
+
+    ``dead`` rules never fire, so leaving them out changes nothing; when a
+    snapshot is published only the rules that changed are checked.
+    ``redundant`` also drops duplicates and subsumed rules. Finding those
+    compares every rule with the others, so it is not done on publish but
+    by ``find_redundant``, which the SnapshotBuilder thread runs; a rule
+    stays pruned as redundant until it or the rule covering it changes.
+    Unlike dead pruning this changes results: every action still fires,
+    but only once where several rules fired it before. Routine generation
+    scores exercises by how often they are included, so those scores drop,
+    and the pruned rules are no longer listed among the matched rules.
+    """
+
+    def __init__(self, mode="dead"):
+        if mode not in PRUNE_MODES:
+            raise ValueError(f"Unknown pruning mode {mode!r}; expected one of {', '.join(PRUNE_MODES)}")
+        self.mode = mode
+
+    def update(self, previous, rules, changed, redundant=None):
+        """Pruned ids and redundant map (id -> id covering it) for a new snapshot.
+
+        previous is the snapshot being replaced, rules the new rules by id
+        and changed the ids added, replaced or removed since. redundant,
+        if given, was found for rules and replaces the map carried over
+        from previous.
+        """
+        if self.mode == "none":
+            return frozenset(), {}
+        dead = {rule_id for rule_id in changed if rule_id in rules and dead_reason(rules[rule_id])}
+        dead.update(rule_id for rule_id in previous.pruned
+                    if rule_id in rules and rule_id not in changed and rule_id not in previous.redundant)
+        kept = {}
+        if self.mode == "redundant" and redundant is not None:
+            kept = {rule_id: keeper for rule_id, keeper in redundant.items()
+                    if rule_id in rules and keeper in rules}
+        elif self.mode == "redundant":
+            kept = {rule_id: keeper for rule_id, keeper in previous.redundant.items()
+                    if rule_id in rules and keeper in rules
+                    and rule_id not in changed and keeper not in changed}
+        return frozenset(dead) | frozenset(kept), kept
+
+    def find_redundant(self, rules):
+        """Map each duplicate or subsumed rule to the rule covering it, or None if mode skips this"""
+        if self.mode != "redundant":
+            return None
+        report = analyze(rules)
+        redundant = {entry['id']: entry['duplicate_of'] for entry in report['duplicates']}
+        redundant.update((entry['id'], entry['subsumed_by']) for entry in report['subsumed'])
+        return redundant
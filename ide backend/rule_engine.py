@@ -0,0 +1,646 @@
+"""Compiled evaluation of stored workout rules against user profiles.
+
+Rules are compiled once from their stored form (the dicts produced by
+``serialize_rule``) into a predicate closure and a precomputed action list,
+so evaluating a profile never touches the DSL parser or the database.
+"""
+import bisect
+import operator
+import threading
+import time
+
+SIMPLE_VARIABLES = ("muscle_group", "goal", "duration", "age", "fitness_level")
+NUMERIC_VARIABLES = frozenset({"duration", "age"})
+CATEGORICAL_VARIABLES = frozenset({"muscle_group", "goal", "fitness_level"})
+RANGE_OPERATORS = frozenset({"<", "<=", ">", ">="})
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+def to_int(value):
+    """Convert 30, '30' or '30m' to an int, or None if it is not a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if value.endswith('m'):
+            value = value[:-1]
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
+
+
+class ProfileError(ValueError):
+    pass
+
+
+SCALARS = (str, int, float, bool)
+
+
+def normalize_profile(data):
+    """Build the evaluation profile from request data.
+
+    ``muscle_group`` may be a single muscle or a list of muscles and is stored
+    as a frozenset; ``age`` and ``duration`` are coerced to ints. Raises
+    ProfileError unless data is a dict whose categorical values are scalars.
+    """
+    if not isinstance(data, dict):
+        raise ProfileError("Profile must be an object")
+    muscles = data.get('muscle_group') or data.get('muscles') or ()
+    if isinstance(muscles, SCALARS):
+        muscles = (muscles,)
+    elif not isinstance(muscles, (list, tuple, set, frozenset)) or not all(isinstance(m, SCALARS) for m in muscles):
+        raise ProfileError("muscle_group must be a muscle or a list of muscles")
+    for variable in ('goal', 'fitness_level'):
+        if data.get(variable) is not None and not isinstance(data.get(variable), SCALARS):
+            raise ProfileError(f"{variable} must be a single value")
+    return {
+        'muscle_group': frozenset(str(m) for m in muscles),
+        'goal': data.get('goal'),
+        'fitness_level': data.get('fitness_level'),
+        'age': to_int(data.get('age')),
+        'duration': to_int(data.get('duration')),
+    }
+
+
+def _never(profile):
+    return False
+
+
+def _always(profile):
+    return True
+
+
+def is_record_variable(variable):
+    return variable not in SIMPLE_VARIABLES and '.' in variable
+
+
+def compile_condition(variable, op, value):
+    """Compile one stored ``(variable, operator, value)`` row into a predicate"""
+    compare = OPERATORS.get(op)
+    if compare is None:
+        return _never
+
+    if variable in NUMERIC_VARIABLES:
+        threshold = to_int(value)
+        if threshold is None:
+            return _never
+
+        def predicate(profile):
+            actual = profile[variable]
+            return actual is not None and compare(actual, threshold)
+        return predicate
+
+    if variable == 'muscle_group':
+        if op == '==':
+            return lambda profile: value in profile['muscle_group']
+        if op == '!=':
+            return lambda profile: value not in profile['muscle_group']
+        return lambda profile: any(compare(m, value) for m in profile['muscle_group'])
+
+    if variable in SIMPLE_VARIABLES:
+        def predicate(profile):
+            actual = profile[variable]
+            return actual is not None and compare(actual, value)
+        return predicate
+
+    # Record variables (Type.field) are not resolved against profiles, see
+    # CompiledRule.record_conditions
+    return _never
+
+
+def compile_action(rule_id, rule_name, row):
+    """Turn a stored action row into the result reported when the rule fires"""
+    action_type = row.get('action_type')
+    result = {"rule_id": rule_id, "rule": rule_name, "type": action_type}
+    if action_type == 'include_exercise':
+        result["exercise"] = row.get('exercise_name')
+    elif action_type == 'sets_reps':
+        result["sets_count"] = row.get('sets_count')
+        result["reps_count"] = row.get('reps_count')
+    elif action_type == 'rest_time':
+        result["min_rest_time"] = row.get('min_rest_time')
+        result["max_rest_time"] = row.get('max_rest_time')
+    return result
+
+
+def rule_data_from_definition(rule_def, rule_id):
+    """Convert a parsed ``RuleDefinition`` into the stored rule dict form"""
+    name = f"Rule {rule_def.name.number}"
+    conditions = []
+    for cond in rule_def.condition.conditions:
+        try:
+            variable = f"{cond.variable.record_type}.{cond.variable.field}"
+        except AttributeError:
+            variable = str(cond.variable)
+        value = cond.value
+        if isinstance(value, str):
+            value = value.strip('"')
+        conditions.append({"variable": variable, "operator": cond.operator, "value": str(value)})
+
+    action = rule_def.action
+    if hasattr(action, 'exercise'):
+        row = {"action_type": "include_exercise", "exercise_name": action.exercise.strip('"')}
+    elif hasattr(action, 'sets_count'):
+        row = {"action_type": "sets_reps", "sets_count": action.sets_count, "reps_count": action.reps_count}
+    else:
+        row = {"action_type": "rest_time",
+               "min_rest_time": action.min_time.minutes * 60,
+               "max_rest_time": action.max_time.minutes * 60}
+
+    return {"id": rule_id, "name": name, "conditions": conditions, "actions": [row]}
+
+
+class CompiledRule:
+    """A stored rule compiled into a predicate plus its fired actions.
+
+    ``Type.field`` conditions do not depend on the profile. They are kept
+    apart in ``record_conditions`` (type name -> ``(field, op, value)``
+    tuples) and hold when some record of that type satisfies all of them.
+    ``dead`` caches why the rule can never fire ('' if it can, None until
+    rule_analysis has looked at it).
+    """
+    __slots__ = ('id', 'name', 'conditions', 'record_conditions', 'predicate', 'actions', 'data', 'dead')
+
+    def __init__(self, rule_data):
+        self.data = rule_data
+        self.dead = None
+        self.id = rule_data['id']
+        self.name = rule_data['name']
+        self.conditions = tuple(
+            (c['variable'], c['operator'], c['value'])
+            for c in rule_data.get('conditions', [])
+        )
+        self.actions = tuple(
+            compile_action(self.id, self.name, a)
+            for a in rule_data.get('actions', [])
+        )
+
+        record_conditions = {}
+        for variable, op, value in self.conditions:
+            if is_record_variable(variable):
+                record_type, field = variable.split('.', 1)
+                record_conditions.setdefault(record_type, []).append((field, op, value))
+        self.record_conditions = {t: tuple(c) for t, c in record_conditions.items()}
+
+        tests = tuple(compile_condition(*c) for c in self.conditions if not is_record_variable(c[0]))
+        if not self.conditions:
+            self.predicate = _never
+        elif not tests:
+            self.predicate = _always
+        elif len(tests) == 1:
+            self.predicate = tests[0]
+        else:
+            def predicate(profile):
+                for test in tests:
+                    if not test(profile):
+                        return False
+                return True
+            self.predicate = predicate
+
+
+class RuleIndex:
+    """Discrimination index over rule conditions.
+
+    Every rule is filed once, under its most selective condition: ``==`` on a
+    categorical variable goes into a hash bucket keyed by value, range
+    comparisons on ``age``/``duration`` go into a list sorted by threshold.
+    Rules without an indexable condition are always candidates. Looking up a
+    profile returns only the rules whose anchor condition can hold; the full
+    predicate still has to be checked on each candidate.
+    """
+
+    def __init__(self):
+        self.buckets = {}      # variable -> value -> [rule_id]
+        self.ranges = {}       # (variable, operator) -> sorted [(threshold, rule_id)]
+        self.unindexed = []
+
+    @staticmethod
+    def anchor(rule):
+        """Pick the condition a rule is filed under, or None"""
+        numeric_eq = None
+        numeric_range = None
+        for variable, op, value in rule.conditions:
+            if op == '==' and variable in CATEGORICAL_VARIABLES:
+                return variable, op, value
+            if variable in NUMERIC_VARIABLES:
+                threshold = to_int(value)
+                if threshold is None:
+                    continue
+                if op == '==' and numeric_eq is None:
+                    numeric_eq = (variable, op, threshold)
+                elif op in RANGE_OPERATORS and numeric_range is None:
+                    numeric_range = (variable, op, threshold)
+        return numeric_eq or numeric_range
+
+    def add(self, rule):
+        anchor = self.anchor(rule)
+        if anchor is None:
+            self.unindexed.append(rule.id)
+            return
+        variable, op, value = anchor
+        if op == '==':
+            self.buckets.setdefault(variable, {}).setdefault(value, []).append(rule.id)
+        else:
+            bisect.insort(self.ranges.setdefault((variable, op), []), (value, rule.id))
+
+    def _own(self, anchor, owned):
+        """The list rules anchored on anchor are filed in, copied on first use.
+
+        owned maps what this index has already copied (anchor keys and
+        bucket variables) to the copy.
+        """
+        key = anchor if anchor is None or anchor[1] == '==' else anchor[:2]
+        if key in owned:
+            return owned[key]
+        if anchor is None:
+            entries = self.unindexed = list(self.unindexed)
+        elif anchor[1] == '==':
+            variable, _, value = anchor
+            if variable not in owned:
+                owned[variable] = self.buckets[variable] = dict(self.buckets.get(variable, {}))
+            entries = owned[variable][value] = list(owned[variable].get(value, ()))
+        else:
+            entries = self.ranges[key] = list(self.ranges.get(key, ()))
+        owned[key] = entries
+        return entries
+
+    def derive(self, removed=(), added=()):
+        """Return a copy without the removed rules and with the added ones.
+
+        Only the lists the changed rules are filed in are copied; the rest
+        are shared with this index, which is left as it was.
+        """
+        index = RuleIndex()
+        index.buckets = dict(self.buckets)
+        index.ranges = dict(self.ranges)
+        index.unindexed = self.unindexed
+        owned = {}
+        dropped = {}
+        for rule in removed:
+            anchor = self.anchor(rule)
+            dropped.setdefault(anchor, set()).add(rule.id)
+        for anchor, ids in dropped.items():
+            entries = index._own(anchor, owned)
+            if anchor is None or anchor[1] == '==':
+                entries[:] = [rule_id for rule_id in entries if rule_id not in ids]
+            else:
+                entries[:] = [entry for entry in entries if entry[1] not in ids]
+        for rule in added:
+            anchor = self.anchor(rule)
+            entries = index._own(anchor, owned)
+            if anchor is None or anchor[1] == '==':
+                entries.append(rule.id)
+            else:
+                bisect.insort(entries, (anchor[2], rule.id))
+        return index
+
+    def candidates(self, profile):
+        """Return the ids of the rules whose anchor condition holds for profile"""
+        found = list(self.unindexed)
+
+        for variable, buckets in self.buckets.items():
+            actual = profile.get(variable)
+            if actual is None:
+                continue
+            if variable == 'muscle_group':
+                for muscle in actual:
+                    found.extend(buckets.get(muscle, ()))
+            else:
+                found.extend(buckets.get(actual, ()))
+
+        for (variable, op), entries in self.ranges.items():
+            actual = profile.get(variable)
+            if actual is None:
+                continue
+            # entries are (threshold, rule_id); the rule holds when
+            # ``actual <op> threshold``, which is a suffix or prefix of the list
+            if op == '<':
+                found.extend(rid for _, rid in entries[bisect.bisect_right(entries, (actual, float('inf'))):])
+            elif op == '<=':
+                found.extend(rid for _, rid in entries[bisect.bisect_left(entries, (actual, float('-inf'))):])
+            elif op == '>':
+                found.extend(rid for _, rid in entries[:bisect.bisect_left(entries, (actual, float('-inf')))])
+            else:
+                found.extend(rid for _, rid in entries[:bisect.bisect_right(entries, (actual, float('inf')))])
+
+        return found
+
+
+class ProfileClassifier:
+    """Maps profiles to equivalence classes under a rule set.
+
+    Two profiles with the same ``key`` satisfy exactly the same profile
+    conditions: numbers only matter relative to the thresholds the rules
+    compare them with, and categorical values only when some condition
+    names them (or orders them, which keeps the exact value).
+    """
+
+    def __init__(self, rules=()):
+        self.thresholds = {variable: [] for variable in NUMERIC_VARIABLES}
+        self.values = {variable: set() for variable in CATEGORICAL_VARIABLES}
+        self.ordered = set()
+        self.uses_records = False
+        self._add(rules)
+
+    def _add(self, rules):
+        added = {variable: set() for variable in NUMERIC_VARIABLES}
+        for rule in rules:
+            if rule.record_conditions:
+                self.uses_records = True
+            for variable, op, value in rule.conditions:
+                if variable in NUMERIC_VARIABLES:
+                    threshold = to_int(value)
+                    if threshold is not None:
+                        added[variable].add(threshold)
+                elif variable in CATEGORICAL_VARIABLES:
+                    self.values[variable].add(value)
+                    if op in RANGE_OPERATORS:
+                        self.ordered.add(variable)
+        for variable, thresholds in added.items():
+            if thresholds:
+                self.thresholds[variable] = sorted(thresholds.union(self.thresholds[variable]))
+
+    def extended(self, rules):
+        """Return a copy that also tells apart the profiles rules do.
+
+        Thresholds and values of rules that are gone are kept: they only
+        split classes that could have shared a key, so keys stay correct.
+        """
+        classifier = ProfileClassifier()
+        classifier.thresholds = dict(self.thresholds)
+        classifier.values = {variable: set(values) for variable, values in self.values.items()}
+        classifier.ordered = set(self.ordered)
+        classifier.uses_records = self.uses_records
+        classifier._add(rules)
+        return classifier
+
+    def key(self, profile):
+        parts = []
+        for variable in sorted(NUMERIC_VARIABLES):
+            actual = profile[variable]
+            thresholds = self.thresholds[variable]
+            if actual is None:
+                parts.append(None)
+                continue
+            i = bisect.bisect_left(thresholds, actual)
+            if i < len(thresholds) and thresholds[i] == actual:
+                parts.append(('=', actual))
+            else:
+                # The open interval between the neighbouring thresholds
+                parts.append((thresholds[i - 1] if i else None,
+                              thresholds[i] if i < len(thresholds) else None))
+
+        for variable in ('goal', 'fitness_level'):
+            actual = profile[variable]
+            if actual is None or variable in self.ordered or actual in self.values[variable]:
+                parts.append(actual)
+            else:
+                parts.append(('other',))
+
+        muscles = profile['muscle_group']
+        if 'muscle_group' not in self.ordered:
+            muscles = muscles & self.values['muscle_group']
+        parts.append(muscles)
+        return tuple(parts)
+
+
+class RuleSet:
+    """Immutable compiled rule set: rules by id plus their index.
+
+    A new version is built next to the active one and published by
+    replacing a single reference, so readers never lock and never see a
+    partially applied change. Rules in ``pruned`` stay in ``rules`` but are
+    left out of the index, so they are never evaluated; ``redundant`` maps
+    those pruned as redundant to the rule covering them.
+    """
+    __slots__ = ('version', 'rules', 'index', 'pruned', 'redundant', 'built_at', 'build_seconds', 'source')
+
+    def __init__(self, version, rules, source, build_seconds=0.0, pruned=frozenset(), redundant=None,
+                 index=None):
+        self.version = version
+        self.rules = rules
+        self.pruned = pruned
+        self.redundant = redundant or {}
+        if index is None:
+            index = RuleIndex()
+            for rule in rules.values():
+                if rule.id not in pruned:
+                    index.add(rule)
+        self.index = index
+        self.built_at = time.time()
+        self.build_seconds = build_seconds
+        self.source = source
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "rules": len(self.rules),
+            "pruned": sorted(self.pruned),
+            "built_at": self.built_at,
+            "build_seconds": round(self.build_seconds, 6),
+            "source": self.source
+        }
+
+
+def same_rule(a, b):
+    return a.name == b.name and a.conditions == b.conditions and a.actions == b.actions
+
+
+class RuleEngine:
+    """Holds the active RuleSet snapshot and evaluates profiles against it.
+
+    ``records`` resolves ``Type.field`` conditions: it needs a ``version``
+    and ``exists(type_name, conditions)``, e.g. a RecordProjection. Without
+    it, rules with record conditions never fire. ``prune`` picks the rules
+    left out of evaluation, see rule_analysis.Pruner.
+    """
+
+    def __init__(self, records=None, prune=None):
+        self.snapshot = RuleSet(0, {}, source="empty")
+        self.loaded = False
+        self.records = records
+        self.prune = prune
+        self._record_results = {}    # rule id -> bool, for _records_version
+        self._records_version = None
+        # Snapshot version whose redundant rules were last looked for
+        self._redundant_checked = None
+        # Called with (replaced or removed rules, new rules) after a change,
+        # or with (None, None) after the first load
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def rules(self):
+        return self.snapshot.rules
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    def _publish(self, rules, source, started, changed, redundant=None):
+        """Swap in a new snapshot; callers hold ``_lock``, which only serializes writers.
+
+        changed holds the ids of the rules added, replaced or removed.
+        Returns the rules that were pruned before and are not now, or the
+        other way round, since their results change like those of an edit.
+        """
+        previous = self.snapshot
+        if self.prune is None:
+            pruned, redundant = frozenset(), {}
+        else:
+            pruned, redundant = self.prune.update(previous, rules, changed, redundant)
+        toggled = [rules[rule_id] for rule_id in pruned ^ previous.pruned
+                   if rule_id in rules and rule_id not in changed]
+        index = None
+        touched = set(changed) | (pruned ^ previous.pruned)
+        # Past half the rules, building a fresh index is cheaper
+        if len(touched) * 2 < len(rules):
+            removed, added = [], []
+            for rule_id in touched:
+                old, new = previous.rules.get(rule_id), rules.get(rule_id)
+                was_indexed = old is not None and rule_id not in previous.pruned
+                is_indexed = new is not None and rule_id not in pruned
+                if was_indexed and (not is_indexed or new is not old):
+                    removed.append(old)
+                if is_indexed and (not was_indexed or new is not old):
+                    added.append(new)
+            index = previous.index.derive(removed, added)
+        self.snapshot = RuleSet(previous.version + 1, rules, source,
+                                time.perf_counter() - started, pruned, redundant, index)
+        self._record_results = {}
+        return toggled
+
+    def _notify(self, first, replaced, added):
+        for listener in self.listeners:
+            if first:
+                listener(None, None)
+            else:
+                listener(replaced, added)
+
+    def load(self, rule_dicts, source="database", base=None, redundant=None):
+        """Publish the given rules as the new snapshot.
+
+        Rules identical to those already active keep their compiled form,
+        and listeners only hear about the rules that actually changed.
+        base is the snapshot that was active when rule_dicts were read:
+        rules published since then may be missing from them, so those
+        already active are kept instead. redundant is a map of redundant
+        rules already found for rule_dicts (see RuleSet).
+        """
+        started = time.perf_counter()
+        compiled = [CompiledRule(rule_data) for rule_data in rule_dicts]
+        with self._lock:
+            first = not self.loaded
+            current = self.snapshot.rules
+            if base is not None and base is not self.snapshot:
+                newer = {rule_id: rule for rule_id, rule in current.items()
+                         if base.rules.get(rule_id) is not rule}
+                compiled = [newer.pop(rule.id, rule) for rule in compiled]
+                compiled.extend(newer.values())
+            rules, added = {}, []
+            for rule in compiled:
+                previous = current.get(rule.id)
+                if previous is not None and same_rule(previous, rule):
+                    rule = previous
+                else:
+                    added.append(rule)
+                rules[rule.id] = rule
+            replaced = [rule for rule_id, rule in current.items()
+                        if rule_id not in rules or rules[rule_id] is not rule]
+            changed = {rule.id for rule in added}
+            changed.update(rule.id for rule in replaced)
+            replaced.extend(self._publish(rules, source, started, changed, redundant))
+            self.loaded = True
+        self._notify(first, replaced, added)
+
+    def add(self, rule_data):
+        self.add_many([rule_data])
+
+    def add_many(self, rule_dicts):
+        started = time.perf_counter()
+        compiled = [CompiledRule(rule_data) for rule_data in rule_dicts]
+        with self._lock:
+            rules = dict(self.snapshot.rules)
+            replaced = [rules[rule.id] for rule in compiled if rule.id in rules]
+            for rule in compiled:
+                rules[rule.id] = rule
+            replaced.extend(self._publish(rules, "incremental", started, {rule.id for rule in compiled}))
+        self._notify(False, replaced, compiled)
+
+    def refresh_redundant(self):
+        """Look for redundant rules in the active snapshot and prune them.
+
+        Slow on large rule sets, so the SnapshotBuilder thread calls it
+        rather than the writers. Returns whether a snapshot was published;
+        if the rules changed during the analysis nothing is, and the next
+        call starts over.
+        """
+        snapshot = self.snapshot
+        if self.prune is None or not self.loaded or snapshot.version == self._redundant_checked:
+            return False
+        started = time.perf_counter()
+        redundant = self.prune.find_redundant(snapshot.rules.values())
+        if redundant is None:
+            self._redundant_checked = snapshot.version
+            return False
+        with self._lock:
+            if self.snapshot is not snapshot:
+                return False
+            toggled = self._publish(snapshot.rules, snapshot.source, started, (), redundant)
+            self._redundant_checked = self.snapshot.version
+        self._notify(False, toggled, [])
+        return True
+
+    def rule_dicts(self):
+        """Return the stored form of every rule, e.g. to rebuild the engine elsewhere"""
+        return [rule.data for rule in self.rules.values()]
+
+    def records_hold(self, rule):
+        """Whether the record conditions of rule hold; cached per records version"""
+        if not rule.record_conditions:
+            return True
+        if self.records is None:
+            return False
+        version = self.records.version
+        if version != self._records_version:
+            self._record_results = {}
+            self._records_version = version
+        held = self._record_results.get(rule.id)
+        if held is None:
+            held = all(self.records.exists(record_type, conditions)
+                       for record_type, conditions in rule.record_conditions.items())
+            # Checking may have refreshed the records; only cache if not
+            if self.records.version == version:
+                self._record_results[rule.id] = held
+        return held
+
+    def matching_rules(self, profile):
+        """Return the rules that fire for profile, in rule id order"""
+        snapshot = self.snapshot
+        rules = snapshot.rules
+        matched = []
+        for rule_id in snapshot.index.candidates(profile):
+            rule = rules.get(rule_id)
+            if rule is not None and rule.predicate(profile) and self.records_hold(rule):
+                matched.append(rule)
+        matched.sort(key=lambda rule: rule.id)
+        return matched
+
+    def evaluate(self, profile):
+        """Return the actions of every rule whose conditions hold for profile"""
+        fired = []
+        for rule in self.matching_rules(profile):
+            fired.extend(rule.actions)
+        return fired
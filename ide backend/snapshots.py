@@ -0,0 +1,91 @@
+"""Background rebuilding of the rule engine snapshot from the database.
+
+A daemon thread polls a cheap fingerprint of the rule tables and, when it
+changes (or a rebuild is requested), loads every rule and publishes the
+result as the engine's next RuleSet. Evaluation keeps reading the previous
+snapshot until the swap, so it never waits for a rebuild. The thread also
+runs the engine's search for redundant rules, which is too slow to run on
+every write.
+"""
+import os
+import threading
+import time
+
+
+class SnapshotBuilder:
+    """Keeps ``engine`` in step with the rules stored in the database.
+
+    ``load()`` returns the stored rule dicts and ``fingerprint()`` any value
+    that changes whenever the rules do. The thread starts on the first call
+    to ``start`` in each process, so it also survives a pre-fork server.
+    """
+
+    def __init__(self, engine, load, fingerprint, interval=30.0, logger=None):
+        self._engine = engine
+        self._load = load
+        self._fingerprint = fingerprint
+        self.interval = interval
+        self._logger = logger
+        self._wake = threading.Event()
+        self._build_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.fingerprint = None
+        self.rebuilds = 0
+        self.last_checked = None
+        self.last_error = None
+
+    def rebuild(self):
+        """Load the rules and publish them now"""
+        with self._build_lock:
+            fingerprint = self._fingerprint()
+            # Rules added while loading are kept, see RuleEngine.load
+            base = self._engine.snapshot
+            self._engine.load(self._load(), source="database", base=base)
+            self.fingerprint = fingerprint
+            self.rebuilds += 1
+            self.last_checked = time.time()
+
+    def check(self):
+        """Rebuild if the stored rules changed since the last build"""
+        fingerprint = self._fingerprint()
+        self.last_checked = time.time()
+        if fingerprint != self.fingerprint:
+            self.rebuild()
+
+    def request(self):
+        """Ask the background thread to check the database right away"""
+        self._wake.set()
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="rule-snapshot-builder", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.check()
+                self._engine.refresh_redundant()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                if self._logger:
+                    self._logger.error(f"Rule snapshot rebuild failed: {str(e)}")
+
+    def status(self):
+        return {
+            "running": self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+            "interval_seconds": self.interval,
+            "rebuilds": self.rebuilds,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,127 @@
+"""SQLite databases for the sqlite and memory storage backends.
+
+Lets the backend and its benchmarks run without a MySQL server (see
+storage.py). The connections behave like MySQLdb ones opened with a
+DictCursor as far as main.py relies on them: ``%s`` placeholders, rows as dicts, ``ping`` and
+``lastrowid`` after a multi-row ``executemany`` INSERT being the id of the
+first row inserted. The schema is translated from migrations.py.
+"""
+import re
+import sqlite3
+
+import migrations
+
+IntegrityError = sqlite3.IntegrityError
+sqlite_version = sqlite3.sqlite_version
+
+
+def translate(step):
+    """SQLite form of a migration step (MySQL DDL or an IndexStep)"""
+    if isinstance(step, migrations.IndexStep):
+        kind = "UNIQUE INDEX" if step.unique else "INDEX"
+        return f"CREATE {kind} IF NOT EXISTS {step.name} ON {step.table} ({', '.join(step.columns)})"
+    if not isinstance(step, str):
+        raise ValueError(f"Migration step {step!r} has no SQLite form")
+    sql = step.replace(migrations.TABLE_OPTIONS, "").rstrip()
+    sql = sql.replace("INT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY")
+    return re.sub(r"UNIQUE KEY \w+ \(", "UNIQUE (", sql)
+
+
+# Every migration in SQLite syntax, so both backends share one schema
+SCHEMA = [translate(step) for _, _, steps in migrations.MIGRATIONS for step in steps]
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _sql(query):
+    return query.replace('%s', '?').replace('%%', '%')
+
+
+class Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        self._cursor.execute(_sql(query), tuple(params or ()))
+        self.lastrowid = self._cursor.lastrowid
+        return self._cursor.rowcount
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(_sql(query), [tuple(p) for p in seq_of_params])
+        if query.lstrip()[:6].upper() == 'INSERT' and self._cursor.rowcount > 0:
+            # Rowids of one statement are consecutive, as with InnoDB's
+            # auto-increment, so the first one follows from the last
+            last = self._cursor.connection.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
+            self.lastrowid = last - self._cursor.rowcount + 1
+        return self._cursor.rowcount
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, cursorclass=None):
+        # SQLite cursors already step through results lazily, so a
+        # server-side cursor class needs no counterpart
+        return Cursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self):
+        self._conn.execute("SELECT 1").fetchone()
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(path, timeout=5.0, uri=False):
+    """Open path (created if missing) with foreign keys enforced.
+
+    Files use WAL mode, so readers in other connections and processes are
+    not blocked by a writer; in-memory databases ignore it.
+    """
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, uri=uri)
+    conn.row_factory = _dict_row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    return Connection(conn)
+
+
+def create_schema(conn):
+    cur = conn.cursor()
+    try:
+        for statement in SCHEMA:
+            cur.execute(statement)
+        conn.commit()
+    finally:
+        cur.close()
@@ -0,0 +1,144 @@
+"""Storage backends for the rule, vocabulary and record tables.
+
+main.py issues the same SQL on every backend. A backend supplies the
+connections (DB-API, rows as dicts, ``%s`` placeholders), the errors raised
+for duplicate keys, and whatever the schema needs at startup. ``DATABASE``
+selects one:
+
+    mysql             the server in the MYSQL_* settings
+    sqlite:<path>     an embedded SQLite file in WAL mode
+    memory            an in-memory SQLite database private to the process
+
+``memory`` loses its data when the process exits and is not shared between
+workers, so it is meant for tests, benchmarks and single-process runs.
+"""
+import itertools
+import os
+
+try:
+    import MySQLdb
+    import MySQLdb.cursors
+except ImportError:
+    # Only needed by the mysql backend
+    MySQLdb = None
+
+import migrations
+import sqlite_db
+
+
+class Backend:
+    name = None
+    # Exceptions raised when an insert violates a unique key
+    integrity_errors = ()
+    # Cursor class for results too large to buffer, None when not needed
+    streaming_cursor = None
+    # Upper bound on pooled connections, None for no limit of its own
+    max_connections = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def prepare(self, pool, logger, check_indexes=True):
+        """Bring the schema up to date (or check it) at startup"""
+
+    def describe(self):
+        return {"backend": self.name}
+
+
+class MySQLBackend(Backend):
+    name = "mysql"
+
+    def __init__(self, host, user, password, database, cursorclass='DictCursor'):
+        if MySQLdb is None:
+            raise RuntimeError("The mysql backend needs mysqlclient: pip install mysqlclient")
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.cursorclass = getattr(MySQLdb.cursors, cursorclass)
+        self.integrity_errors = (MySQLdb.IntegrityError,)
+        self.streaming_cursor = MySQLdb.cursors.SSDictCursor
+
+    def connect(self):
+        return MySQLdb.connect(
+            host=self.host,
+            user=self.user,
+            passwd=self.password,
+            db=self.database,
+            cursorclass=self.cursorclass,
+            autocommit=False
+        )
+
+    def prepare(self, pool, logger, check_indexes=True):
+        # The schema is managed by migrations.py; only warn about gaps
+        if not check_indexes:
+            return
+        try:
+            with pool.connection() as conn:
+                migrations.check_indexes(conn, logger)
+        except Exception as e:
+            logger.warning(f"Index check skipped: {str(e)}")
+
+    def describe(self):
+        return {"backend": self.name, "host": self.host, "database": self.database}
+
+
+class SQLiteBackend(Backend):
+    name = "sqlite"
+    integrity_errors = (sqlite_db.IntegrityError,)
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return sqlite_db.connect(self.path)
+
+    def prepare(self, pool, logger, check_indexes=True):
+        with pool.connection() as conn:
+            sqlite_db.create_schema(conn)
+
+    def describe(self):
+        return {"backend": self.name, "path": self.path, "sqlite_version": sqlite_db.sqlite_version}
+
+
+class MemoryBackend(SQLiteBackend):
+    """In-memory SQLite database.
+
+    All pooled connections open the same named in-memory database, which
+    lives as long as one of them is open; an extra connection is held so a
+    discarded pool connection cannot take the data with it. Shared-cache
+    databases lock whole tables, so the pool is kept to one connection.
+    """
+    name = "memory"
+    max_connections = 1
+    _names = itertools.count()
+
+    def __init__(self):
+        super().__init__(f"file:workout_dsl_{os.getpid()}_{next(self._names)}?mode=memory&cache=shared")
+        self._keepalive = None
+
+    def connect(self):
+        if self._keepalive is None:
+            self._keepalive = sqlite_db.connect(self.path, uri=True)
+        return sqlite_db.connect(self.path, uri=True)
+
+    def describe(self):
+        return {"backend": self.name, "sqlite_version": sqlite_db.sqlite_version}
+
+
+def from_config(config):
+    """Backend selected by ``config['DATABASE']``"""
+    database = config['DATABASE']
+    if database == 'mysql':
+        return MySQLBackend(
+            host=config['MYSQL_HOST'],
+            user=config['MYSQL_USER'],
+            password=config['MYSQL_PASSWORD'],
+            database=config['MYSQL_DB'],
+            cursorclass=config['MYSQL_CURSORCLASS']
+        )
+    if database.startswith('sqlite:'):
+        return SQLiteBackend(database[len('sqlite:'):])
+    if database == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown DATABASE {database!r}; expected mysql, sqlite:<path> or memory")
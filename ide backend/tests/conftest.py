@@ -0,0 +1,44 @@
+"""Test setup: the backend runs on the in-memory database.
+
+main.py reads its configuration at import, so the environment is set
+before any test module imports it.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ['WORKOUT_DSL_DATABASE'] = 'memory'
+os.environ['WORKOUT_DSL_CHECK_INDEXES'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TABLES = ("record_values", "records", "attributes", "record_types", "actions", "conditions", "rules",
+          "valid_exercises", "valid_goals", "valid_muscles", "valid_levels")
+
+
+@pytest.fixture
+def main():
+    """The main module with empty tables and caches and the default vocabularies"""
+    import main
+
+    # Snapshots are rebuilt by the tests, not by a background thread
+    main.snapshot_builder.interval = 0
+    with main.db_pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            for table in TABLES:
+                cur.execute(f"DELETE FROM {table}")
+        finally:
+            cur.close()
+    main.domain_cache.invalidate()
+    main.schema_catalog.invalidate()
+    main.record_projection.invalidate()
+    main.result_cache.clear()
+    main.snapshot_builder.rebuild()
+    main.app.test_client().post('/init-db')
+    return main
+
+
+@pytest.fixture
+def client(main):
+    return main.app.test_client()
@@ -0,0 +1,38 @@
+"""Stored-form rules and normalized profiles for the tests"""
+from rule_engine import normalize_profile
+
+VALUES = {
+    "goal": ["Strength", "Fat Loss", "Endurance"],
+    "fitness_level": ["Beginner", "Advanced"],
+    "muscle_group": ["Chest", "Back", "Legs"],
+}
+
+
+def rule_data(rule_id, conditions, exercise="Squats", name=None):
+    return {
+        "id": rule_id,
+        "name": name or f"Rule {rule_id}",
+        "conditions": [{"variable": v, "operator": op, "value": value} for v, op, value in conditions],
+        "actions": [{"action_type": "include_exercise", "exercise_name": exercise}]
+    }
+
+
+def random_rule(rng, rule_id, max_conditions=3):
+    conditions = []
+    for _ in range(rng.randint(0, max_conditions)):
+        variable = rng.choice(["age", "duration", "goal", "fitness_level", "muscle_group"])
+        if variable in ("age", "duration"):
+            conditions.append((variable, rng.choice(["==", "!=", "<", "<=", ">", ">="]), str(rng.randint(0, 6))))
+        else:
+            conditions.append((variable, rng.choice(["==", "!=", "<"]), rng.choice(VALUES[variable])))
+    return rule_data(rule_id, conditions, exercise=rng.choice(["Squats", "Deadlifts"]))
+
+
+def random_profile(rng):
+    return normalize_profile({
+        "age": rng.choice([None, *range(-1, 8)]),
+        "duration": rng.choice([None, *range(-1, 8)]),
+        "goal": rng.choice([None, "Other", *VALUES["goal"]]),
+        "fitness_level": rng.choice([None, *VALUES["fitness_level"]]),
+        "muscle_group": rng.sample(VALUES["muscle_group"] + ["Core"], rng.randint(0, 3)),
+    })
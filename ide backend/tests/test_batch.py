@@ -0,0 +1,74 @@
+import json
+
+from batch import evaluate_line, iter_results
+from factories import rule_data
+from rule_engine import RuleEngine
+
+PROGRAM = 'workout_day Monday muscle_group Chest goal Strength duration 30m generate_routine'
+
+
+def engine_with(*rules):
+    engine = RuleEngine()
+    engine.load(rules)
+    return engine
+
+
+def post_batch(client, lines, workers=1):
+    body = "".join((line if isinstance(line, str) else json.dumps(line)) + "\n" for line in lines)
+    response = client.post(f'/evaluate-batch?workers={workers}', data=body)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def test_results_keep_input_order_and_ids():
+    engine = engine_with(rule_data(1, [("goal", "==", "Strength")]))
+    lines = [json.dumps({"id": n, "goal": "Strength" if n % 2 else "Endurance"}) for n in range(10)]
+    results = [json.loads(r) for r in iter_results(lines, engine, workers=1, chunk_size=3)]
+    assert [r["id"] for r in results] == list(range(10))
+    assert [r["matched_rules"] for r in results[:2]] == [[], ["Rule 1"]]
+
+
+def test_programs_get_routines():
+    engine = engine_with(rule_data(1, [("goal", "==", "Strength")]))
+    result = evaluate_line(engine, 1, json.dumps({"program": PROGRAM, "mode": "exact"}))
+    assert result["status"] == "success"
+    assert [e["exercise"] for e in result["routines"][0]["exercises"]] == ["Squats"]
+
+
+def test_bad_lines_are_reported_one_by_one():
+    engine = engine_with(rule_data(1, [("goal", "==", "Strength")]))
+    lines = ["not json", "[1]", {"program": 5}, {"profile": 3}, {"goal": ["Strength"]},
+             {"program": PROGRAM, "mode": "bogus"}, {"program": "workout_day"}, {"goal": "Strength"}]
+    results = [evaluate_line(engine, n, line if isinstance(line, str) else json.dumps(line))
+               for n, line in enumerate(lines, start=1)]
+    assert [r["status"] for r in results] == ["invalid"] * 7 + ["success"]
+    assert all(r["message"] for r in results[:7])
+
+
+def test_bad_lines_do_not_end_the_stream(client):
+    client.post('/add-rule', json={'rule': 'rule Rule 1 if goal == "Strength" then include_exercise "Squats"'})
+    results = post_batch(client, [{"program": 5}, {"profile": 3}, {"goal": "Strength"}])
+    assert [r["status"] for r in results] == ["invalid", "invalid", "success"]
+    assert results[2]["matched_rules"] == ["Rule 1"]
+
+
+def test_workers_must_be_a_number(client):
+    assert client.post('/evaluate-batch?workers=x', data='{}\n').status_code == 400
+
+
+def test_workers_agree_on_record_rules(main, client, monkeypatch):
+    monkeypatch.setitem(main.app.config, 'BATCH_MAX_WORKERS', 2)
+    client.post('/update-datamodel', json={'actions': [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$0', 'name': 'difficulty', 'type': 'number'}},
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': 5}}},
+    ]})
+    for text in ('rule Rule 1 if Exercise.difficulty >= 4 and goal == "Strength" then include_exercise "Deadlifts"',
+                 'rule Rule 2 if Exercise.difficulty >= 9 then include_exercise "Squats"',
+                 'rule Rule 3 if age > 30 then include_exercise "Squats"'):
+        assert client.post('/add-rule', json={'rule': text}).status_code == 200
+    profiles = [{"goal": "Strength", "age": 40}, {"goal": "Endurance", "age": 20}] * 5
+
+    one = post_batch(client, profiles, workers=1)
+    assert post_batch(client, profiles, workers=2) == one
+    assert [r["matched_rules"] for r in one[:2]] == [["Rule 1", "Rule 3"], []]
@@ -0,0 +1,55 @@
+from caches import ProfileClassCache
+from factories import rule_data
+from rule_engine import ProfileClassifier, RuleEngine, normalize_profile
+
+
+def cached_matches(cache, engine, profile):
+    return cache.get(profile, "evaluate", lambda: [rule.id for rule in engine.matching_rules(profile)])
+
+
+def test_profiles_in_one_class_share_an_entry():
+    engine = RuleEngine()
+    engine.load([rule_data(1, [("age", ">", "30")])])
+    cache = ProfileClassCache(engine)
+    assert cached_matches(cache, engine, normalize_profile({"age": 40})) == [1]
+    assert cached_matches(cache, engine, normalize_profile({"age": 50})) == [1]
+    assert cache.stats()["hits"] == 1
+
+
+def test_adding_a_rule_drops_only_entries_it_affects():
+    engine = RuleEngine()
+    engine.load([rule_data(1, [("age", ">", "30")])])
+    cache = ProfileClassCache(engine)
+    old, young = normalize_profile({"age": 40}), normalize_profile({"age": 10})
+    cached_matches(cache, engine, old)
+    cached_matches(cache, engine, young)
+
+    engine.add_many([rule_data(2, [("goal", "==", "Strength"), ("age", ">", "35")])])
+    assert cache.stats()["invalidated"] == 1    # the new threshold splits the old profile's class
+    assert cached_matches(cache, engine, young) == []
+    assert cache.stats()["hits"] == 1
+
+    engine.add_many([rule_data(3, [("age", "<", "20")])])
+    assert cached_matches(cache, engine, young) == [3]
+
+
+def test_replacing_a_rule_invalidates_its_matches():
+    engine = RuleEngine()
+    engine.load([rule_data(1, [("goal", "==", "Strength")])])
+    cache = ProfileClassCache(engine)
+    profile = normalize_profile({"goal": "Strength"})
+    assert cached_matches(cache, engine, profile) == [1]
+    engine.add_many([rule_data(1, [("goal", "==", "Endurance")])])
+    assert cached_matches(cache, engine, profile) == []
+
+
+def test_extended_classifier_keys_like_a_fresh_one():
+    rules = [rule_data(1, [("age", ">", "30")]), rule_data(2, [("duration", "<=", "45"), ("goal", "==", "Strength")])]
+    engine = RuleEngine()
+    engine.load(rules)
+    first, second = engine.rules[1], engine.rules[2]
+    extended = ProfileClassifier([first]).extended([second])
+    fresh = ProfileClassifier([first, second])
+    for data in ({"age": 31}, {"age": 30, "duration": 45}, {"goal": "Strength", "duration": 50}, {}):
+        profile = normalize_profile(data)
+        assert extended.key(profile) == fresh.key(profile)
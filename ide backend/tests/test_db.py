@@ -0,0 +1,80 @@
+import pytest
+
+from db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = self.rollbacks = 0
+        self.closed = False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_connections_are_reused_and_counted():
+    pool = ConnectionPool(FakeConnection, size=2, timeout=0.01)
+    first = pool.acquire()
+    assert pool.stats()["in_use"] == 1
+    pool.release(first)
+    assert pool.acquire() is first
+    stats = pool.stats()
+    assert (stats["created"], stats["in_use"], stats["checkouts"]) == (1, 1, 2)
+
+
+def test_a_full_pool_times_out():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.01)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_connection_commits_or_rolls_back_and_releases():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.01)
+    with pool.connection() as conn:
+        pass
+    assert conn.commits == 1
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError("boom")
+    assert (conn.commits, conn.rollbacks) == (1, 1)
+    assert pool.stats()["in_use"] == 0
+
+
+def test_a_generator_closed_early_releases_its_connection():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.01)
+
+    def rows():
+        with pool.connection():
+            yield 1
+            yield 2
+
+    stream = rows()
+    next(stream)
+    stream.close()
+    assert pool.stats()["in_use"] == 0
+    assert pool.acquire().rollbacks == 1
+
+
+def test_closing_a_streamed_datamodel_early_releases_the_connection(main, client):
+    client.post('/update-datamodel', json={'actions': [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$0', 'name': 'difficulty', 'type': 'number'}},
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': 5}}},
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': 7}}},
+    ]})
+    response = client.get('/get-datamodel?format=ndjson', buffered=False)
+    lines = response.iter_encoded()
+    while b'"kind": "record"' not in next(lines):
+        pass
+    response.close()
+
+    assert main.db_pool.stats()["in_use"] == 0
+    assert client.get('/get-rules').status_code == 200
@@ -0,0 +1,92 @@
+import pytest
+
+from documents import EditError, SessionStore, VersionConflict, apply_edits, split_definitions
+
+GOOD = 'rule Rule 1 if goal == "Strength" then include_exercise "Squats"\n'
+BROKEN = 'rule Rule 2 if goal == then include_exercise "Squats"\n'
+
+
+def counting_check():
+    checked = []
+
+    def check(chunk):
+        checked.append(chunk)
+        return [{"line": 1, "column": 3, "message": "bad"}] if "bad" in chunk else []
+    return check, checked
+
+
+def test_split_definitions_keeps_offsets_and_stray_text():
+    text = 'junk\nrule A\nworkout_day B "rule inside a string"\n'
+    assert split_definitions(text) == [(0, 'junk\n'), (5, 'rule A\n'), (12, 'workout_day B "rule inside a string"\n')]
+    assert split_definitions('') == [(0, '')]
+
+
+def test_apply_edits_in_order():
+    assert apply_edits("hello world", [{"start": 0, "end": 5, "text": "goodbye"}, {"start": 0, "end": 0, "text": ">"}]) \
+        == ">goodbye world"
+    assert apply_edits("old", [{"text": "new"}]) == "new"
+    with pytest.raises(EditError):
+        apply_edits("abc", [{"start": 2, "end": 9, "text": ""}])
+    with pytest.raises(EditError):
+        apply_edits("abc", [{"text": 5}])
+
+
+def test_only_changed_definitions_are_checked_again():
+    check, checked = counting_check()
+    store = SessionStore(check)
+    session, result = store.create("rule A\nrule bad\n")
+    assert (result["definitions"], result["errors"]) == (2, 1)
+
+    checked.clear()
+    result = store.edit(session, [{"start": 5, "end": 6, "text": "C"}], version=0)
+    assert checked == ["rule C\n"]
+    assert result["reused"] == 1
+    # Diagnostics are reported at their place in the document
+    assert store.all_diagnostics(session)[1]["diagnostics"][0]["line"] == 2
+
+
+def test_stale_versions_conflict():
+    store = SessionStore(counting_check()[0])
+    session, _ = store.create("rule A\n")
+    store.edit(session, [{"text": "rule B\n"}], version=0)
+    with pytest.raises(VersionConflict):
+        store.edit(session, [{"text": "rule C\n"}], version=0)
+
+
+def test_a_new_generation_checks_everything_again():
+    check, checked = counting_check()
+    generation = [1]
+    store = SessionStore(check, generation=lambda: generation[0])
+    session, _ = store.create("rule A\nrule B\n")
+    generation[0] = 2
+    checked.clear()
+    store.edit(session, [])
+    assert len(checked) == 2
+
+
+def test_least_recently_used_sessions_are_evicted():
+    store = SessionStore(counting_check()[0], max_sessions=2)
+    first, _ = store.create("rule A\n")
+    store.create("rule B\n")
+    store.create("rule C\n")
+    store.create("rule D\n")
+    assert store.get(first.id) is None
+
+
+def test_document_session_endpoints(client):
+    created = client.post('/document-sessions', json={'text': GOOD + BROKEN})
+    assert created.status_code == 201
+    session = created.get_json()
+    assert session["errors"] == 1
+    assert session["changed"][1]["diagnostics"][0]["line"] == 2
+    url = f"/document-sessions/{session['session_id']}"
+
+    fixed = client.post(url + '/edits', json={'version': 0, 'edits': [{'text': GOOD}]}).get_json()
+    assert (fixed["version"], fixed["errors"]) == (1, 0)
+    assert client.post(url + '/edits', json={'version': 0, 'edits': []}).status_code == 409
+    assert client.post(url + '/edits', json={'edits': [{'start': 0, 'end': 999}]}).status_code == 400
+
+    definitions = client.get(url).get_json()["definitions"]
+    assert [d["diagnostics"] for d in definitions] == [[]]
+    assert client.delete(url).status_code == 200
+    assert client.get(url).status_code == 404
@@ -0,0 +1,15 @@
+import pytest
+
+
+def test_evaluate_matches_stored_rules(client):
+    response = client.post('/add-rule', json={'rule': 'rule Rule 1 if goal == "Strength" then include_exercise "Squats"'})
+    assert response.status_code == 200
+    response = client.post('/evaluate', json={"profile": {"goal": "Strength"}})
+    assert response.get_json()["matched_rules"] == ["Rule 1"]
+
+
+@pytest.mark.parametrize("body", [{"profile": "x"}, {"goal": ["a"]}, {"muscle_group": [{"a": 1}]}, ["goal"]])
+def test_evaluate_rejects_malformed_profiles(client, body):
+    response = client.post('/evaluate', json=body)
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "invalid"
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+
+def add_records(client):
+    response = client.post('/update-datamodel', json={'actions': [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$0', 'name': 'difficulty', 'type': 'number'}},
+        {'action': 'add_record_type', 'payload': {'name': 'Equipment'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$2', 'name': 'kind', 'type': 'string'}},
+    ] + [
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': d}}} for d in (3, 5, 5, 8)
+    ] + [
+        {'action': 'add_record', 'payload': {'type_id': '$2', 'values': {'kind': 'barbell'}}}
+    ]})
+    assert response.status_code == 200
+
+
+def records(client, **params):
+    response = client.get('/get-datamodel', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_records_are_filtered_by_type_and_attribute(client):
+    add_records(client)
+    exercises = records(client, record_type='Exercise')
+    assert list(exercises['record_types']) == ["Exercise"]
+    assert {r['type_name'] for r in exercises['records']} == {"Exercise"}
+    assert len(exercises['records']) == 4
+
+    fives = records(client, **{'record_type': 'Exercise', 'attr.difficulty': '5'})
+    assert [r['values']['difficulty'] for r in fives['records']] == ["5", "5"]
+    assert records(client, **{'attr.kind': 'barbell'})['records'][0]['type_name'] == "Equipment"
+
+
+def test_pages_follow_the_cursor(client):
+    add_records(client)
+    everything = records(client)['records']
+    paged, cursor = [], None
+    while True:
+        page = records(client, limit=2, **({'cursor': cursor} if cursor else {}))
+        paged += page['records']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert paged == everything and len(paged) == 5
+
+
+@pytest.mark.parametrize("params", [{'limit': 0}, {'limit': 10 ** 9}, {'cursor': '!!'}])
+def test_bad_paging_is_rejected(client, params):
+    response = client.get('/get-datamodel', query_string=params)
+    assert response.status_code == 400
+
+
+def test_ndjson_streams_one_object_per_line(main, client):
+    add_records(client)
+    response = client.get('/get-datamodel', query_string={'format': 'ndjson', 'record_type': 'Exercise', 'limit': 3})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line['kind'] for line in lines] == ["domain_values", "record_type", "record", "record", "record", "end"]
+    assert "Strength" in lines[0]['goal_types']
+    assert lines[1]['name'] == "Exercise"
+    assert lines[-1]['records'] == 3 and lines[-1]['next_cursor']
+    assert main.db_pool.stats()['in_use'] == 0
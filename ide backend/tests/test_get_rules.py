@@ -0,0 +1,47 @@
+import pytest
+
+
+def add_rules(client, count):
+    program = "".join(
+        f'rule Rule {n} if goal == "Strength" and age > {n + 20} then include_exercise "Squats"\n'
+        for n in range(1, count + 1))
+    assert client.post('/import-rules', json={'program': program}).status_code == 200
+
+
+def test_pages_cover_every_rule_once_in_name_order(client):
+    add_rules(client, 7)
+    everything = client.get('/get-rules').get_json()
+    assert everything["total"] == 7 and everything["next_cursor"] is None
+
+    paged, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get('/get-rules', query_string=params).get_json()
+        assert page["total"] == 7 and len(page["rules"]) <= 3
+        paged += page["rules"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert paged == everything["rules"]
+    assert [r["name"] for r in paged] == sorted(r["name"] for r in paged)
+
+
+def test_rules_come_with_their_conditions_and_actions(client):
+    add_rules(client, 1)
+    rule = client.get('/get-rules').get_json()["rules"][0]
+    assert [c["variable"] for c in rule["conditions"]] == ["goal", "age"]
+    assert rule["actions"][0]["exercise_name"] == "Squats"
+
+
+def test_a_page_after_a_new_rule_still_lists_each_rule_once(client):
+    add_rules(client, 4)
+    first = client.get('/get-rules', query_string={"limit": 2}).get_json()
+    client.post('/add-rule', json={'rule': 'rule Rule 9 if goal == "Strength" then include_exercise "Squats"'})
+    rest = client.get('/get-rules', query_string={"limit": 10, "cursor": first["next_cursor"]}).get_json()
+    ids = [r["id"] for r in first["rules"] + rest["rules"]]
+    assert len(ids) == len(set(ids)) == 5
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 100000}, {"cursor": "not-a-cursor"}])
+def test_bad_paging_parameters(client, params):
+    assert client.get('/get-rules', query_string=params).status_code == 400
@@ -0,0 +1,40 @@
+def rule_text(n, exercise="Squats"):
+    return f'rule Rule {n} if goal == "Strength" and age > {n + 20} then include_exercise "{exercise}"\n'
+
+
+def test_import_rules_skips_workout_definitions(client):
+    program = rule_text(1) + 'workout_day Monday muscle_group Chest goal Strength duration 30m generate_routine\n'
+    response = client.post('/import-rules', json={'program': program, 'atomic': True})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert (data['accepted'], data['rejected'], data['skipped']) == (1, 0, 1)
+    assert [result['status'] for result in data['results']] == ["accepted", "skipped"]
+
+
+def test_import_rules_atomic_rejects_on_an_invalid_rule(client):
+    program = rule_text(1) + rule_text(2, exercise="Unknown Exercise")
+    response = client.post('/import-rules', json={'program': program, 'atomic': True})
+    assert response.status_code == 400
+    assert response.get_json()['rejected'] == 1
+    assert client.get('/get-rules').get_json()['total'] == 0
+
+
+def test_import_rules_keeps_the_valid_rules_and_locates_syntax_errors(client):
+    program = rule_text(1) + 'rule Rule 2 if goal == then include_exercise "Squats"\n' + rule_text(3)
+    data = client.post('/import-rules', data=program).get_json()
+    assert (data['accepted'], data['rejected']) == (2, 1)
+    assert data['results'][1]['location']['line'] == 2
+    assert [rule['name'] for rule in client.get('/get-rules').get_json()['rules']] == ["Rule 1", "Rule 3"]
+
+
+def test_import_rules_inserts_in_batches(main, client, monkeypatch):
+    monkeypatch.setattr(main, 'IMPORT_BATCH_SIZE', 2)
+    program = "".join(rule_text(n) for n in range(1, 6))
+    data = client.post('/import-rules', json={'program': program}).get_json()
+    assert data['accepted'] == 5
+    assert len({result['id'] for result in data['results']}) == 5
+
+    rules = client.get('/get-rules').get_json()['rules']
+    assert [len(rule['conditions']) for rule in rules] == [2] * 5
+    response = client.post('/evaluate', json={"goal": "Strength", "age": 23})
+    assert response.get_json()["matched_rules"] == ["Rule 1", "Rule 2"]
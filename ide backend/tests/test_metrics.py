@@ -0,0 +1,50 @@
+from metrics import Histogram
+
+
+def scrape(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    return response.data.decode().splitlines()
+
+
+def test_histograms_are_cumulative():
+    histogram = Histogram("demo_seconds", "Demo", (0.1, 1.0), ("endpoint",))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "x")
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{endpoint="x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{endpoint="x",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{endpoint="x",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{endpoint="x"} 3' in lines
+
+
+def test_requests_and_their_queries_are_recorded(client):
+    client.get('/get-rules')
+    lines = scrape(client)
+    assert any(line.startswith('workout_http_request_duration_seconds_count{endpoint="get_rules",method="GET",'
+                               'status="200"}') for line in lines)
+    assert any(line.startswith('workout_db_queries_per_request_count{endpoint="get_rules"}') for line in lines)
+
+
+def test_slow_requests_are_counted_and_logged(main, client, monkeypatch, caplog):
+    monkeypatch.setattr(main.app_metrics, 'slow_request_seconds', 0)
+    before = main.app_metrics.slow_requests
+    client.get('/get-rules')
+    assert main.app_metrics.slow_requests == before + 1
+    assert any("Slow request GET /get-rules" in record.getMessage() for record in caplog.records)
+    assert f"workout_slow_requests_total {before + 1}" in scrape(client)
+
+
+def test_unsampled_requests_are_not_recorded(main, client, monkeypatch):
+    monkeypatch.setattr(main.app_metrics, 'sample_rate', 0)
+    client.get('/rules-version')
+    assert not any('endpoint="rules_version"' in line for line in scrape(client))
+
+
+def test_cache_and_pool_statistics_are_collected(main, client):
+    lines = scrape(client)
+    for cache in ("parse", "domain", "results"):
+        assert any(line.startswith(f'workout_cache_hits_total{{cache="{cache}"}}') for line in lines)
+    assert any(line.startswith('workout_cache_entries{cache="parse"}') for line in lines)
+    assert f'workout_db_pool_connections{{state="in_use"}} {main.db_pool.stats()["in_use"]}' in lines
+    assert 'workout_db_pool_timeouts_total 0' in lines
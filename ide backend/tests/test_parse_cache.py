@@ -0,0 +1,68 @@
+import pytest
+from textx import TextXSyntaxError
+
+from caches import ParseCache
+
+BROKEN = 'rule Rule 1 if goal == then include_exercise "Squats"'
+
+
+def counting_parser():
+    calls = []
+
+    def parse(text):
+        calls.append(text)
+        if "broken" in text:
+            raise TextXSyntaxError("broken text", line=text.count("\n", 0, text.index("broken")) + 1, col=1)
+        return {"text": text}
+    return parse, calls
+
+
+def test_same_text_is_parsed_once():
+    parse, calls = counting_parser()
+    cache = ParseCache(parse)
+    assert cache.parse("a") is cache.parse("a")
+    assert calls == ["a"]
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_syntax_errors_are_cached_and_raised_again():
+    parse, calls = counting_parser()
+    cache = ParseCache(parse)
+    for _ in range(2):
+        with pytest.raises(TextXSyntaxError) as raised:
+            cache.parse("broken")
+        assert (raised.value.message, raised.value.line) == ("broken text", 1)
+    assert len(calls) == 1
+
+
+def test_errors_keep_the_position_of_their_own_text():
+    parse, _ = counting_parser()
+    cache = ParseCache(parse)
+    for text, line in (("broken", 1), ("\n\n\nbroken", 4), ("broken", 1)):
+        with pytest.raises(TextXSyntaxError) as raised:
+            cache.parse(text)
+        assert raised.value.line == line
+
+
+def test_least_recently_used_entries_are_evicted():
+    parse, calls = counting_parser()
+    cache = ParseCache(parse, maxsize=2)
+    for text in ("a", "b", "a", "c", "a", "b"):
+        cache.parse(text)
+    assert calls == ["a", "b", "c", "b"]
+
+
+def test_diagnostics_point_at_the_line_of_the_error(main):
+    first = main.check_definition_text(BROKEN)
+    indented = main.check_definition_text("\n\n\n    " + BROKEN)
+    assert first[0]["line"] == 1
+    assert indented[0]["line"] == 4
+    assert indented[0]["column"] == first[0]["column"] + 4
+
+
+def test_validate_rule_reuses_parses(client, main):
+    rule = 'rule Rule 1 if goal == "Strength" then include_exercise "Squats"'
+    hits = main.parse_cache.hits
+    for _ in range(2):
+        assert client.post('/validate-rule', json={'rule': rule}).status_code == 200
+    assert main.parse_cache.hits > hits
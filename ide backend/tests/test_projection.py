@@ -0,0 +1,79 @@
+import pickle
+
+from factories import rule_data
+from projection import RecordProjection, coerce
+from rule_engine import RuleEngine, normalize_profile
+
+
+class FakeSchema:
+    version = 1
+
+    def snapshot(self):
+        return {1: "Exercise"}, {10: (1, "difficulty", "number"), 11: (1, "name", "string")}
+
+
+class FakeRows:
+    def __init__(self):
+        self.values = {1: {10: "3", 11: "Squats"}, 2: {10: "8", 11: "Deadlifts"}}
+        self.loads = []
+
+    def __call__(self, record_ids=None):
+        self.loads.append(record_ids)
+        return [
+            {"record_id": record_id, "type_id": 1, "attribute_id": attr_id, "value": value}
+            for record_id, values in self.values.items() if record_ids is None or record_id in record_ids
+            for attr_id, value in values.items()
+        ]
+
+
+def test_coerce():
+    assert (coerce("5", "number"), coerce("2.5", "number"), coerce("x", "number")) == (5, 2.5, None)
+    assert (coerce("Yes", "boolean"), coerce("0", "boolean"), coerce("maybe", "boolean")) == (True, False, None)
+    assert coerce(7, "string") == "7"
+
+
+def test_records_are_typed_and_filtered():
+    projection = RecordProjection(FakeSchema(), FakeRows())
+    assert projection.records("Exercise", [("difficulty", ">", "5")]) == [
+        {"id": 2, "values": {"difficulty": 8, "name": "Deadlifts"}}]
+    assert projection.exists("Exercise", [("difficulty", "<=", "3"), ("name", "==", "Squats")])
+    assert not projection.exists("Exercise", [("difficulty", ">", "x")])
+    assert projection.records("Unknown") is None
+
+
+def test_dirty_records_are_reread_alone():
+    rows = FakeRows()
+    projection = RecordProjection(FakeSchema(), rows)
+    version = projection.version
+    rows.values[2][10] = "1"
+    projection.mark_dirty([2])
+    assert [r["id"] for r in projection.records("Exercise", [("difficulty", "<", "5")])] == [1, 2]
+    assert rows.loads == [None, [2]]
+    assert projection.version == version + 1
+
+
+def test_snapshots_pickle_and_do_not_follow_later_changes():
+    rows = FakeRows()
+    projection = RecordProjection(FakeSchema(), rows)
+    snapshot = pickle.loads(pickle.dumps(projection.snapshot()))
+    rows.values[2][10] = "1"
+    projection.mark_dirty([2])
+    assert not projection.exists("Exercise", [("difficulty", ">", "5")])
+    assert snapshot.exists("Exercise", [("difficulty", ">", "5")])
+
+    engine = RuleEngine(records=snapshot)
+    engine.load([rule_data(1, [("Exercise.difficulty", ">=", "8")])])
+    assert [rule.name for rule in engine.matching_rules(normalize_profile({}))] == ["Rule 1"]
+
+
+def test_typed_records_endpoint(client):
+    client.post('/update-datamodel', json={'actions': [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$0', 'name': 'difficulty', 'type': 'number'}},
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': 5}}},
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': 7}}},
+    ]})
+    data = client.get('/records/Exercise', query_string={'attr.difficulty': '7'}).get_json()
+    assert data['columns'] == [{"name": "difficulty", "type": "number"}]
+    assert [record['values'] for record in data['records']] == [{"difficulty": 7}]
+    assert client.get('/records/Unknown').status_code == 404
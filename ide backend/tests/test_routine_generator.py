@@ -0,0 +1,76 @@
+import itertools
+import random
+
+import pytest
+
+from routine_generator import SLOT_SECONDS, build_routine, candidate_exercises, pack, pack_exact, pack_greedy
+
+PROGRAM = 'workout_day Monday muscle_group Chest goal Strength duration 30m generate_routine'
+
+
+def item(name, seconds, value):
+    return {"exercise": name, "seconds": seconds, "value": value}
+
+
+def best_value(items, capacity):
+    slots = capacity // SLOT_SECONDS
+    best = 0
+    for n in range(len(items) + 1):
+        for combo in itertools.combinations(items, n):
+            if sum(-(-i['seconds'] // SLOT_SECONDS) for i in combo) <= slots:
+                best = max(best, sum(i['value'] for i in combo))
+    return best
+
+
+def test_exact_packing_is_optimal():
+    rng = random.Random(7)
+    for _ in range(200):
+        items = [item(f"E{n}", rng.randint(30, 900), rng.randint(1, 5)) for n in range(rng.randint(1, 8))]
+        capacity = rng.randint(0, 40) * 60
+        chosen = pack_exact(items, capacity)
+        assert sum(i['value'] for i in chosen) == best_value(items, capacity)
+        assert sum(i['seconds'] for i in chosen) <= capacity
+
+
+def test_greedy_packing_fits_and_falls_back_to_the_best_single_item():
+    items = [item("A", 100, 1), item("B", 100, 1), item("C", 600, 5)]
+    assert [i['exercise'] for i in pack_greedy(items, 600)] == ["C"]
+    assert sum(i['seconds'] for i in pack_greedy(items, 250)) <= 250
+
+
+def test_exact_packing_gives_up_after_the_deadline():
+    items = [item(f"E{n}", 60, 1) for n in range(50)]
+    assert pack_exact(items, 3600, deadline=0) is None
+    assert pack(items, 60, "exact", time_limit_ms=0)[1] == "exact"
+
+
+def test_repeated_exercises_score_higher():
+    actions = [
+        {"type": "include_exercise", "exercise": "Squats", "rule": "Rule 1"},
+        {"type": "include_exercise", "exercise": "Squats", "rule": "Rule 2"},
+        {"type": "sets_reps", "sets_count": 4, "reps_count": 5, "rule": "Rule 3"},
+    ]
+    items = candidate_exercises(actions)
+    assert [(i['exercise'], i['value'], i['rules']) for i in items] == [("Squats", 2, ["Rule 1", "Rule 2"])]
+    routine = build_routine(actions, 30)
+    assert routine["exercises"][0]["sets"] == 4
+    assert routine["total_seconds"] + routine["unused_seconds"] == 30 * 60
+
+
+def test_generate_routine_packs_the_fired_exercises(client):
+    client.post('/add-rule', json={'rule': 'rule Rule 1 if goal == "Strength" then include_exercise "Squats"'})
+    response = client.post('/generate-routine', json={'program': PROGRAM})
+    routine = response.get_json()["routines"][0]
+    assert routine["day"] == "Monday"
+    assert [e["exercise"] for e in routine["exercises"]] == ["Squats"]
+
+
+@pytest.mark.parametrize("time_limit_ms", ["abc", -1, True, None])
+def test_generate_routine_rejects_bad_time_limits(client, time_limit_ms):
+    response = client.post('/generate-routine', json={'program': PROGRAM, 'time_limit_ms': time_limit_ms})
+    assert response.status_code == 400
+
+
+def test_generate_routine_rejects_unknown_modes(client):
+    response = client.post('/generate-routine', json={'program': PROGRAM, 'mode': 'bogus'})
+    assert response.status_code == 400
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from factories import random_profile, random_rule, rule_data
+from rule_analysis import Pruner, analyze
+from rule_engine import CompiledRule, RuleEngine, normalize_profile
+from routine_generator import candidate_exercises
+
+
+def test_dead_rules_are_pruned_and_cached():
+    engine = RuleEngine(prune=Pruner("dead"))
+    engine.load([
+        rule_data(1, [("age", ">", "30"), ("age", "<", "20")]),
+        rule_data(2, [("age", ">=", "18")]),
+        rule_data(3, [])
+    ])
+    assert engine.snapshot.pruned == {1, 3}
+    assert engine.rules[1].dead and engine.rules[2].dead == ''
+    engine.add_many([rule_data(1, [("age", ">", "30")])])
+    assert engine.snapshot.pruned == {3}
+
+
+def test_no_pruning_keeps_dead_rules():
+    engine = RuleEngine(prune=Pruner("none"))
+    engine.load([rule_data(1, [("age", ">", "30"), ("age", "<", "20")])])
+    assert engine.snapshot.pruned == frozenset()
+
+
+def test_unknown_pruning_mode():
+    with pytest.raises(ValueError):
+        Pruner("everything")
+
+
+def test_redundant_rules_are_pruned_in_the_background_only():
+    rules = [
+        rule_data(1, [("goal", "==", "Strength")]),
+        rule_data(2, [("goal", "==", "Strength")]),
+        rule_data(3, [("goal", "==", "Strength"), ("age", ">", "30")]),
+        rule_data(4, [("goal", "==", "Strength")], exercise="Bench Press"),
+    ]
+    engine = RuleEngine(prune=Pruner("redundant"))
+    engine.load(rules)
+    assert engine.snapshot.pruned == frozenset()
+    assert engine.refresh_redundant()
+    assert engine.snapshot.redundant == {2: 1, 3: 1}
+    assert not engine.refresh_redundant()
+
+    # Changing the rule that covers them brings them back
+    engine.add_many([rule_data(1, [("goal", "==", "Endurance")])])
+    assert engine.snapshot.pruned == frozenset()
+
+
+def test_redundant_pruning_lowers_exercise_scores():
+    rules = [rule_data(1, [("goal", "==", "Strength")]), rule_data(2, [("goal", "==", "Strength")])]
+    profile = normalize_profile({"goal": "Strength"})
+    scores = {}
+    for mode in ("dead", "redundant"):
+        engine = RuleEngine(prune=Pruner(mode))
+        engine.load(rules)
+        engine.refresh_redundant()
+        scores[mode] = {item['exercise']: item['value'] for item in candidate_exercises(engine.evaluate(profile))}
+    assert scores == {"dead": {"Squats": 2}, "redundant": {"Squats": 1}}
+
+
+def test_redundant_pruning_fires_the_same_exercises():
+    rng = random.Random(4)
+    rules = [random_rule(rng, i) for i in range(1, 300)]
+    full, pruned = RuleEngine(), RuleEngine(prune=Pruner("redundant"))
+    full.load(rules)
+    pruned.load(rules)
+    pruned.refresh_redundant()
+    assert pruned.snapshot.pruned
+    for _ in range(1000):
+        profile = random_profile(rng)
+        assert ({a['exercise'] for a in full.evaluate(profile)}
+                == {a['exercise'] for a in pruned.evaluate(profile)})
+
+
+def test_analyze_reports_each_kind():
+    rules = [CompiledRule(data) for data in (
+        rule_data(1, [("age", ">", "30"), ("age", "<", "20")]),
+        rule_data(2, [("age", ">=", "18")]),
+        rule_data(3, [("age", ">=", "18")], name="Rule 2"),
+        rule_data(4, [("age", ">=", "40")]),
+    )]
+    report = analyze(rules)
+    assert [entry['id'] for entry in report['dead']] == [1]
+    assert [(entry['id'], entry['duplicate_of']) for entry in report['duplicates']] == [(3, 2)]
+    assert [(entry['id'], entry['subsumed_by']) for entry in report['subsumed']] == [(4, 2)]
+    assert report['duplicate_names'] == [{"name": "Rule 2", "ids": [2, 3]}]
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from factories import random_profile, random_rule, rule_data
+from rule_engine import ProfileError, RuleEngine, normalize_profile
+from snapshots import SnapshotBuilder
+
+
+def brute_force(rules, profile):
+    return sorted(rule.id for rule in rules if rule.predicate(profile))
+
+
+def test_matching_rules_agree_with_brute_force():
+    rng = random.Random(1)
+    engine = RuleEngine()
+    engine.load(random_rule(rng, i) for i in range(1, 400))
+    rules = list(engine.rules.values())
+    for _ in range(2000):
+        profile = random_profile(rng)
+        assert [rule.id for rule in engine.matching_rules(profile)] == brute_force(rules, profile)
+
+
+def test_evaluate_returns_the_actions_in_rule_order():
+    engine = RuleEngine()
+    engine.load([
+        rule_data(2, [("goal", "==", "Strength")], exercise="Deadlifts"),
+        rule_data(1, [("age", ">=", "18"), ("duration", "<", "60")]),
+        rule_data(3, [("muscle_group", "==", "Chest")], exercise="Bench Press"),
+    ])
+    profile = normalize_profile({"goal": "Strength", "age": "30", "duration": "45m", "muscle_group": "Legs"})
+    assert [action["exercise"] for action in engine.evaluate(profile)] == ["Squats", "Deadlifts"]
+
+
+def test_normalize_profile_coerces_values():
+    profile = normalize_profile({"muscles": ["Chest", "Back"], "age": "30", "duration": "45m"})
+    assert profile["muscle_group"] == frozenset({"Chest", "Back"})
+    assert (profile["age"], profile["duration"]) == (30, 45)
+
+
+@pytest.mark.parametrize("data", ["x", ["goal"], {"goal": ["Strength"]}, {"fitness_level": {"a": 1}},
+                                  {"muscle_group": [["Chest"]]}, {"muscle_group": {"Chest": 1}}])
+def test_normalize_profile_rejects_malformed_profiles(data):
+    with pytest.raises(ProfileError):
+        normalize_profile(data)
+
+
+def test_listeners_hear_about_changed_rules_only():
+    engine = RuleEngine()
+    heard = []
+    engine.listeners.append(lambda replaced, added: heard.append((replaced, added)))
+    engine.load([rule_data(1, [("age", ">", "30")]), rule_data(2, [("age", "<", "20")])])
+    engine.load([rule_data(1, [("age", ">", "30")]), rule_data(2, [("age", "<", "25")])])
+    assert heard[0] == (None, None)
+    replaced, added = heard[1]
+    assert [rule.id for rule in replaced] == [2] and [rule.id for rule in added] == [2]
+
+
+def test_rebuild_keeps_rules_added_while_loading():
+    engine = RuleEngine()
+    engine.load([rule_data(1, [("age", ">", "1")])])
+
+    def load():
+        # Published after the rebuild started reading
+        engine.add_many([rule_data(2, [("age", ">", "1")])])
+        return [rule_data(1, [("age", ">", "1")])]
+
+    SnapshotBuilder(engine, load, lambda: 1, interval=0).rebuild()
+    assert sorted(engine.rules) == [1, 2]
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from factories import random_profile, random_rule, rule_data
+from rule_analysis import Pruner
+from rule_engine import CompiledRule, RuleEngine, RuleIndex, normalize_profile
+
+
+def index_of(*rules):
+    index = RuleIndex()
+    for data in rules:
+        index.add(CompiledRule(data))
+    return index
+
+
+def index_contents(index):
+    return (
+        {v: {k: sorted(ids) for k, ids in buckets.items() if ids}
+         for v, buckets in index.buckets.items() if any(buckets.values())},
+        {k: sorted(entries) for k, entries in index.ranges.items() if entries},
+        sorted(index.unindexed)
+    )
+
+
+def test_candidates_cover_every_match():
+    rng = random.Random(2)
+    rules = [CompiledRule(random_rule(rng, i)) for i in range(1, 300)]
+    index = RuleIndex()
+    for rule in rules:
+        index.add(rule)
+    for _ in range(1000):
+        profile = random_profile(rng)
+        matched = {rule.id for rule in rules if rule.predicate(profile)}
+        assert matched <= set(index.candidates(profile))
+
+
+def test_rules_are_filed_under_their_most_selective_condition():
+    index = index_of(
+        rule_data(1, [("age", ">", "30"), ("goal", "==", "Strength")]),
+        rule_data(2, [("age", ">", "30"), ("duration", "==", "45")]),
+        rule_data(3, [("age", "<=", "20")]),
+        rule_data(4, [("goal", "!=", "Strength")]),
+    )
+    assert index.buckets == {"goal": {"Strength": [1]}, "duration": {45: [2]}}
+    assert index.ranges == {("age", "<="): [(20, 3)]}
+    assert index.unindexed == [4]
+
+
+def test_range_lookups_pick_the_holding_thresholds():
+    index = index_of(
+        rule_data(1, [("age", ">", "30")]),
+        rule_data(2, [("age", ">=", "40")]),
+        rule_data(3, [("age", "<", "40")]),
+        rule_data(4, [("age", "<=", "30")]),
+    )
+    assert sorted(index.candidates(normalize_profile({"age": 40}))) == [1, 2]
+    assert sorted(index.candidates(normalize_profile({"age": 30}))) == [3, 4]
+    assert index.candidates(normalize_profile({})) == []
+
+
+def test_each_muscle_of_the_profile_is_looked_up():
+    index = index_of(
+        rule_data(1, [("muscle_group", "==", "Chest")]),
+        rule_data(2, [("muscle_group", "==", "Back")]),
+        rule_data(3, [("muscle_group", "==", "Legs")]),
+    )
+    assert sorted(index.candidates(normalize_profile({"muscle_group": ["Chest", "Back"]}))) == [1, 2]
+
+
+@pytest.mark.parametrize("mode", ["none", "dead", "redundant"])
+def test_derived_index_equals_fresh_build(mode):
+    rng = random.Random(3)
+    engine = RuleEngine(prune=Pruner(mode))
+    engine.load(random_rule(rng, i) for i in range(1, 200))
+    for _ in range(200):
+        step = rng.random()
+        if step < 0.6:
+            engine.add_many([random_rule(rng, rng.randint(1, 260)) for _ in range(rng.randint(1, 4))])
+        elif step < 0.8:
+            engine.load([rule.data for rule in engine.rules.values() if rng.random() > 0.02])
+        else:
+            engine.refresh_redundant()
+        snapshot = engine.snapshot
+        fresh = RuleIndex()
+        for rule in snapshot.rules.values():
+            if rule.id not in snapshot.pruned:
+                fresh.add(rule)
+        assert index_contents(snapshot.index) == index_contents(fresh)
+
+
+def test_derive_leaves_the_previous_index_alone():
+    engine = RuleEngine()
+    engine.load(rule_data(i, [("goal", "==", "Strength")]) for i in range(1, 10))
+    before = engine.snapshot.index
+    contents = index_contents(before)
+    engine.add_many([rule_data(10, [("goal", "==", "Strength")])])
+    assert index_contents(before) == contents
+    assert 10 in engine.index.buckets["goal"]["Strength"]
@@ -0,0 +1,44 @@
+import pytest
+
+import migrations
+import sqlite_db
+
+
+def sqlite_objects(conn, kind):
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT name FROM sqlite_master WHERE type = %s", (kind,))
+        return {row['name'] for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def test_every_migration_step_has_a_sqlite_form():
+    steps = [step for _, _, steps in migrations.MIGRATIONS for step in steps]
+    assert len(sqlite_db.SCHEMA) == len(steps)
+    for statement in sqlite_db.SCHEMA:
+        assert "AUTO_INCREMENT" not in statement and "ENGINE=" not in statement
+
+
+def test_sqlite_schema_has_the_migrated_tables_and_indexes():
+    conn = sqlite_db.connect(":memory:")
+    sqlite_db.create_schema(conn)
+    sqlite_db.create_schema(conn)    # safe to run again
+
+    steps = [step for _, _, steps in migrations.MIGRATIONS for step in steps]
+    tables = {step.split()[5] for step in steps if isinstance(step, str)}
+    indexes = {step.name for step in steps if isinstance(step, migrations.IndexStep)}
+    assert tables <= sqlite_objects(conn, 'table')
+    assert indexes <= sqlite_objects(conn, 'index')
+
+
+def test_unique_keys_are_enforced():
+    conn = sqlite_db.connect(":memory:")
+    sqlite_db.create_schema(conn)
+    cur = conn.cursor()
+    cur.execute("INSERT INTO valid_goals (name) VALUES (%s)", ("Strength",))
+    cur.execute("INSERT INTO record_types (name) VALUES (%s)", ("Exercise",))
+    with pytest.raises(sqlite_db.IntegrityError):
+        cur.execute("INSERT INTO valid_goals (name) VALUES (%s)", ("Strength",))
+    with pytest.raises(sqlite_db.IntegrityError):
+        cur.execute("INSERT INTO record_types (name) VALUES (%s)", ("Exercise",))
@@ -0,0 +1,68 @@
+import pytest
+
+
+def add_exercise_records(client, *difficulties):
+    actions = [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$0', 'name': 'difficulty', 'type': 'number'}},
+    ] + [{'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': d}}} for d in difficulties]
+    response = client.post('/update-datamodel', json={'actions': actions})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_a_batch_resolves_references_to_earlier_actions(client):
+    created = add_exercise_records(client, 5, 7)
+    type_id = created['results'][0]['type_id']
+    assert created['message'] == "4 actions applied"
+    assert [record['type_id'] for record in created['changes']['records']] == [type_id, type_id]
+    assert created['changes']['record_types']['Exercise']['attributes'][0]['name'] == "difficulty"
+
+
+def test_a_failing_action_rolls_back_the_whole_batch(client):
+    response = client.post('/update-datamodel', json={'actions': [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'no_such_action', 'payload': {'name': 'x'}},
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['failed_action'] == 1
+    assert client.get('/get-datamodel').get_json()['record_types'] == {}
+
+
+@pytest.mark.parametrize("body", [{'actions': []}, {'actions': 'x'}, {'action': 'add_record_type'}])
+def test_malformed_requests_are_rejected(client, body):
+    assert client.post('/update-datamodel', json=body).status_code == 400
+
+
+@pytest.mark.parametrize("action", ["update_record", "delete_record"])
+def test_record_actions_reject_bad_ids(client, action):
+    response = client.post('/update-datamodel', json={
+        'action': action, 'payload': {'record_id': 'x', 'values': {'difficulty': 1}}})
+    assert response.status_code == 400
+
+
+def test_record_actions_accept_string_ids(client):
+    created = add_exercise_records(client, 5)
+    record_id = str(created['changes']['records'][0]['id'])
+    response = client.post('/update-datamodel', json={
+        'action': 'update_record', 'payload': {'record_id': record_id, 'values': {'difficulty': 6}}})
+    assert response.status_code == 200
+    response = client.post('/update-datamodel', json={'action': 'delete_record', 'payload': {'record_id': record_id}})
+    assert response.get_json()['changes']['deleted_records'] == [int(record_id)]
+
+
+def test_duplicate_record_types_and_attributes(client):
+    created = add_exercise_records(client)
+    response = client.post('/update-datamodel', json={'action': 'add_record_type', 'payload': {'name': 'Exercise'}})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "Record type Exercise already exists"
+
+    type_id = created['results'][0]['type_id']
+    response = client.post('/update-datamodel', json={
+        'action': 'add_attribute', 'payload': {'type_id': type_id, 'name': 'difficulty', 'type': 'number'}})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "Attribute difficulty already exists"
+
+    response = client.post('/update-datamodel', json={
+        'action': 'add_attribute', 'payload': {'type_id': 999, 'name': 'difficulty', 'type': 'number'}})
+    assert response.status_code == 404
@@ -0,0 +1,52 @@
+import json
+import random
+
+import pytest
+
+from factories import random_profile, random_rule
+from rule_analysis import Pruner
+from rule_engine import RuleEngine
+
+np = pytest.importorskip("numpy")
+vectorized = pytest.importorskip("vectorized")
+
+
+def test_rule_hits_match_the_engine():
+    rng = random.Random(5)
+    engine = RuleEngine(prune=Pruner("dead"))
+    engine.load(random_rule(rng, i) for i in range(1, 300))
+    profiles = [random_profile(rng) for _ in range(2000)]
+
+    hits = vectorized.evaluate_profiles(engine, profiles)
+    assert hits.shape == (len(profiles), len(engine.rules))
+    for i, profile in enumerate(profiles):
+        assert hits.rules_for(i) == [rule.id for rule in engine.matching_rules(profile)]
+    assert hits.counts_per_rule().sum() == hits.nnz
+
+
+def test_rule_hits_without_matches():
+    engine = RuleEngine()
+    engine.load([])
+    hits = vectorized.evaluate_profiles(engine, [random_profile(random.Random(6))])
+    assert hits.nnz == 0 and hits.rules_for(0) == []
+
+
+def test_database_rules_match_the_batch_endpoint(client, tmp_path, capsys):
+    client.post('/update-datamodel', json={'actions': [
+        {'action': 'add_record_type', 'payload': {'name': 'Exercise'}},
+        {'action': 'add_attribute', 'payload': {'type_id': '$0', 'name': 'difficulty', 'type': 'number'}},
+        {'action': 'add_record', 'payload': {'type_id': '$0', 'values': {'difficulty': 5}}},
+    ]})
+    for text in ('rule Rule 1 if Exercise.difficulty >= 4 and goal == "Strength" then include_exercise "Deadlifts"',
+                 'rule Rule 2 if Exercise.difficulty >= 9 then include_exercise "Squats"',
+                 'rule Rule 3 if age > 30 then include_exercise "Squats"'):
+        assert client.post('/add-rule', json={'rule': text}).status_code == 200
+    body = "".join(json.dumps(p) + "\n" for p in [{"goal": "Strength", "age": 40}, {"goal": "Endurance", "age": 20}])
+    expected = [json.loads(line)["matched_rules"]
+                for line in client.post('/evaluate-batch', data=body).data.decode().splitlines()]
+
+    profiles = tmp_path / "profiles.ndjson"
+    profiles.write_text(body)
+    vectorized.main([str(profiles)])
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result["matched_rules"] for result in results] == expected == [["Rule 1", "Rule 3"], []]
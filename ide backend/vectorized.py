@@ -0,0 +1,250 @@
+"""Evaluate the whole rule set against many profiles at once with NumPy.
+
+Profiles are encoded column-wise: ``goal`` and ``fitness_level`` as integer
+codes, ``muscle_group`` as a boolean profile-by-muscle matrix and ``age`` /
+``duration`` as integer arrays with a presence mask. Every distinct
+condition becomes one boolean mask over all profiles, the masks of a rule
+are ANDed, and the result is a sparse profile-by-rule hit matrix. Results
+match ``RuleEngine.matching_rules`` profile for profile.
+
+    python vectorized.py --rules rules.json profiles.ndjson > hits.ndjson
+    python vectorized.py --rules rules.json --summary profiles.ndjson
+
+NumPy is optional for the rest of the backend and only needed here.
+"""
+import argparse
+import json
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rule_engine import (NUMERIC_VARIABLES, OPERATORS, SIMPLE_VARIABLES, RuleEngine,
+                         is_record_variable, normalize_profile, to_int)
+
+DEFAULT_CHUNK_SIZE = 100_000
+CODED_VARIABLES = ("goal", "fitness_level")
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("Vectorized evaluation needs NumPy: pip install numpy")
+
+
+class ProfileColumns:
+    """Columnar encoding of normalized profiles (see ``normalize_profile``)"""
+
+    def __init__(self, profiles):
+        require_numpy()
+        profiles = list(profiles)
+        self.size = len(profiles)
+
+        # Code 0 means "no value"; vocabularies map code - 1 to the value
+        self.vocab = {}
+        self.codes = {}
+        for variable in CODED_VARIABLES:
+            codes = {}
+            self.codes[variable] = np.fromiter(
+                (codes.setdefault(p[variable], len(codes) + 1) if p[variable] is not None else 0
+                 for p in profiles),
+                dtype=np.int32, count=self.size)
+            self.vocab[variable] = list(codes)
+
+        muscles = {}
+        rows, cols = [], []
+        for row, profile in enumerate(profiles):
+            for muscle in profile['muscle_group']:
+                rows.append(row)
+                cols.append(muscles.setdefault(muscle, len(muscles)))
+        self.vocab['muscle_group'] = list(muscles)
+        self.muscles = np.zeros((self.size, len(muscles)), dtype=bool)
+        self.muscles[rows, cols] = True
+
+        self.numbers = {}
+        for variable in NUMERIC_VARIABLES:
+            present = np.fromiter((p[variable] is not None for p in profiles), dtype=bool, count=self.size)
+            values = np.fromiter((p[variable] or 0 for p in profiles), dtype=np.int64, count=self.size)
+            self.numbers[variable] = (values, present)
+
+    @staticmethod
+    def _lookup_table(vocab, compare, value):
+        """Truth of ``vocab[i] <op> value`` for every vocabulary entry"""
+        table = []
+        for entry in vocab:
+            try:
+                table.append(bool(compare(entry, value)))
+            except TypeError:
+                table.append(False)
+        return np.array(table, dtype=bool)
+
+    def mask(self, variable, op, value):
+        """Boolean mask of the profiles satisfying one stored condition"""
+        compare = OPERATORS.get(op)
+        if compare is None or is_record_variable(variable):
+            return np.zeros(self.size, dtype=bool)
+
+        if variable in NUMERIC_VARIABLES:
+            threshold = to_int(value)
+            if threshold is None:
+                return np.zeros(self.size, dtype=bool)
+            values, present = self.numbers[variable]
+            return present & compare(values, threshold)
+
+        if variable == 'muscle_group':
+            vocab = self.vocab['muscle_group']
+            if op in ('==', '!='):
+                column = (self.muscles[:, vocab.index(value)] if value in vocab
+                          else np.zeros(self.size, dtype=bool))
+                return column if op == '==' else ~column
+            return self.muscles[:, self._lookup_table(vocab, compare, value)].any(axis=1)
+
+        if variable in SIMPLE_VARIABLES:
+            table = self._lookup_table(self.vocab[variable], compare, value)
+            return np.concatenate(([False], table))[self.codes[variable]]
+
+        return np.zeros(self.size, dtype=bool)
+
+
+class RuleHits:
+    """Sparse profile-by-rule hit matrix in CSR form.
+
+    The rules matched by profile ``i`` are
+    ``rule_ids[indices[indptr[i]:indptr[i + 1]]]``, in rule id order.
+    """
+
+    def __init__(self, rule_ids, indptr, indices):
+        self.rule_ids = rule_ids
+        self.indptr = indptr
+        self.indices = indices
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, len(self.rule_ids)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def rules_for(self, profile_index):
+        start, end = self.indptr[profile_index], self.indptr[profile_index + 1]
+        return self.rule_ids[self.indices[start:end]].tolist()
+
+    def counts_per_rule(self):
+        """Number of profiles each rule fires for, aligned with ``rule_ids``"""
+        return np.bincount(self.indices, minlength=len(self.rule_ids))
+
+
+def evaluate_profiles(engine, profiles):
+    """Evaluate normalized profiles against every rule of engine; returns RuleHits"""
+    columns = profiles if isinstance(profiles, ProfileColumns) else ProfileColumns(profiles)
+    snapshot = engine.snapshot
+    rules = sorted(snapshot.rules.values(), key=lambda rule: rule.id)
+
+    masks = {}
+    hit_rows, hit_cols = [], []
+    for position, rule in enumerate(rules):
+        if not rule.conditions or rule.id in snapshot.pruned or not engine.records_hold(rule):
+            continue
+        hits = np.ones(columns.size, dtype=bool)
+        for condition in rule.conditions:
+            if is_record_variable(condition[0]):
+                continue
+            mask = masks.get(condition)
+            if mask is None:
+                mask = masks[condition] = columns.mask(*condition)
+            hits &= mask
+            if not hits.any():
+                break
+        rows = np.flatnonzero(hits)
+        if len(rows):
+            hit_rows.append(rows)
+            hit_cols.append(np.full(len(rows), position, dtype=np.int32))
+
+    rule_ids = np.array([rule.id for rule in rules], dtype=np.int64)
+    if not hit_rows:
+        return RuleHits(rule_ids, np.zeros(columns.size + 1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+
+    rows = np.concatenate(hit_rows)
+    cols = np.concatenate(hit_cols)
+    # Rules were visited in id order, so a stable sort keeps them ordered per profile
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(columns.size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=columns.size), out=indptr[1:])
+    return RuleHits(rule_ids, indptr, cols[order])
+
+
+def _read_profiles(lines):
+    """Yield ``(line_number, id, profile)`` for every non-empty NDJSON line"""
+    for n, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        yield n, record.get('id'), normalize_profile(record.get('profile', record))
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('input', nargs='?', default='-', help="NDJSON profiles, '-' for stdin")
+    parser.add_argument('--rules', help="JSON file with the rules (defaults to the database)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--summary', action='store_true',
+                        help="Print how many profiles each rule fires for instead of per-profile hits")
+    args = parser.parse_args(argv)
+    require_numpy()
+
+    if args.rules:
+        from batch import load_rules_file
+        engine = RuleEngine()
+        engine.load(load_rules_file(args.rules))
+    else:
+        from main import app, load_rules, record_projection, rule_engine
+        with app.app_context():
+            engine = RuleEngine(records=record_projection.snapshot(), prune=rule_engine.prune)
+            engine.load(load_rules())
+    names = {rule.id: rule.name for rule in engine.rules.values()}
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    totals, profiles = None, 0
+    try:
+        for chunk in _chunks(_read_profiles(source), args.chunk_size):
+            hits = evaluate_profiles(engine, [profile for _, _, profile in chunk])
+            profiles += len(chunk)
+            if args.summary:
+                counts = hits.counts_per_rule()
+                totals = counts if totals is None else totals + counts
+                continue
+            for i, (n, profile_id, _) in enumerate(chunk):
+                result = {"line": n, "matched_rules": [names[r] for r in hits.rules_for(i)]}
+                if profile_id is not None:
+                    result["id"] = profile_id
+                sys.stdout.write(json.dumps(result) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    if args.summary:
+        rule_ids = sorted(names)
+        counts = totals.tolist() if totals is not None else [0] * len(rule_ids)
+        json.dump({
+            "profiles": profiles,
+            "rules": [{"id": rule_id, "name": names[rule_id], "hits": count}
+                      for rule_id, count in zip(rule_ids, counts)]
+        }, sys.stdout)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
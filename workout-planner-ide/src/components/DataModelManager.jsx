@@ -56,6 +56,32 @@ const DataModelManager = () => {
     }
   };
 
+  // Patch local state with the entities returned by /update-datamodel
+  const applyChanges = (changes = {}) => {
+    setDataModel(prev => {
+      const next = { ...prev };
+      Object.entries(changes.domain_values || {}).forEach(([key, names]) => {
+        next[key] = [...(prev[key] || []), ...names];
+      });
+      if (changes.record_types) {
+        const changedIds = Object.values(changes.record_types).map(type => type.id);
+        next.record_types = Object.fromEntries(
+          Object.entries(prev.record_types).filter(([, type]) => !changedIds.includes(type.id))
+        );
+        Object.assign(next.record_types, changes.record_types);
+      }
+      if (changes.records || changes.deleted_records) {
+        const replaced = new Map((changes.records || []).map(record => [record.id, record]));
+        const deleted = new Set(changes.deleted_records || []);
+        next.records = prev.records
+          .filter(record => !deleted.has(record.id) && !replaced.has(record.id))
+          .concat([...replaced.values()])
+          .sort((a, b) => a.id - b.id);
+      }
+      return next;
+    });
+  };
+
   const toggleSection = (section) => {
     setExpandedSections(prev => ({ ...prev, [section]: !prev[section] }));
   };
@@ -68,7 +94,7 @@ const DataModelManager = () => {
     }
 
     try {
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'add_valid_entry',
         payload: {
           type: newValidEntry.type,
@@ -78,7 +104,7 @@ const DataModelManager = () => {
       setNewValidEntry({ type: '', name: '' });
       setSuccess('Entry added successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
     } catch (err) {
       setError(err.response?.data?.message || 'Failed to add entry');
       setSuccess('');
@@ -106,14 +132,14 @@ const DataModelManager = () => {
     }
 
     try {
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'add_record_type',
         payload: { name: newTypeName.trim() }
       });
       setNewTypeName('');
       setSuccess('Record type added successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
     } catch (err) {
       setError(err.response?.data?.message || 'Failed to add record type');
       setSuccess('');
@@ -134,7 +160,7 @@ const DataModelManager = () => {
         return;
       }
 
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'add_attribute',
         payload: {
           type_id: typeId,
@@ -146,7 +172,7 @@ const DataModelManager = () => {
       setNewAttribute({ name: '', type: 'string', initial_value: '' });
       setSuccess('Attribute added successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
     } catch (err) {
       setError(err.response?.data?.message || 'Failed to add attribute');
       setSuccess('');
@@ -155,7 +181,7 @@ const DataModelManager = () => {
 
   const handleEditAttribute = async (attributeId) => {
     try {
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'update_attribute',
         payload: {
           attribute_id: attributeId,
@@ -164,7 +190,7 @@ const DataModelManager = () => {
       });
       setSuccess('Attribute updated successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
       setEditingAttribute(null);
       setShowAttributeModal(false);
     } catch (err) {
@@ -202,7 +228,7 @@ const DataModelManager = () => {
         return;
       }
 
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'add_record',
         payload: {
           type_id: typeId,
@@ -212,7 +238,7 @@ const DataModelManager = () => {
       setNewRecord({});
       setSuccess('Record added successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
     } catch (err) {
       setError(err.response?.data?.message || 'Failed to add record');
       setSuccess('');
@@ -226,7 +252,7 @@ const DataModelManager = () => {
     }
 
     try {
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'update_record',
         payload: {
           record_id: selectedRecord.id,
@@ -237,7 +263,7 @@ const DataModelManager = () => {
       setSelectedRecord(null);
       setSuccess('Record updated successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
     } catch (err) {
       setError(err.response?.data?.message || 'Failed to update record');
       setSuccess('');
@@ -246,13 +272,13 @@ const DataModelManager = () => {
 
   const handleDeleteRecord = async (recordId) => {
     try {
-      await axios.post('http://localhost:5000/update-datamodel', {
+      const response = await axios.post('http://localhost:5000/update-datamodel', {
         action: 'delete_record',
         payload: { record_id: recordId }
       });
       setSuccess('Record deleted successfully');
       setError('');
-      await fetchDataModel();
+      applyChanges(response.data.changes);
     } catch (err) {
       setError(err.response?.data?.message || 'Failed to delete record');
       setSuccess('');
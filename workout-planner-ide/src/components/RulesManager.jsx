@@ -1,6 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 
+const RULES_PAGE_SIZE = 50;
+
 const RulesManager = ({ section }) => {
   const [rules, setRules] = useState([]);
   const [grammar, setGrammar] = useState({
@@ -26,13 +28,15 @@ const RulesManager = ({ section }) => {
   });
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalRules, setTotalRules] = useState(0);
 
   useEffect(() => {
     const loadData = async () => {
       try {
         const [grammarRes, rulesRes] = await Promise.all([
           axios.get('http://localhost:5000/analyze-grammar'),
-          axios.get('http://localhost:5000/get-rules')
+          axios.get('http://localhost:5000/get-rules', { params: { limit: RULES_PAGE_SIZE } })
         ]);
 
         // Format variables for display
@@ -48,6 +52,8 @@ const RulesManager = ({ section }) => {
           variables: formattedVars
         });
         setRules(rulesRes.data.rules);
+        setNextCursor(rulesRes.data.next_cursor);
+        setTotalRules(rulesRes.data.total);
       } catch (err) {
         setError('Failed to load data');
       }
@@ -55,6 +61,23 @@ const RulesManager = ({ section }) => {
     loadData();
   }, [section]);
 
+  const handleLoadMore = async () => {
+    try {
+      const res = await axios.get('http://localhost:5000/get-rules', {
+        params: { limit: RULES_PAGE_SIZE, cursor: nextCursor }
+      });
+      // Rules created since the last page are already in the list
+      setRules(prev => {
+        const seen = new Set(prev.map(rule => rule.id));
+        return [...prev, ...res.data.rules.filter(rule => !seen.has(rule.id))];
+      });
+      setNextCursor(res.data.next_cursor);
+      setTotalRules(res.data.total);
+    } catch (err) {
+      setError('Failed to load more rules');
+    }
+  };
+
   const handleAddCondition = () => {
     if (!form.selectedVariable || !form.selectedOperator || !form.selectedValue) {
       setError('All condition fields are required');
@@ -96,13 +119,14 @@ const RulesManager = ({ section }) => {
         ? `sets ${form.sets} reps ${form.reps}`
         : `set_rest_time min ${form.minRest}s max ${form.maxRest}s`;
 
-      const ruleText = `rule Rule${rules.length + 1} if ${conditionsText} then ${actionText}`;
+      const ruleText = `rule Rule${totalRules + 1} if ${conditionsText} then ${actionText}`;
 
       // Validate and submit
       await axios.post('http://localhost:5000/validate-rule', { rule: ruleText });
       const res = await axios.post('http://localhost:5000/add-rule', { rule: ruleText });
 
       setRules([...rules, res.data.rule]);
+      setTotalRules(totalRules + 1);
       setForm({
         conditions: [],
         selectedVariable: '',
@@ -340,6 +364,11 @@ const RulesManager = ({ section }) => {
             </div>
           </div>
         ))}
+        {nextCursor && (
+          <button onClick={handleLoadMore}>
+            Load more ({rules.length} of {totalRules})
+          </button>
+        )}
       </div>
     </div>
   );